@@ -1,191 +1,297 @@
-from .morph import morph
+import sys
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+
+from .locales import get_locale
+from .parsing import parse_amount
+
+# NumPy загружается при первой пачке convert_many: импорт занимает десятки миллисекунд,
+# а convert и суммы строками вида '1234.50|RUB' в нём не нуждаются
+_numpy = None
+
+
+def load_numpy():
+    """
+    Возвращает модуль NumPy, импортируя его при первом вызове.
+
+    :return: Модуль numpy или None, если NumPy не установлен (convert_many работает поэлементно)
+    """
+
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
 
 
 class Amount2Words:
     """
-    Класс для преобразования денежной суммы в текстовое представление на русском языке.
+    Класс для преобразования денежной суммы в текстовое представление.
+    Поддерживает несколько языков и валют (см. locales.LOCALES).
     """
 
-    def __init__(self):
-        """
-        Инициализация словарей числительных и форм склонений.
-        """
-
-        # Единицы (мужской род)
-        self._units = [
-            '',
-            'один',
-            'два',
-            'три',
-            'четыре',
-            'пять',
-            'шесть',
-            'семь',
-            'восемь',
-            'девять'
-        ]
-
-        # Единицы (женский род — используется для тысяч)
-        self._units_f = [
-            '',
-            'одна',
-            'две',
-            'три',
-            'четыре',
-            'пять',
-            'шесть',
-            'семь',
-            'восемь',
-            'девять'
-        ]
-
-        # Числа от 10 до 19
-        self._teens = [
-            'десять',
-            'одиннадцать',
-            'двенадцать',
-            'тринадцать',
-            'четырнадцать',
-            'пятнадцать',
-            'шестнадцать',
-            'семнадцать',
-            'восемнадцать',
-            'девятнадцать'
-        ]
-
-        # Десятки
-        self._tens = [
-            '',
-            '',
-            'двадцать',
-            'тридцать',
-            'сорок',
-            'пятьдесят',
-            'шестьдесят',
-            'семьдесят',
-            'восемьдесят',
-            'девяносто'
-        ]
-
-        # Сотни
-        self._hundreds = [
-            '',
-            'сто',
-            'двести',
-            'триста',
-            'четыреста',
-            'пятьсот',
-            'шестьсот',
-            'семьсот',
-            'восемьсот',
-            'девятьсот'
-        ]
-
-        # Разряды (название в 3 формах + род)
-        self._scales = [
-            ('', '', '', 'm'),
-            ('тысяча', 'тысячи', 'тысяч', 'f'),
-            ('миллион', 'миллиона', 'миллионов', 'm'),
-            ('миллиард', 'миллиарда', 'миллиардов', 'm'),
-            ('триллион', 'триллиона', 'триллионов', 'm')
-        ]
-
-        # Формы валют
-        self._currency = ('рубль', 'рубля', 'рублей')
-        self._kopek = ('копейка', 'копейки', 'копеек')
-
-    def _num_to_words(self, n, gender='m'):
-        """
-        Преобразует число от 1 до 999 в список слов.
-
-        :param n: Число (0–999)
-        :param gender: Род ('m' — мужской, 'f' — женский)
-        :return: Список слов
-        """
-        if n == 0:
-            return []
-
-        words = []
-
-        # Сотни
-        if n >= 100:
-            words.append(self._hundreds[n // 100])
-            n %= 100
-
-        # Десятки
-        if n >= 20:
-            words.append(self._tens[n // 10])
-            n %= 10
-        elif n >= 10:
-            # Числа 10-19
-            words.append(self._teens[n - 10])
-            n = 0  # Обнуляем, так как единицы уже учтены
-
-        # Единицы
-        if n > 0:
-            if gender == 'f':
-                words.append(self._units_f[n])
-            else:
-                words.append(self._units[n])
-
-        return words
-
-    def convert(self, amount):
+    def __init__(self, language='ru', currency='RUB', cache_size=4096):
+        """
+        Инициализация таблиц языка и валюты по умолчанию.
+
+        :param language: Код языка ('ru', 'en')
+        :param currency: Валюта по умолчанию — для сумм без кода валюты
+        :param cache_size: Размер LRU-кеша готовых результатов (0 — без кеша)
+        :raises ValueError: Язык или валюта не поддерживаются
+        """
+
+        # Таблицы языка компилируются один раз на процесс и общие для всех экземпляров
+        self._locale = get_locale(language)
+        self.language = language
+        self.currency = self._currency_tables(currency).code
+
+        # Кеш результатов по нормализованной сумме (рубли, копейки, знак, валюта)
+        if cache_size > 0:
+            self._spell_cached = lru_cache(maxsize=cache_size)(self._spell)
+        else:
+            self._spell_cached = self._spell
+
+    def _currency_tables(self, currency):
+        """
+        Возвращает предвычисленные таблицы валюты.
+
+        :param currency: Код валюты (ISO 4217)
+        :return: CompiledCurrency
+        :raises ValueError: Валюта не поддерживается
+        """
+
+        tables = self._locale.currencies.get(currency)
+        if tables is None:
+            raise ValueError(f'Валюта не поддерживается: {currency}')
+        return tables
+
+    def convert(self, amount, currency=None):
         """
         Преобразует денежную сумму в строку прописью.
 
-        :param amount: Сумма (float, int или строка)
+        :param amount: Сумма (int, float, Decimal или строка, в том числе '1234.50|USD')
+        :param currency: Код валюты; по умолчанию — из строки 'сумма|ВАЛЮТА', иначе валюта экземпляра
+        :return: Строка с суммой прописью
+        :raises ValueError: Некорректная или слишком большая сумма, неподдерживаемая валюта
+        """
+
+        return self._spell_cached(*self._split(amount, currency))
+
+    def _split(self, amount, currency=None):
+        """
+        Нормализует сумму в целые единицы и копейки без промежуточного float.
+
+        :param amount: Сумма (int, float, Decimal или строка, в том числе '1234.50|USD')
+        :param currency: Явно заданный код валюты
+        :return: Кортеж (целые единицы, копейки, признак отрицательной суммы, код валюты)
+        """
+
+        rubles, kopeks, negative, code = parse_amount(amount)
+        return rubles, kopeks, negative, currency or code or self.currency
+
+    def convert_many(self, amounts, chunk_size=10000, workers=0, currency=None):
+        """
+        Преобразует последовательность сумм в строки прописью.
+        Результаты выдаются лениво, по мере обработки пачек, в порядке входных данных.
+
+        :param amounts: Итерируемый объект сумм: список, генератор или массив NumPy
+        :param chunk_size: Размер пачки, обрабатываемой за один шаг
+        :param workers: Количество процессов для больших объёмов (0 — в текущем процессе)
+        :param currency: Код валюты для всех сумм (по умолчанию — как в convert)
+        :return: Генератор строк с суммами прописью
+        """
+
+        chunks = self._chunks(amounts, chunk_size)
+
+        if workers > 1:
+            yield from self._convert_chunks_parallel(chunks, workers, self.language, self.currency, currency)
+            return
+
+        for chunk in chunks:
+            yield from self._convert_chunk(chunk, currency)
+
+    @staticmethod
+    def _chunks(amounts, chunk_size):
+        """
+        Разбивает входные данные на пачки. Массив NumPy режется срезами без копирования.
+        """
+
+        # Массив NumPy мог передать только тот, кто уже импортировал numpy
+        np = sys.modules.get('numpy')
+        if np is not None and isinstance(amounts, np.ndarray):
+            for start in range(0, len(amounts), chunk_size):
+                yield amounts[start:start + chunk_size]
+            return
+
+        iterator = iter(amounts)
+        while chunk := list(islice(iterator, chunk_size)):
+            yield chunk
+
+    def _convert_chunk(self, chunk, currency=None):
+        """
+        Преобразует одну пачку сумм.
+
+        :param chunk: Список сумм или массив NumPy
+        :param currency: Явно заданный код валюты
+        :return: Список строк
+        """
+
+        np = load_numpy()
+        if np is None:
+            return [self._spell_cached(*self._split(amount, currency)) for amount in chunk]
+
+        try:
+            values = np.asarray(chunk, dtype=np.float64)
+        except (TypeError, ValueError):
+            # Строки и прочие нечисловые значения — поэлементный путь
+            return [self._spell_cached(*self._split(amount, currency)) for amount in chunk]
+
+        if values.ndim != 1 or not len(values):
+            return [self._spell_cached(*self._split(amount, currency)) for amount in chunk]
+
+        tables = self._currency_tables(currency or self.currency)
+
+        # Округление до копеек векторно для всей пачки. Поэлементно через _split обрабатываются
+        # значения на границе половины копейки, суммы, где точности float не хватает на копейки,
+        # а также отрицательные и нечисловые значения — так результат совпадает с convert
+        scaled = values * 100
+        fallback = ~np.isfinite(values) | (values < 0) | (values >= 1e10)
+        fallback |= np.abs(scaled - np.floor(scaled) - 0.5) < 1e-3
+        scaled[fallback] = 0
+
+        cents = np.rint(scaled).astype(np.int64)
+        rubles, kopeks = np.divmod(cents, 100)
+
+        # Разбиение на группы по 3 цифры
+        scales_count = self._locale.scales_count
+        groups = np.empty((scales_count, len(rubles)), dtype=np.int64)
+        rest = rubles
+        for scale_index in range(scales_count):
+            rest, groups[scale_index] = np.divmod(rest, 1000)
+
+        scale_groups = tables.scale_groups
+        major_forms = tables.major_forms
+        minor_words = tables.minor_words
+        plural_index = self._locale.plural_index
+        zero = self._locale.zero
+        scale_range = range(scales_count - 1, -1, -1)
+
+        result = []
+        for row, rub, kop in zip(groups.T.tolist(), rubles.tolist(), kopeks.tolist()):
+            parts = [scale_groups[scale][row[scale]] for scale in scale_range if row[scale]]
+            words = ' '.join(parts) if parts else zero
+            text = f'{words} {major_forms[plural_index(rub)]} {minor_words[kop]}'
+            result.append(text[0].upper() + text[1:])
+
+        for index in np.flatnonzero(fallback).tolist():
+            result[index] = self._spell_cached(*self._split(chunk[index], currency))
+
+        return result
+
+    @staticmethod
+    def _convert_chunks_parallel(chunks, workers, language, default_currency, currency):
+        """
+        Распределяет пачки по пулу процессов. В работе не больше 2 × workers пачек,
+        поэтому входные данные читаются по мере выдачи результатов.
+        """
+
+        # Пул процессов нужен только для больших объёмов — модуль не загружается при импорте
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_convert_chunk_in_worker, chunk, language, default_currency, currency))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+
+            while pending:
+                yield from pending.popleft().result()
+
+    def _spell(self, rubles, kopeks, negative, currency):
+        """
+        Собирает строку прописью из предвычисленных групп.
+
+        :param rubles: Целое количество единиц валюты (неотрицательное)
+        :param kopeks: Количество копеек (0–99)
+        :param negative: Признак отрицательной суммы
+        :param currency: Код валюты
         :return: Строка с суммой прописью
+        :raises ValueError: Сумма больше наибольшего поддерживаемого разряда или валюта не поддерживается
         """
 
-        # Округляем до 2 знаков после запятой
-        amount = round(float(amount), 2)
+        locale = self._locale
+        tables = self._currency_tables(currency)
 
-        # Выделяем рубли и копейки
-        rubles = int(amount)
-        kopeks = int(round((amount - rubles) * 100))
+        if rubles >= locale.max_whole:
+            raise ValueError(f'Слишком большая сумма: {rubles}')
 
-        # Если рублей 0
+        # Если единиц валюты 0
         if rubles == 0:
-            rubles_words = ['ноль']
+            rubles_words = locale.zero
         else:
-            rubles_words = []
             parts = []
             temp = rubles
+            scale_index = 0
 
-            # Разбиваем число на группы по 3 цифры
+            # Разбиваем число на группы по 3 цифры (тысячи, миллионы и т.д.)
             while temp > 0:
-                parts.append(temp % 1000)
+                part = temp % 1000
+                if part:
+                    parts.append(tables.scale_groups[scale_index][part])
                 temp //= 1000
+                scale_index += 1
+
+            # Группы собраны от младших к старшим
+            parts.reverse()
+            rubles_words = ' '.join(parts)
 
-            # Обрабатываем каждую группу (тысячи, миллионы и т.д.)
-            for i, part in enumerate(parts):
-                if part == 0:
-                    continue
+        if negative:
+            rubles_words = f'{locale.minus} {rubles_words}'
 
-                scale_index = i
+        # Добавляем валюту и копейки
+        result = f'{rubles_words} {tables.major_forms[locale.plural_index(rubles)]} {tables.minor_words[kopeks]}'
 
-                # Определяем род (тысяча — женский род)
-                if scale_index == 1:
-                    gender = 'f'
-                else:
-                    gender = 'm'
+        # Только первая буква: capitalize() перевёл бы в нижний регистр остальной текст
+        return result[0].upper() + result[1:]
 
-                # Преобразуем число в слова
-                chunk_words = self._num_to_words(part, gender)
+    def cache_info(self):
+        """
+        Статистика кеша результатов.
+
+        :return: Словарь: попадания, промахи, доля попаданий, текущий и максимальный размер
+        """
+
+        if not hasattr(self._spell_cached, 'cache_info'):
+            return {'hits': 0, 'misses': 0, 'hit_ratio': 0.0, 'size': 0, 'max_size': 0}
+
+        info = self._spell_cached.cache_info()
+        total = info.hits + info.misses
 
-                # Добавляем название разряда
-                if scale_index > 0:
-                    scale_word = morph(part, self._scales[scale_index])
-                    chunk_words.append(scale_word)
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_ratio': info.hits / total if total else 0.0,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+        }
 
-                rubles_words = chunk_words + rubles_words
 
-        # Формируем итоговую строку
-        result = ' '.join(rubles_words).strip()
-        # Добавляем валюту (рубли)
-        result += ' ' + morph(rubles, self._currency)
-        # Добавляем копейки
-        result += f' {kopeks:02d} {morph(kopeks, self._kopek)}'
+# Конвертеры процесса пула по (языку, валюте по умолчанию): таблицы строятся один раз на процесс
+_worker_converters = {}
+
+
+def _convert_chunk_in_worker(chunk, language, default_currency, currency):
+    """
+    Преобразует пачку в процессе пула convert_many.
+    """
 
-        return result.capitalize()
+    key = (language, default_currency)
+    converter = _worker_converters.get(key)
+    if converter is None:
+        converter = _worker_converters[key] = Amount2Words(language, default_currency)
+    return converter._convert_chunk(chunk, currency)
@@ -0,0 +1,280 @@
+from functools import lru_cache
+
+from .morph import morph
+
+
+def _english_plural(n, forms):
+    """
+    Форма слова для английского языка: единственное число только для 1.
+
+    :param n: Число
+    :param forms: Кортеж из трех форм (1, 2-4, 5+)
+    :return: Корректная форма слова
+    """
+
+    return forms[0] if n == 1 else forms[2]
+
+
+# Описания языков: словари числительных, разряды и валюты.
+# Валюта: (формы основной единицы, род основной единицы, формы разменной единицы)
+LOCALES = {
+    'ru': {
+        'zero': 'ноль',
+        'minus': 'минус',
+        'tens_separator': ' ',
+        'plural': morph,
+
+        # Единицы (мужской род)
+        'units': [
+            '',
+            'один',
+            'два',
+            'три',
+            'четыре',
+            'пять',
+            'шесть',
+            'семь',
+            'восемь',
+            'девять'
+        ],
+
+        # Единицы (женский род — используется для тысяч)
+        'units_f': [
+            '',
+            'одна',
+            'две',
+            'три',
+            'четыре',
+            'пять',
+            'шесть',
+            'семь',
+            'восемь',
+            'девять'
+        ],
+
+        # Числа от 10 до 19
+        'teens': [
+            'десять',
+            'одиннадцать',
+            'двенадцать',
+            'тринадцать',
+            'четырнадцать',
+            'пятнадцать',
+            'шестнадцать',
+            'семнадцать',
+            'восемнадцать',
+            'девятнадцать'
+        ],
+
+        # Десятки
+        'tens': [
+            '',
+            '',
+            'двадцать',
+            'тридцать',
+            'сорок',
+            'пятьдесят',
+            'шестьдесят',
+            'семьдесят',
+            'восемьдесят',
+            'девяносто'
+        ],
+
+        # Сотни
+        'hundreds': [
+            '',
+            'сто',
+            'двести',
+            'триста',
+            'четыреста',
+            'пятьсот',
+            'шестьсот',
+            'семьсот',
+            'восемьсот',
+            'девятьсот'
+        ],
+
+        # Разряды (название в 3 формах + род)
+        'scales': [
+            ('', '', '', 'm'),
+            ('тысяча', 'тысячи', 'тысяч', 'f'),
+            ('миллион', 'миллиона', 'миллионов', 'm'),
+            ('миллиард', 'миллиарда', 'миллиардов', 'm'),
+            ('триллион', 'триллиона', 'триллионов', 'm'),
+            ('квадриллион', 'квадриллиона', 'квадриллионов', 'm'),
+            ('квинтиллион', 'квинтиллиона', 'квинтиллионов', 'm'),
+            ('секстиллион', 'секстиллиона', 'секстиллионов', 'm'),
+            ('септиллион', 'септиллиона', 'септиллионов', 'm')
+        ],
+
+        # Формы валют
+        'currencies': {
+            'RUB': (('рубль', 'рубля', 'рублей'), 'm', ('копейка', 'копейки', 'копеек')),
+            'USD': (('доллар', 'доллара', 'долларов'), 'm', ('цент', 'цента', 'центов')),
+            'EUR': (('евро', 'евро', 'евро'), 'm', ('цент', 'цента', 'центов')),
+            'KZT': (('тенге', 'тенге', 'тенге'), 'm', ('тиын', 'тиына', 'тиынов')),
+            'BYN': (
+                ('белорусский рубль', 'белорусских рубля', 'белорусских рублей'), 'm',
+                ('копейка', 'копейки', 'копеек')
+            ),
+            'UAH': (('гривна', 'гривны', 'гривен'), 'f', ('копейка', 'копейки', 'копеек')),
+        },
+    },
+    'en': {
+        'zero': 'zero',
+        'minus': 'minus',
+        'tens_separator': '-',
+        'plural': _english_plural,
+
+        'units': ['', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine'],
+        'units_f': ['', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine'],
+        'teens': [
+            'ten', 'eleven', 'twelve', 'thirteen', 'fourteen',
+            'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen'
+        ],
+        'tens': ['', '', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety'],
+        'hundreds': [
+            '', 'one hundred', 'two hundred', 'three hundred', 'four hundred',
+            'five hundred', 'six hundred', 'seven hundred', 'eight hundred', 'nine hundred'
+        ],
+        'scales': [
+            ('', '', '', 'm'),
+            ('thousand', 'thousand', 'thousand', 'm'),
+            ('million', 'million', 'million', 'm'),
+            ('billion', 'billion', 'billion', 'm'),
+            ('trillion', 'trillion', 'trillion', 'm'),
+            ('quadrillion', 'quadrillion', 'quadrillion', 'm'),
+            ('quintillion', 'quintillion', 'quintillion', 'm'),
+            ('sextillion', 'sextillion', 'sextillion', 'm'),
+            ('septillion', 'septillion', 'septillion', 'm')
+        ],
+        'currencies': {
+            'RUB': (('ruble', 'rubles', 'rubles'), 'm', ('kopeck', 'kopecks', 'kopecks')),
+            'USD': (('dollar', 'dollars', 'dollars'), 'm', ('cent', 'cents', 'cents')),
+            'EUR': (('euro', 'euros', 'euros'), 'm', ('cent', 'cents', 'cents')),
+            'KZT': (('tenge', 'tenge', 'tenge'), 'm', ('tiyn', 'tiyn', 'tiyn')),
+            'BYN': (
+                ('Belarusian ruble', 'Belarusian rubles', 'Belarusian rubles'), 'm',
+                ('kopeck', 'kopecks', 'kopecks')
+            ),
+            'UAH': (('hryvnia', 'hryvnias', 'hryvnias'), 'f', ('kopiyka', 'kopiykas', 'kopiykas')),
+        },
+    },
+}
+
+
+class CompiledCurrency:
+    """
+    Предвычисленные таблицы валюты в конкретном языке.
+    """
+
+    __slots__ = ('code', 'major_forms', 'scale_groups', 'minor_words')
+
+    def __init__(self, code, major_forms, scale_groups, minor_words):
+        """
+        :param code: Код валюты (ISO 4217)
+        :param major_forms: Формы основной единицы (1, 2-4, 5+)
+        :param scale_groups: Группы 0–999 по разрядам; младший разряд — в роде валюты
+        :param minor_words: Строки '05 копеек' для 0–99
+        """
+
+        self.code = code
+        self.major_forms = major_forms
+        self.scale_groups = scale_groups
+        self.minor_words = minor_words
+
+
+class CompiledLocale:
+    """
+    Язык, скомпилированный в плоские таблицы: написание всех групп 0–999
+    каждого разряда и таблицы всех валют. Строится один раз на процесс.
+    """
+
+    def __init__(self, language, spec):
+        """
+        :param language: Код языка
+        :param spec: Описание языка из LOCALES
+        """
+
+        self.language = language
+        self.zero = spec['zero']
+        self.minus = spec['minus']
+        self.scales_count = len(spec['scales'])
+        self.max_whole = 1000 ** self.scales_count
+
+        plural = spec['plural']
+
+        # Индекс формы (0, 1, 2) для числа: у русского зависит только от n % 100
+        if plural is morph:
+            plural_table = [morph(n, (0, 1, 2)) for n in range(100)]
+            self.plural_index = lambda n: plural_table[n % 100]
+        else:
+            self.plural_index = lambda n: plural(n, (0, 1, 2))
+
+        # Группы по разрядам: [разряд][0..999] → 'двадцать одна тысяча'
+        groups_by_gender = {
+            gender: [self._group_words(n, gender, spec) for n in range(1000)]
+            for gender in ('m', 'f')
+        }
+        self.scale_groups = [groups_by_gender[spec['scales'][0][3]]]
+        for scale in spec['scales'][1:]:
+            self.scale_groups.append([
+                f'{group} {plural(n, scale)}' if n else ''
+                for n, group in enumerate(groups_by_gender[scale[3]])
+            ])
+
+        self.currencies = {}
+        for code, (major_forms, gender, minor_forms) in spec['currencies'].items():
+            self.currencies[code] = CompiledCurrency(
+                code,
+                major_forms,
+                [groups_by_gender[gender]] + self.scale_groups[1:],
+                [f'{n:02d} {plural(n, minor_forms)}' for n in range(100)],
+            )
+
+    @staticmethod
+    def _group_words(n, gender, spec):
+        """
+        Преобразует число от 0 до 999 в строку.
+
+        :param n: Число (0–999)
+        :param gender: Род ('m' — мужской, 'f' — женский)
+        :param spec: Описание языка
+        :return: Строка (пустая для 0)
+        """
+
+        words = []
+
+        # Сотни
+        if n >= 100:
+            words.append(spec['hundreds'][n // 100])
+            n %= 100
+
+        # Десятки и единицы
+        units = spec['units_f'] if gender == 'f' else spec['units']
+        if n >= 20:
+            tens = spec['tens'][n // 10]
+            words.append(f"{tens}{spec['tens_separator']}{units[n % 10]}" if n % 10 else tens)
+        elif n >= 10:
+            words.append(spec['teens'][n - 10])
+        elif n > 0:
+            words.append(units[n])
+
+        return ' '.join(words)
+
+
+@lru_cache(maxsize=None)
+def get_locale(language):
+    """
+    Возвращает скомпилированные таблицы языка. Таблицы общие для всех экземпляров Amount2Words.
+
+    :param language: Код языка ('ru', 'en')
+    :return: CompiledLocale
+    :raises ValueError: Язык не поддерживается
+    """
+
+    spec = LOCALES.get(language)
+    if spec is None:
+        raise ValueError(f'Язык не поддерживается: {language}')
+
+    return CompiledLocale(language, spec)
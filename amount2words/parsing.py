@@ -0,0 +1,135 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Пробелы и апострофы, используемые как разделители тысяч
+_GROUP_SEPARATORS = str.maketrans('', '', ' \u00a0\u202f\u2009\'’_')
+
+_CENT = Decimal('0.01')
+
+
+def parse_amount(amount):
+    """
+    Разбирает денежную сумму без промежуточного float.
+
+    Принимает int, Decimal, float и строки: '1234.50', '1 234,50', '1,234.50',
+    '1.234.567,89', а также денежное поле Bitrix24 '1234.50|RUB'.
+    Дробная часть округляется до копеек по правилу «половина вверх».
+
+    :param amount: Сумма
+    :return: Кортеж (целая часть, копейки, признак отрицательной суммы, код валюты или None)
+    :raises ValueError: Строка не является суммой
+    """
+
+    if isinstance(amount, str):
+        text = amount.strip()
+        currency = None
+
+        # Денежное поле Bitrix24: 'сумма|ВАЛЮТА'
+        if '|' in text:
+            text, _, currency = text.partition('|')
+            currency = currency.strip().upper() or None
+
+        return _split_plain(text, currency) or _split_decimal(_normalize(text), currency)
+
+    if isinstance(amount, bool):
+        raise ValueError(f'Некорректная сумма: {amount!r}')
+
+    if isinstance(amount, int):
+        return abs(amount), 0, amount < 0, None
+
+    if isinstance(amount, float):
+        # repr даёт кратчайшую десятичную запись, совпадающую с исходным вводом
+        text = repr(float(amount))
+        return _split_plain(text, None) or _split_decimal(_normalize(text), None)
+
+    if isinstance(amount, Decimal):
+        return _split_decimal(amount, None)
+
+    return parse_amount(str(amount))
+
+
+def _split_plain(text, currency):
+    """
+    Быстрый путь для записи вида '-1234.567': только цифры и точка.
+    Округление «половина вверх» выполняется по первой отбрасываемой цифре, без Decimal.
+
+    :param text: Строка суммы
+    :param currency: Код валюты, возвращаемый в результате
+    :return: Кортеж как у parse_amount или None для других форматов
+    """
+
+    negative = text[:1] == '-'
+    if negative:
+        text = text[1:]
+
+    whole, _, fraction = text.partition('.')
+    if not whole.isdecimal() or (fraction and not fraction.isdecimal()):
+        return None
+
+    whole = int(whole)
+    if not fraction:
+        kopeks = 0
+    elif len(fraction) == 1:
+        kopeks = int(fraction) * 10
+    else:
+        kopeks = int(fraction[:2])
+        if len(fraction) > 2 and fraction[2] >= '5':
+            kopeks += 1
+            if kopeks == 100:
+                whole, kopeks = whole + 1, 0
+
+    return whole, kopeks, negative and (whole > 0 or kopeks > 0), currency
+
+
+def _normalize(text):
+    """
+    Приводит строку с разделителями тысяч и десятичной запятой к Decimal.
+
+    :param text: Строка суммы без кода валюты
+    :return: Decimal
+    :raises ValueError: Строка не является суммой
+    """
+
+    cleaned = text.translate(_GROUP_SEPARATORS)
+
+    if ',' in cleaned and '.' in cleaned:
+        # Десятичный разделитель — тот, что стоит последним
+        if cleaned.rfind(',') > cleaned.rfind('.'):
+            cleaned = cleaned.replace('.', '').replace(',', '.')
+        else:
+            cleaned = cleaned.replace(',', '')
+    elif cleaned.count(',') > 1:
+        cleaned = cleaned.replace(',', '')
+    elif ',' in cleaned:
+        cleaned = cleaned.replace(',', '.')
+    elif cleaned.count('.') > 1:
+        cleaned = cleaned.replace('.', '')
+
+    try:
+        value = Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f'Некорректная сумма: {text!r}') from None
+
+    return value
+
+
+def _split_decimal(value, currency):
+    """
+    Делит Decimal на целую часть и копейки с округлением «половина вверх».
+
+    :param value: Сумма
+    :param currency: Код валюты, возвращаемый в результате
+    :return: Кортеж как у parse_amount
+    :raises ValueError: Значение не является конечным числом
+    """
+
+    if not value.is_finite():
+        raise ValueError(f'Некорректная сумма: {value}')
+
+    try:
+        cents = int(abs(value).quantize(_CENT, rounding=ROUND_HALF_UP).scaleb(2))
+    except InvalidOperation:
+        # Больше знаков, чем позволяет точность контекста Decimal
+        raise ValueError(f'Слишком большая сумма: {value}') from None
+    whole, kopeks = divmod(cents, 100)
+
+    return whole, kopeks, value < 0 and cents > 0, currency
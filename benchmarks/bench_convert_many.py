@@ -0,0 +1,63 @@
+"""
+Сравнение Amount2Words.convert в цикле и Amount2Words.convert_many
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_convert_many --count 200000 --workers 2
+"""
+
+import argparse
+import random
+import time
+
+from amount2words.amount2words import Amount2Words, load_numpy
+
+
+def generate_amounts(count: int, seed: int = 42) -> list:
+    """
+    Генерирует суммы разного порядка с копейками
+    """
+
+    rnd = random.Random(seed)
+    return [rnd.randint(0, 10 ** rnd.randint(1, 12)) / 100 for _ in range(count)]
+
+
+def measure(name: str, func, count: int):
+    """
+    Выполняет функцию и печатает время и пропускную способность
+    """
+
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<32} {elapsed:8.3f} s  {count / elapsed:12,.0f} сумм/с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200_000, help="Количество сумм")
+    parser.add_argument("--workers", type=int, default=0, help="Процессов для convert_many (0 — без пула)")
+    args = parser.parse_args()
+
+    amounts = generate_amounts(args.count)
+    # Кеш отключён, чтобы сравнивать стоимость преобразования, а не попадания в кеш
+    converter = Amount2Words(cache_size=0)
+
+    measure("convert (цикл)", lambda: [converter.convert(amount) for amount in amounts], args.count)
+    measure("convert_many (list)", lambda: list(converter.convert_many(amounts)), args.count)
+    measure("convert_many (генератор)", lambda: list(converter.convert_many(iter(amounts))), args.count)
+
+    np = load_numpy()
+    if np is not None:
+        array = np.array(amounts)
+        measure("convert_many (numpy)", lambda: list(converter.convert_many(array)), args.count)
+
+    if args.workers > 1:
+        measure(
+            f"convert_many (workers={args.workers})",
+            lambda: list(converter.convert_many(amounts, workers=args.workers)),
+            args.count,
+        )
+
+
+if __name__ == "__main__":
+    main()
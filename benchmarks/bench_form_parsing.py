@@ -0,0 +1,144 @@
+"""
+Разбор тела вебхуков Bitrix24: request.form.to_dict() + parse_nested против parse_form и extract_fields
+
+Тела запросов повторяют реальные события: установка приложения (ONAPPINSTALL с блоками
+auth[...] и data[...]) и вызов активити бизнес-процесса.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_form_parsing --count 20000
+"""
+
+import argparse
+import io
+import time
+from urllib.parse import urlencode
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from lib.utils import extract_fields, parse_form, parse_nested
+
+AUTH = [
+    ("auth[access_token]", "s6p6eclrvim6da22ft9ch94ekreb52lv0fe3f8lp8a3d6e0c9j9b0d1i4c9c1pcf"),
+    ("auth[expires]", "1712345678"),
+    ("auth[expires_in]", "3600"),
+    ("auth[scope]", "crm,bizproc,user,placement"),
+    ("auth[domain]", "example.bitrix24.ru"),
+    ("auth[server_endpoint]", "https://oauth.bitrix24.tech/rest/"),
+    ("auth[status]", "L"),
+    ("auth[client_endpoint]", "https://example.bitrix24.ru/rest/"),
+    ("auth[member_id]", "a223c6b3710f85df22e9377d6c4f7553"),
+    ("auth[user_id]", "1"),
+    ("auth[refresh_token]", "4s386p3q0tr8dy89xvmt96234v3dhfwo2jkl8q7t1m5n6b4v3c2x1z0a9s8d7f6g"),
+    ("auth[application_token]", "51856fefc120afa4b628cc82d3935cce"),
+]
+
+INSTALL = [
+    ("event", "ONAPPINSTALL"),
+    ("data[VERSION]", "1"),
+    ("data[ACTIVE]", "Y"),
+    ("data[INSTALLED]", "Y"),
+    ("data[LANGUAGE_ID]", "ru"),
+    ("ts", "1712345678"),
+] + AUTH
+
+ACTIVITY = [
+    ("workflow_id", "6612a3c2b5f4e8.12345678"),
+    ("code", "utils-bitrix-app.amount2words"),
+    ("document_id[0]", "crm"),
+    ("document_id[1]", "CCrmDocumentDeal"),
+    ("document_id[2]", "DEAL_12345"),
+    ("document_type[0]", "crm"),
+    ("document_type[1]", "CCrmDocumentDeal"),
+    ("document_type[2]", "DEAL"),
+    ("event_token", "6612a3c2b5f4e8.12345678|A12345_67890_12345_67890|ae8b0c4d2f.1a2b3c4d5e6f"),
+    ("properties[SOURCE_AMOUNT]", "1234567.89|RUB"),
+    ("properties[RESULT]", "UF_CRM_1712345678901"),
+    ("properties[LANGUAGE]", "ru"),
+    ("use_subscription", "Y"),
+    ("timeout_duration", "0"),
+    ("ts", "1712345678"),
+] + AUTH
+
+ACTIVITY_FIELDS = (
+    "event_token",
+    "auth[member_id]",
+    "properties[SOURCE_AMOUNT]",
+    "properties[RESULT]",
+    "properties[LANGUAGE]",
+    "document_id[2]",
+)
+
+
+def make_environ(pairs: list) -> dict:
+    """
+    WSGI-окружение POST-запроса с телом application/x-www-form-urlencoded
+    """
+
+    body = urlencode(pairs).encode()
+    environ = EnvironBuilder(
+        method="POST", data=body, content_type="application/x-www-form-urlencoded"
+    ).get_environ()
+    environ["bench.body"] = body
+    return environ
+
+
+def via_form(environ: dict):
+    """
+    Прежний путь: разбор формы Werkzeug, копия в dict и parse_nested
+    """
+
+    return parse_nested(Request(environ).form.to_dict())
+
+
+def via_parse_form(environ: dict):
+    """
+    Разбор сырого тела в один проход
+    """
+
+    return parse_form(Request(environ).get_data())
+
+
+def via_extract_fields(environ: dict):
+    """
+    Извлечение только полей, нужных обработчику активити
+    """
+
+    return extract_fields(Request(environ).get_data(), ACTIVITY_FIELDS)
+
+
+def measure(func, environ: dict, count: int, repeat: int = 5) -> float:
+    """
+    Лучшее из нескольких повторов время разбора count запросов в секундах
+    """
+
+    body = environ["bench.body"]
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(count):
+            environ["wsgi.input"] = io.BytesIO(body)
+            func(environ)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20_000, help="Количество запросов в замере")
+    args = parser.parse_args()
+
+    cases = [
+        ("установка", make_environ(INSTALL), [via_form, via_parse_form]),
+        ("активити", make_environ(ACTIVITY), [via_form, via_parse_form, via_extract_fields]),
+    ]
+
+    print(f"{'событие':<12} {'способ':<20} {'время':>10} {'мкс/запрос':>11}")
+    for name, environ, funcs in cases:
+        for func in funcs:
+            elapsed = measure(func, environ, args.count)
+            print(f"{name:<12} {func.__name__:<20} {elapsed:8.3f} s {elapsed / args.count * 1e6:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
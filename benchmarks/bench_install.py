@@ -0,0 +1,156 @@
+"""
+Регистрация активити при установке: пакетная синхронизация реестра против вызова на каждую активити
+
+Для --activities описаний активити против имитатора Bitrix24 с задержкой --latency замеряются:
+- sequential — прежняя схема: bizproc.activity.add на каждую активити, при переустановке
+  (ERROR_ACTIVITY_ALREADY_INSTALLED) ещё bizproc.activity.update на каждую;
+- registry — ActivityRegistry.sync: bizproc.activity.list и один batch с изменившимися активити.
+Сценарии: первая установка, повторная установка без изменений, изменение одной активити.
+Выводится число HTTP-запросов к порталу и время регистрации в миллисекундах,
+а также время ответа /install (регистрация выполняется в фоне).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_install --activities 1 5 20 --latency 0.05
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Dict
+
+from benchmarks.fake_bitrix import FakeBitrixServer, start_server
+
+MEMBER_ID = "install"
+
+
+def configure_environment(workdir: str):
+    """
+    Настройки приложения для замера: без ограничения темпа и фоновых потоков
+    """
+
+    os.environ.update(
+        ENV="PRODUCTION",
+        APP_URL="http://127.0.0.1",
+        BITRIX24_CLIENT_ID="bench",
+        BITRIX24_CLIENT_SECRET="bench",
+        TOKEN_STORE="json",
+        TOKEN_STORE_PATH=os.path.join(workdir, "tokens.json"),
+        IDEMPOTENCY_BACKEND="memory",
+        OUTBOX_PATH="",
+        ASYNC_WORKERS="0",
+        BATCH_WINDOW="0",
+        RATE_LIMIT="0",
+        TOKEN_RENEW_INTERVAL="0",
+        METRICS_DIR="",
+    )
+
+
+def definitions(count: int, version: int = 0) -> Dict[str, Dict]:
+    """
+    Описания count активити; version меняет описание первой из них
+    """
+
+    import main
+
+    fields = main.activity_fields()
+    result = {f"{main.ACTIVITY_CODE}.{index}": dict(fields, NAME=f"{fields['NAME']} {index}") for index in range(count)}
+    if version:
+        result[f"{main.ACTIVITY_CODE}.0"]["DESCRIPTION"] += f" (версия {version})"
+    return result
+
+
+def sequential(client, activities: Dict[str, Dict]):
+    """
+    Регистрация по одной активити с обновлением уже установленных
+    """
+
+    for code, fields in activities.items():
+        try:
+            client.call("bizproc.activity.add", {"CODE": code, **fields})
+        except Exception as exc:
+            if "ERROR_ACTIVITY_ALREADY_INSTALLED" not in str(exc):
+                raise
+            client.call("bizproc.activity.update", {"CODE": code, "FIELDS": fields})
+
+
+def measure(server: FakeBitrixServer, action: Callable[[], None]) -> Dict[str, float]:
+    """
+    Число запросов к порталу и длительность действия
+    """
+
+    requests_before = sum(server.calls.values())
+    started = time.perf_counter()
+    action()
+    return {"requests": sum(server.calls.values()) - requests_before, "ms": (time.perf_counter() - started) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--activities", type=int, nargs="+", default=[1, 5, 20], help="Количество активити")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа имитатора в секундах")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(workdir)
+
+        import main as app_main
+        from lib.activity_registry import ActivityRegistry
+        from lib.bitrix24_client import Bitrix24APIError
+        from lib.idempotency import MemoryCacheBackend, TTLCache
+
+        app = app_main.create_app(start_services=False)
+        services = app.extensions["amount2words"]
+        client = services.bx_clients.get(MEMBER_ID)
+        client.set_tokens({
+            "access_token": "bench", "refresh_token": "bench", "member_id": MEMBER_ID,
+            "client_endpoint": server.endpoint, "expires": time.time() + 24 * 3600,
+        })
+
+        # Имитатор не знает о повторной установке: уже установленная активити — ошибка, как на портале
+        original_call = client.call
+
+        def call(method, params=None):
+            if method == "bizproc.activity.add" and params["CODE"] in server.activities:
+                server.count(method)
+                raise Bitrix24APIError("ERROR_ACTIVITY_ALREADY_INSTALLED", "Activity already installed")
+            return original_call(method, params)
+
+        print(f"{'активити':>8} {'схема':<11} {'сценарий':<10} {'запросов':>9} {'мс':>9}")
+        for count in args.activities:
+            for scheme in ("sequential", "registry"):
+                server.activities.clear()
+                registry = ActivityRegistry(definitions(count), TTLCache(MemoryCacheBackend(), "activity", 3600))
+                changed = ActivityRegistry(definitions(count, version=1), registry.stored_hashes)
+                client.call = call if scheme == "sequential" else original_call
+
+                for scenario, current in (("install", registry), ("reinstall", registry), ("changed", changed)):
+                    if scheme == "sequential":
+                        result = measure(server, lambda: sequential(client, current.definitions))
+                    else:
+                        result = measure(server, lambda: current.sync(client, MEMBER_ID))
+                    print(f"{count:>8} {scheme:<11} {scenario:<10} {result['requests']:>9} {result['ms']:>9.1f}")
+        client.call = original_call
+
+        # Ответ вебхука установки: регистрация активити выполняется в фоне
+        server.activities.clear()
+        started = time.perf_counter()
+        response = app.test_client().post("/install", data={
+            "event": "ONAPPINSTALL", "auth[member_id]": MEMBER_ID, "auth[access_token]": "bench",
+            "auth[refresh_token]": "bench", "auth[client_endpoint]": server.endpoint,
+            "auth[expires]": str(int(time.time()) + 3600), "auth[domain]": "install.bitrix24.ru",
+        })
+        elapsed = (time.perf_counter() - started) * 1000
+        deadline = time.monotonic() + 10
+        while not server.activities and time.monotonic() < deadline:
+            time.sleep(0.01)
+        print(f"\n/install: {response.status_code} за {elapsed:.1f} мс, активити на портале: {sorted(server.activities)}")
+
+        services.shutdown()
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
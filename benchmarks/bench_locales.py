@@ -0,0 +1,79 @@
+"""
+Скорость convert в зависимости от количества валют в таблицах языка и по парам (язык, валюта)
+
+Поиск валюты — одно обращение к словарю, поэтому время convert не должно зависеть
+от того, сколько валют описано в языке. Кеш результатов отключён, измеряется сборка строки.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_locales --count 100000
+"""
+
+import argparse
+import random
+import time
+
+from amount2words.amount2words import Amount2Words
+from amount2words.locales import LOCALES, CompiledLocale
+
+
+def generate_amounts(count: int, seed: int = 42) -> list:
+    """
+    Суммы в виде строк с копейками, как в денежных полях Bitrix24
+    """
+
+    rnd = random.Random(seed)
+    cents = [rnd.randint(0, 10 ** rnd.randint(2, 14)) for _ in range(count)]
+    return [f"{c // 100}.{c % 100:02d}" for c in cents]
+
+
+def with_currencies(language: str, count: int) -> CompiledLocale:
+    """
+    Компилирует язык с заданным количеством валют: RUB и синтетические копии
+    """
+
+    spec = dict(LOCALES[language])
+    rub = spec["currencies"]["RUB"]
+    spec["currencies"] = {"RUB": rub, **{f"X{index:03d}": rub for index in range(count - 1)}}
+    return CompiledLocale(language, spec)
+
+
+def measure(converter: Amount2Words, amounts: list, currency: str, repeat: int = 5) -> float:
+    """
+    Лучшее из нескольких повторов время преобразования всех сумм в секундах
+    """
+
+    convert = converter.convert
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for amount in amounts:
+            convert(amount, currency)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000, help="Количество сумм в наборе")
+    args = parser.parse_args()
+
+    amounts = generate_amounts(args.count)
+
+    print(f"{'валют в языке':<16} {'время':>10} {'мкс/сумма':>10}")
+    for currencies in (1, len(LOCALES["ru"]["currencies"]), 1000):
+        converter = Amount2Words(cache_size=0)
+        converter._locale = with_currencies("ru", currencies)
+        elapsed = measure(converter, amounts, "RUB")
+        print(f"{currencies:<16} {elapsed:8.3f} s {elapsed / len(amounts) * 1e6:10.2f}")
+
+    print()
+    print(f"{'язык/валюта':<16} {'время':>10} {'мкс/сумма':>10}")
+    for language, spec in LOCALES.items():
+        converter = Amount2Words(language, cache_size=0)
+        for currency in spec["currencies"]:
+            elapsed = measure(converter, amounts, currency)
+            print(f"{language + '/' + currency:<16} {elapsed:8.3f} s {elapsed / len(amounts) * 1e6:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Стоимость журнала на один запрос: прежний синхронный StreamHandler против очереди с выводом JSON в фоновом потоке
+
+На запрос приходятся записи, которые делает обработчик активити: конвертация, запись поля и итог запроса.
+Вывод идёт в приёмник, который тратит --sink-latency секунд на каждую запись — так ведёт себя stdout,
+когда читатель (docker, journald) не успевает. Измеряется время, которое записи журнала занимают
+в потоке запроса; остальная часть запроса имитируется ожиданием --io-time.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_logging --requests 20000 --threads 4 --sink-latency 0.0001
+"""
+
+import argparse
+import logging
+import threading
+import time
+from typing import List, Tuple
+
+from lib.structured_logging import build_handler, start_request
+
+
+class SlowSink:
+    """
+    Приёмник вывода с задержкой на каждую запись
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text: str):
+        if self.latency:
+            time.sleep(self.latency)
+        self.lines += text.count("\n")
+
+    def flush(self):
+        pass
+
+
+def legacy_handler(sink: SlowSink) -> logging.Handler:
+    """
+    Прежняя настройка build_logger: StreamHandler с текстовым форматом в потоке запроса
+    """
+
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)-8s %(name)s — %(message)s"))
+    return handler
+
+
+def async_handler(sink: SlowSink, sample_rate: float) -> logging.Handler:
+    """
+    Новая настройка: очередь, JSON, контекст запроса и прореживание
+    """
+
+    handler = build_handler("json", sample_rate)
+    handler.target.setStream(sink)
+    return handler
+
+
+def simulate_requests(logger: logging.Logger, requests: int, threads: int, io_time: float) -> Tuple[float, float]:
+    """
+    Записи журнала, которые делает один запрос к обработчику активити. Между запросами поток
+    ждёт io_time секунд — как ожидание ответов Bitrix24 в настоящем запросе
+
+    :return: Среднее и p99 времени записей журнала за запрос в микросекундах
+    """
+
+    per_thread = requests // threads
+    costs: List[float] = []
+    text = "Одна тысяча двести тридцать четыре рубля 50 копеек"
+
+    def worker():
+        thread_costs = []
+        perf_counter = time.perf_counter
+        for index in range(per_thread):
+            start_request()
+            started = perf_counter()
+            logger.info("Конвертация: %s → %s", f"{index}.50|RUB", text, extra={"sample": True})
+            logger.info("Поле %s обновлено: → %s", "UF_CRM_AMOUNT_WORDS", text, extra={"sample": True})
+            logger.info("%s %s → %s", "POST", "/amount2words-handler", 200,
+                        extra={"sample": True, "status": 200, "duration_ms": 1.0})
+            thread_costs.append(perf_counter() - started)
+            if io_time:
+                time.sleep(io_time)
+        costs.extend(thread_costs)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    costs.sort()
+    return sum(costs) / len(costs) * 1e6, costs[min(int(len(costs) * 0.99), len(costs) - 1)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000, help="Количество запросов")
+    parser.add_argument("--threads", type=int, default=4, help="Потоков запросов")
+    parser.add_argument("--sink-latency", type=float, default=0.0001, help="Задержка приёмника на запись в секундах")
+    parser.add_argument("--io-time", type=float, default=0.001, help="Ожидание ввода-вывода в запросе в секундах")
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="Доля массовых записей в режиме с прореживанием")
+    args = parser.parse_args()
+
+    cases = [
+        ("StreamHandler (прежний)", lambda sink: legacy_handler(sink)),
+        ("очередь + JSON", lambda sink: async_handler(sink, 1.0)),
+        (f"очередь + JSON, выборка {args.sample_rate:g}", lambda sink: async_handler(sink, args.sample_rate)),
+    ]
+
+    print(f"{'журнал':<30} {'мкс/запрос':>11} {'p99, мкс':>9} {'строк':>8} {'отброшено':>10}")
+    for name, make_handler in cases:
+        sink = SlowSink(args.sink_latency)
+        handler = make_handler(sink)
+        logger = logging.getLogger(f"bench.{name}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+
+        mean, p99 = simulate_requests(logger, args.requests, args.threads, args.io_time)
+        if hasattr(handler, "flush_and_stop"):
+            handler.flush_and_stop()
+
+        print(f"{name:<30} {mean:>11.1f} {p99:>9.1f} {sink.lines:>8} {getattr(handler, 'dropped', 0):>10}")
+
+
+if __name__ == "__main__":
+    main()
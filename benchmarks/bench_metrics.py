@@ -0,0 +1,102 @@
+"""
+Накладные расходы метрик: обновление счётчика и гистограммы, замер блока, вывод /metrics
+
+Для сравнения приводится время конвертации суммы (из кеша и без него) и вызова метода API
+у локального имитатора Bitrix24 — на обработку одной активити приходится около десяти обновлений метрик.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_metrics --count 200000
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+
+from amount2words.amount2words import Amount2Words
+from benchmarks.fake_bitrix import start_server
+from lib.bitrix24_client import Bitrix24Client
+from lib.metrics import MetricsRegistry
+from lib.token_store import JsonFileTokenStore
+
+
+def measure(func, count: int) -> float:
+    """
+    Время одного вызова func в микросекундах
+    """
+
+    started = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def measure_threads(func, count: int, threads: int) -> float:
+    """
+    Время одного вызова func в микросекундах при одновременных вызовах из нескольких потоков
+    """
+
+    per_thread = count // threads
+    workers = [threading.Thread(target=lambda: [func() for _ in range(per_thread)]) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / (per_thread * threads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200_000, help="Количество операций в замере")
+    parser.add_argument("--threads", type=int, default=4, help="Потоков в замере с конкуренцией")
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_calls", "Вызовы", ("method",))
+    histogram = registry.histogram("bench_call_seconds", "Длительность", ("method", "status"))
+
+    def timed_block():
+        with histogram.time("crm.deal.update", 200):
+            pass
+
+    converter = Amount2Words(cache_size=0)
+    cached_converter = Amount2Words()
+    cached_converter.convert("1234567.89")
+
+    rows = [
+        ("Counter.inc", measure(lambda: counter.inc("crm.deal.update"), args.count)),
+        ("Histogram.observe", measure(lambda: histogram.observe(0.042, "crm.deal.update", 200), args.count)),
+        ("Histogram.time", measure(timed_block, args.count)),
+        (f"Histogram.observe, {args.threads} потока",
+         measure_threads(lambda: histogram.observe(0.042, "crm.deal.update", 200), args.count, args.threads)),
+        ("convert (из кеша)", measure(lambda: cached_converter.convert("1234567.89"), args.count)),
+        ("convert (без кеша)", measure(lambda: converter.convert("1234567.89"), args.count // 10)),
+    ]
+
+    # Вызов API у имитатора: соединение keep-alive, без задержки ответа
+    server = start_server()
+    with tempfile.TemporaryDirectory() as workdir:
+        store = JsonFileTokenStore(f"{workdir}/tokens.json")
+        store.set("bench", {
+            "access_token": "bench", "refresh_token": "bench",
+            "client_endpoint": server.endpoint, "expires": time.time() + 3600,
+        })
+        client = Bitrix24Client("bench", "bench", token_store=store, member_id="bench", rate_limit=0)
+        rows.append(("Bitrix24Client.call", measure(lambda: client.call("crm.deal.update", {"id": 1}), 2000)))
+        client.close()
+    server.shutdown()
+
+    # Вывод /metrics: гистограммы по 50 методам и 3 статусам
+    for index in range(50):
+        for status in (200, 400, 503):
+            histogram.observe(0.01, f"method.{index}", status)
+    rows.append(("render, 150 рядов гистограммы", measure(registry.render, 200)))
+
+    print(f"{'операция':<34} {'мкс':>9}")
+    for name, elapsed in rows:
+        print(f"{name:<34} {elapsed:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Поведение обработчика активити при недоступности портала: исходящая очередь и выключатель
+
+Три фазы против имитатора Bitrix24: портал работает (--healthy секунд), портал отвечает 503
+на все вызовы (--outage секунд), портал восстановился — ожидание, пока исходящая очередь
+доставит отложенные вызовы (не дольше --recovery секунд). Всё это время --concurrency потоков
+отправляют вебхуки активити с записью поля в сделку.
+
+Для каждой конфигурации выводится время ответа обработчика по фазам, сколько активити
+завершено (bizproc.event.send дошёл до портала), сколько осталось незавершёнными и за сколько
+секунд после восстановления очередь опустела. Конфигурации: без выключателя и с выключателем
+(--circuit-threshold сбоев подряд).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_outage --healthy 2 --outage 5 --concurrency 4
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.fake_bitrix import FakeBitrixServer, start_server
+
+MEMBER_ID = "outage"
+
+
+def configure_environment(workdir: str):
+    """
+    Настройки приложения для замера: обработка прямо в запросе, без кешей и ограничения темпа
+    """
+
+    os.environ.update(
+        PORT="5000",
+        ENV="PRODUCTION",
+        APP_URL="http://127.0.0.1",
+        BITRIX24_CLIENT_ID="bench",
+        BITRIX24_CLIENT_SECRET="bench",
+        TOKEN_STORE="json",
+        TOKEN_STORE_PATH=os.path.join(workdir, "tokens.json"),
+        IDEMPOTENCY_BACKEND="memory",
+        ASYNC_WORKERS="0",
+        BATCH_WINDOW="0",
+        RATE_LIMIT="0",
+        TOKEN_RENEW_INTERVAL="0",
+        FIELD_VALUE_TTL="0",
+        METRICS_DIR="",
+        OUTBOX_INTERVAL="0.2",
+        OUTBOX_MAX_DELAY="2",
+    )
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Перцентиль отсортированного списка
+    """
+
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def run_case(server: FakeBitrixServer, workdir: str, name: str, circuit_threshold: int, args) -> Dict[str, float]:
+    """
+    Прогон трёх фаз с заданным порогом выключателя
+
+    :return: Итоги прогона
+    """
+
+    import main
+
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+
+    # Настройки читаются при создании сервисов: у каждой конфигурации свой порог и свой файл очереди
+    main.CIRCUIT_THRESHOLD = circuit_threshold
+    main.CIRCUIT_RESET_TIMEOUT = args.reset_timeout
+    main.OUTBOX_PATH = os.path.join(workdir, f"outbox-{name}.sqlite3")
+
+    app = main.create_app()
+    services = app.extensions["amount2words"]
+    services.bx_clients.get(MEMBER_ID).set_tokens({
+        "access_token": "bench",
+        "refresh_token": "bench",
+        "client_endpoint": server.endpoint,
+        "expires": time.time() + 24 * 3600,
+        "member_id": MEMBER_ID,
+    })
+
+    server.failure_rate = 0.0
+    server.events.clear()
+    phase = {"name": "healthy"}
+    latencies: Dict[str, List[float]] = {"healthy": [], "outage": []}
+    sent: List[str] = []
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def worker(index: int):
+        client = app.test_client()
+        sequence = 0
+        while not stop.is_set():
+            sequence += 1
+            event_token = f"{name}|{index}|{sequence}"
+            started = time.perf_counter()
+            client.post("/amount2words-handler", data={
+                "event_token": event_token,
+                "auth[member_id]": MEMBER_ID,
+                "properties[SOURCE_AMOUNT]": f"{sequence}.50|RUB",
+                "properties[RESULT]": "UF_CRM_AMOUNT_WORDS",
+                "document_id[2]": f"DEAL_{index * 100_000 + sequence}",
+            })
+            with lock:
+                latencies[phase["name"]].append(time.perf_counter() - started)
+                sent.append(event_token)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.healthy)
+    phase["name"] = "outage"
+    server.failure_rate = 1.0
+    time.sleep(args.outage)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    # Портал восстановился: отложенные вызовы доставляет фоновый поток исходящей очереди
+    server.failure_rate = 0.0
+    recovered_at = time.monotonic()
+    drained = None
+    while time.monotonic() - recovered_at < args.recovery:
+        if services.outbox.stats()["pending"] == 0:
+            drained = time.monotonic() - recovered_at
+            break
+        time.sleep(0.1)
+
+    stats = services.outbox.stats()
+    services.shutdown()
+
+    completed = sum(1 for event_token in sent if server.events.get(event_token))
+    outage = sorted(latencies["outage"])
+    healthy = sorted(latencies["healthy"])
+    return {
+        "healthy_p50": percentile(healthy, 0.5) * 1000,
+        "outage_p50": percentile(outage, 0.5) * 1000,
+        "outage_p99": percentile(outage, 0.99) * 1000,
+        "outage_requests": len(outage),
+        "sent": len(sent),
+        "completed": completed,
+        "lost": len(sent) - completed,
+        "dead": stats["dead"],
+        "drained": drained,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--healthy", type=float, default=2.0, help="Секунд работы портала до сбоя")
+    parser.add_argument("--outage", type=float, default=5.0, help="Секунд недоступности портала")
+    parser.add_argument("--recovery", type=float, default=30.0, help="Наибольшее ожидание доставки после восстановления")
+    parser.add_argument("--concurrency", type=int, default=4, help="Потоков, отправляющих вебхуки")
+    parser.add_argument("--latency", type=float, default=0.01, help="Задержка ответа имитатора в секундах")
+    parser.add_argument("--circuit-threshold", type=int, default=5, help="Сбоев подряд до размыкания выключателя")
+    parser.add_argument("--reset-timeout", type=float, default=1.0, help="Время разомкнутого выключателя в секундах")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(workdir)
+
+        cases = [("no-breaker", 0), ("breaker", args.circuit_threshold)]
+        print(f"{'конфигурация':<12} {'p50 норма':>10} {'p50 сбой':>10} {'p99 сбой':>10} {'запросов в сбой':>16} "
+              f"{'отправлено':>11} {'завершено':>10} {'потеряно':>9} {'отказ':>6} {'доставка, с':>12}")
+        for name, threshold in cases:
+            result = run_case(server, workdir, name, threshold, args)
+            drained = "—" if result["drained"] is None else f"{result['drained']:.1f}"
+            print(f"{name:<12} {result['healthy_p50']:>10.1f} {result['outage_p50']:>10.1f} {result['outage_p99']:>10.1f} "
+                  f"{result['outage_requests']:>16} {result['sent']:>11} {result['completed']:>10} {result['lost']:>9} "
+                  f"{result['dead']:>6} {drained:>12}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Сравнение разбора суммы: прежняя цепочка float → round → int и parse_amount
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_parse_amount --count 200000
+"""
+
+import argparse
+import random
+import time
+
+from amount2words.parsing import parse_amount
+
+
+def float_chain(amount):
+    """
+    Прежний разбор из Amount2Words.convert (до перехода на parse_amount)
+    """
+
+    amount = round(float(str(amount).split("|")[0]), 2)
+    rubles = int(amount)
+    kopeks = int(round((amount - rubles) * 100))
+    return rubles, kopeks
+
+
+def generate_inputs(count: int, seed: int = 42) -> dict:
+    """
+    Наборы входных данных в форматах, которые встречаются в Bitrix24
+    """
+
+    rnd = random.Random(seed)
+    cents = [rnd.randint(0, 10 ** rnd.randint(2, 14)) for _ in range(count)]
+
+    return {
+        "money '1234.50|RUB'": [f"{c // 100}.{c % 100:02d}|RUB" for c in cents],
+        "string '1234.5'": [f"{c // 100}.{c % 100}" for c in cents],
+        "int": [c // 100 for c in cents],
+        "float": [c / 100 for c in cents],
+    }
+
+
+def measure(func, values, repeat: int = 5) -> float:
+    """
+    Лучшее из нескольких повторов время разбора всех значений в секундах
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for value in values:
+            func(value)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200_000, help="Количество значений в наборе")
+    args = parser.parse_args()
+
+    print(f"{'набор':<24} {'float-цепочка':>14} {'parse_amount':>14} {'расхождений':>12}")
+    for name, values in generate_inputs(args.count).items():
+        old_time = measure(float_chain, values)
+        new_time = measure(parse_amount, values)
+        mismatches = sum(float_chain(value) != parse_amount(value)[:2] for value in values)
+        print(f"{name:<24} {old_time:12.3f} s {new_time:12.3f} s {mismatches:12d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Время холодного старта: импорт main, создание приложения, прогрев и первый запрос
+
+Каждый замер — новый процесс Python: импорт main, create_app, прогрев (в режиме warm — как
+в мастере gunicorn при preload; в режиме cold прогрева нет, таблицы и NumPy загружаются
+в первом запросе) и два запроса к обработчику активити против имитатора Bitrix24.
+Выводятся медианы по --repeat запускам в миллисекундах.
+Флаг --importtime дополнительно выводит модули с наибольшим временем импорта (python -X importtime).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --repeat 5
+    python -m benchmarks.bench_startup --importtime
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+from benchmarks.fake_bitrix import start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Код замера в новом процессе: печатает JSON с длительностями этапов
+CHILD = r"""
+import json, os, sys, time
+
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.create_app(start_services=False)
+created = time.perf_counter()
+services = app.extensions["amount2words"]
+# cold: без прогрева и без фоновых потоков (start запустил бы прогрев в фоне) — всё строится в первом запросе
+if sys.argv[1] == "warm":
+    services.warm_up()
+    services.start()
+warmed = time.perf_counter()
+
+services.bx_clients.get("startup").set_tokens({
+    "access_token": "startup", "refresh_token": "startup", "member_id": "startup",
+    "client_endpoint": os.environ["FAKE_ENDPOINT"], "expires": time.time() + 3600,
+})
+client = app.test_client()
+timings = []
+for index in range(2):
+    request_started = time.perf_counter()
+    response = client.post("/amount2words-handler", data={
+        "event_token": f"startup|{index}", "auth[member_id]": "startup",
+        "properties[SOURCE_AMOUNT]": "1234.50|RUB", "properties[RESULT]": "UF_CRM_AMOUNT_WORDS",
+        "document_id[2]": f"DEAL_{index + 1}",
+    })
+    assert response.status_code == 200, response.status_code
+    timings.append(time.perf_counter() - request_started)
+
+services.shutdown()
+print(json.dumps({
+    "import": imported - started,
+    "create_app": created - imported,
+    "warm_up": warmed - created,
+    "first_request": timings[0],
+    "second_request": timings[1],
+}))
+"""
+
+STAGES = ("import", "create_app", "warm_up", "first_request", "second_request")
+
+
+def child_environment(workdir: str, endpoint: str) -> Dict[str, str]:
+    """
+    Окружение процесса замера: файлы во временном каталоге, без фоновых потоков и кешей
+    """
+
+    return dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        FAKE_ENDPOINT=endpoint,
+        ENV="PRODUCTION",
+        LOG_FORMAT="json",
+        APP_URL="http://127.0.0.1",
+        BITRIX24_CLIENT_ID="startup",
+        BITRIX24_CLIENT_SECRET="startup",
+        TOKEN_STORE="json",
+        TOKEN_STORE_PATH=os.path.join(workdir, "tokens.json"),
+        IDEMPOTENCY_BACKEND="memory",
+        OUTBOX_PATH=os.path.join(workdir, "outbox.sqlite3"),
+        ASYNC_WORKERS="0",
+        BATCH_WINDOW="0",
+        RATE_LIMIT="0",
+        TOKEN_RENEW_INTERVAL="0",
+        FIELD_VALUE_TTL="0",
+        METRICS_DIR="",
+    )
+
+
+def run_child(mode: str, env: Dict[str, str], workdir: str) -> Dict[str, float]:
+    """
+    Один замер в новом процессе
+
+    :param mode: warm — с прогревом перед первым запросом, cold — без прогрева
+    """
+
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, mode], cwd=workdir, env=env,
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_profile(env: Dict[str, str], workdir: str, top: int = 15) -> List[str]:
+    """
+    Модули с наибольшим суммарным временем импорта main (python -X importtime)
+    """
+
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=workdir, env=env,
+        check=True, capture_output=True, text=True,
+    ).stderr
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line.split("|"))
+        rows.append((int(cumulative), name))
+
+    rows.sort(reverse=True)
+    return [f"{cumulative / 1000:8.1f} мс  {name}" for cumulative, name in rows[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Запусков на режим")
+    parser.add_argument("--importtime", action="store_true", help="Вывести самые долгие импорты")
+    args = parser.parse_args()
+
+    server = start_server()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = child_environment(workdir, server.endpoint)
+
+        print(f"{'режим':<6} " + " ".join(f"{stage:>15}" for stage in STAGES) + f" {'до ответа':>10}")
+        for mode in ("cold", "warm"):
+            runs = [run_child(mode, env, workdir) for _ in range(args.repeat)]
+            medians = {stage: statistics.median(run[stage] for run in runs) * 1000 for stage in STAGES}
+            # От запуска процесса до ответа на первый запрос
+            total = sum(medians[stage] for stage in ("import", "create_app", "warm_up", "first_request"))
+            print(f"{mode:<6} " + " ".join(f"{medians[stage]:>15.1f}" for stage in STAGES) + f" {total:>10.1f}")
+
+        if args.importtime:
+            print("\nСамые долгие импорты main (суммарно с вложенными):")
+            for line in import_profile(env, workdir):
+                print(line)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Локальный имитатор REST API Bitrix24 для нагрузочных тестов и бенчмарков
+
+Отвечает на вызовы методов /rest/<метод>.json (включая batch) и на обновление токена
+GET /oauth/token/. Задержка ответа имитирует время обработки запроса порталом.
+crm.deal.list отдаёт страницы из --deals сгенерированных сделок (фильтр >ID, по 50 штук).
+Доля --failure-rate вызовов методов получает 503 INTERNAL_SERVER_ERROR — имитация сбоев портала;
+failure_rate = 1 — портал недоступен.
+bizproc.activity.add / delete (в том числе в batch) меняют список, который отдаёт bizproc.activity.list.
+Для тестов метод можно заставить ответить заданными ответами по порядку (FakeBitrixServer.script).
+
+Запуск из корня проекта:
+    python -m benchmarks.fake_bitrix --port 8081 --latency 0.05 --failure-rate 0.2
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBitrixHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов имитатора. Задержка берётся из атрибута latency сервера
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # Заголовки и тело уходят отдельными пакетами: без TCP_NODELAY каждый ответ ждёт delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload):
+        """
+        Отправляет JSON-ответ с Content-Length, чтобы соединение оставалось keep-alive.
+        bytes отправляются как есть — ответ не в формате JSON
+        """
+
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if not isinstance(payload, bytes) else "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _time_block(self, started: float) -> dict:
+        """
+        Блок 'time' ответа, как у настоящего портала
+        """
+
+        now = time.time()
+        return {"start": started, "finish": now, "duration": now - started, "processing": now - started,
+                "operating": 0, "operating_reset_at": int(now) + 600}
+
+    def do_GET(self):
+        started = time.time()
+        time.sleep(self.server.latency)
+        self.server.count("oauth")
+
+        scripted = self.server.next_response("oauth")
+        if scripted is not None:
+            return self._send(*scripted)
+
+        self._send(200, {
+            "access_token": f"access-{time.monotonic_ns()}",
+            "refresh_token": f"refresh-{time.monotonic_ns()}",
+            "expires": int(time.time()) + 3600,
+            "expires_in": 3600,
+            "client_endpoint": f"http://127.0.0.1:{self.server.server_port}/rest/",
+            "time": self._time_block(started),
+        })
+
+    def do_POST(self):
+        started = time.time()
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        time.sleep(self.server.latency)
+
+        method = self.path.rsplit("/", 1)[-1].removesuffix(".json")
+        self.server.count(method)
+        self.server.requests.append((method, json.loads(raw or b"{}")))
+
+        scripted = self.server.next_response(method)
+        if scripted is not None:
+            return self._send(*scripted)
+
+        if self.server.failure_rate and random.random() < self.server.failure_rate:
+            self.server.count("failed")
+            return self._send(503, {"error": "INTERNAL_SERVER_ERROR", "error_description": "Имитация сбоя портала"})
+
+        if method == "crm.deal.list":
+            params = json.loads(raw or b"{}")
+            return self._send(200, {"result": self.server.list_deals(params), "time": self._time_block(started)})
+
+        if method == "bizproc.event.send":
+            self.server.complete_event(json.loads(raw or b"{}").get("event_token"))
+
+        if method == "bizproc.activity.list":
+            return self._send(200, {"result": sorted(self.server.activities), "time": self._time_block(started)})
+
+        if method == "bizproc.activity.add":
+            self.server.activities.add(json.loads(raw or b"{}").get("CODE"))
+
+        if method == "batch":
+            commands = json.loads(raw or b"{}").get("cmd") or {}
+            for command in commands.values():
+                batch_method, _, query = command.partition("?")
+                if batch_method == "bizproc.event.send":
+                    self.server.complete_event(dict(parse_qsl(query)).get("event_token"))
+                elif batch_method == "bizproc.activity.add":
+                    self.server.activities.add(dict(parse_qsl(query)).get("CODE"))
+                elif batch_method == "bizproc.activity.delete":
+                    self.server.activities.discard(dict(parse_qsl(query)).get("CODE"))
+            result = {"result": {key: True for key in commands}, "result_error": []}
+            return self._send(200, {"result": result, "time": self._time_block(started)})
+
+        self._send(200, {"result": True, "time": self._time_block(started)})
+
+
+class FakeBitrixServer(ThreadingHTTPServer):
+    """
+    Многопоточный HTTP-сервер имитатора со счётчиком вызовов по методам
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, deals: int = 0, failure_rate: float = 0.0):
+        """
+        :param port: Порт (0 — любой свободный)
+        :param latency: Задержка каждого ответа в секундах
+        :param deals: Количество сделок, которые отдаёт crm.deal.list
+        :param failure_rate: Доля вызовов методов, отвечающих 503 (можно менять на ходу)
+        """
+
+        super().__init__(("127.0.0.1", port), FakeBitrixHandler)
+        self.latency = latency
+        self.deals = deals
+        self.failure_rate = failure_rate
+        self.calls = {}
+        # event_token завершённых активити: сколько раз пришёл bizproc.event.send
+        self.events = {}
+        # Коды активити, установленных на портале
+        self.activities = set()
+        # Тела последних запросов к методам по порядку: (метод, параметры)
+        self.requests = deque(maxlen=1000)
+        self._scripted = {}
+        self._calls_lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        """
+        client_endpoint портала для токенов
+        """
+
+        return f"http://127.0.0.1:{self.server_port}/rest/"
+
+    @property
+    def oauth_url(self) -> str:
+        """
+        Адрес обновления токена вместо oauth.bitrix.info
+        """
+
+        return f"http://127.0.0.1:{self.server_port}/oauth/token/"
+
+    def list_deals(self, params: dict) -> list:
+        """
+        Страница crm.deal.list: сделки с ID больше фильтра '>ID' или из списка фильтра 'ID',
+        сумма в поле OPPORTUNITY
+        """
+
+        deal_filter = params.get("filter") or {}
+        if "ID" in deal_filter:
+            deal_ids = sorted(int(deal_id) for deal_id in deal_filter["ID"] if 0 < int(deal_id) <= self.deals)[:50]
+        else:
+            after_id = int(deal_filter.get(">ID") or 0)
+            deal_ids = range(after_id + 1, min(after_id + 50, self.deals) + 1)
+
+        return [
+            {"ID": str(deal_id), "OPPORTUNITY": f"{deal_id * 37 % 10_000_000}.{deal_id % 100:02d}", "CURRENCY_ID": "RUB"}
+            for deal_id in deal_ids
+        ]
+
+    def complete_event(self, event_token: str):
+        """
+        Учитывает завершение активити
+        """
+
+        with self._calls_lock:
+            self.events[event_token] = self.events.get(event_token, 0) + 1
+
+    def script(self, method: str, *responses):
+        """
+        Задаёт ответы следующих вызовов метода (oauth — обновление токена). После них метод отвечает как обычно
+
+        :param responses: Пары (HTTP-статус, JSON-тело или bytes — тело не в формате JSON)
+        """
+
+        with self._calls_lock:
+            self._scripted.setdefault(method, []).extend(responses)
+
+    def next_response(self, method: str):
+        """
+        Следующий заданный ответ метода или None
+        """
+
+        with self._calls_lock:
+            responses = self._scripted.get(method)
+            return responses.pop(0) if responses else None
+
+    def count(self, method: str):
+        """
+        Учитывает вызов метода
+        """
+
+        with self._calls_lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+
+def start_server(port: int = 0, latency: float = 0.0, deals: int = 0, failure_rate: float = 0.0) -> FakeBitrixServer:
+    """
+    Запускает имитатор в фоновом потоке текущего процесса
+
+    :return: Сервер (остановка — server.shutdown())
+    """
+
+    server = FakeBitrixServer(port, latency, deals, failure_rate)
+    # Короткий интервал опроса: shutdown() в тестах не ждёт полсекунды
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, name="fake-bitrix", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081, help="Порт")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа в секундах")
+    parser.add_argument("--deals", type=int, default=0, help="Количество сделок для crm.deal.list")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Доля вызовов, отвечающих 503")
+    args = parser.parse_args()
+
+    server = FakeBitrixServer(args.port, args.latency, args.deals, args.failure_rate)
+    print(f"Имитатор Bitrix24: {server.endpoint}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Нагрузочный тест продакшен-режима: gunicorn с разным числом воркеров против имитатора Bitrix24
+
+Для каждого значения --workers запускается gunicorn -c gunicorn.conf.py wsgi:app, и в течение
+--duration секунд клиенты отправляют вебхуки активити с уникальными event_token.
+Каждый вебхук — полный путь обработки: разбор тела, конвертация, crm.deal.update и bizproc.event.send.
+Генератор нагрузки работает в отдельных процессах, поэтому на той же машине он тоже потребляет
+ядра: рост запросов/с виден, пока воркеров меньше, чем свободных ядер.
+
+Запуск из корня проекта:
+    python -m benchmarks.load_test --workers 1,2,4 --duration 10 --latency 0.02
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+from benchmarks.fake_bitrix import FakeBitrixServer
+
+MEMBER_ID = "loadtest"
+
+
+def free_port() -> int:
+    """
+    Свободный TCP-порт на localhost
+    """
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_fake_bitrix(port: int, latency: float):
+    """
+    Имитатор Bitrix24 в отдельном процессе, чтобы не делить GIL с генератором нагрузки
+    """
+
+    FakeBitrixServer(port, latency).serve_forever()
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    """
+    Ждёт, пока сервер начнёт принимать соединения
+    """
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Сервер на порту {port} не запустился за {timeout} с")
+
+
+def activity_body(index: int) -> bytes:
+    """
+    Тело вебхука активити с уникальным event_token
+    """
+
+    return urlencode({
+        "event_token": f"{uuid.uuid4().hex}|{index}",
+        "auth[member_id]": MEMBER_ID,
+        "properties[SOURCE_AMOUNT]": f"{index * 37 % 10_000_000}.{index % 100:02d}|RUB",
+        "properties[RESULT]": "UF_CRM_AMOUNT_WORDS",
+        "document_id[0]": "crm",
+        "document_id[1]": "CCrmDocumentDeal",
+        "document_id[2]": f"DEAL_{index}",
+    }).encode()
+
+
+def client_process(port: int, connections: int, duration: float, seed: int, results):
+    """
+    Процесс генератора нагрузки: connections потоков с keep-alive соединениями
+    """
+
+    counts = []
+    latencies = []
+    errors = []
+    stop_at = time.monotonic() + duration
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+    def worker(number: int):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        index = (seed * 1000 + number) * 1_000_000
+        done = failed = 0
+        while time.monotonic() < stop_at:
+            index += 1
+            started = time.perf_counter()
+            try:
+                connection.request("POST", "/amount2words-handler", activity_body(index), headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            if ok:
+                done += 1
+                latencies.append(time.perf_counter() - started)
+            else:
+                failed += 1
+        counts.append(done)
+        errors.append(failed)
+        connection.close()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results.put((sum(counts), sum(errors), latencies))
+
+
+def run_load(port: int, clients: int, connections: int, duration: float) -> dict:
+    """
+    Запускает clients процессов генератора нагрузки и собирает результат
+    """
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=client_process, args=(port, connections, duration, seed, results))
+        for seed in range(clients)
+    ]
+    for process in processes:
+        process.start()
+
+    done = failed = 0
+    latencies = []
+    for _ in processes:
+        count, errors, process_latencies = results.get()
+        done += count
+        failed += errors
+        latencies.extend(process_latencies)
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+
+    def percentile(share: float) -> float:
+        return latencies[min(int(len(latencies) * share), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    return {"rps": done / duration, "errors": failed, "p50_ms": percentile(0.5), "p99_ms": percentile(0.99)}
+
+
+def start_gunicorn(port: int, workers: int, threads: int, workdir: str) -> subprocess.Popen:
+    """
+    Запускает приложение в gunicorn с заданным числом воркеров
+    """
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_WORKERS=str(workers),
+        WEB_THREADS=str(threads),
+        ENV="PRODUCTION",
+        APP_URL="http://127.0.0.1",
+        BITRIX24_CLIENT_ID="loadtest",
+        BITRIX24_CLIENT_SECRET="loadtest",
+        TOKEN_STORE="json",
+        TOKEN_STORE_PATH=os.path.join(workdir, "tokens.json"),
+        IDEMPOTENCY_BACKEND="memory",
+        OUTBOX_PATH=os.path.join(workdir, "outbox.sqlite3"),
+        ASYNC_WORKERS="0",
+        BATCH_WINDOW="0",
+        RATE_LIMIT="0",
+        TOKEN_RENEW_INTERVAL="0",
+        # Каждый вебхук проходит полный путь с записью в сделку
+        FIELD_VALUE_TTL="0",
+    )
+    log_path = os.path.join(workdir, f"gunicorn-{workers}.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+            cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+
+    try:
+        wait_for_port(port)
+    except TimeoutError:
+        process.kill()
+        with open(log_path, encoding="utf-8", errors="replace") as log:
+            print(log.read()[-4000:], file=sys.stderr)
+        raise
+    return process
+
+
+def main():
+    cpu_count = multiprocessing.cpu_count()
+    default_workers = ",".join(str(2 ** power) for power in range(cpu_count.bit_length()) if 2 ** power <= cpu_count)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=default_workers, help="Количества воркеров gunicorn через запятую")
+    parser.add_argument("--threads", type=int, default=4, help="Потоков в воркере gunicorn")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность замера в секундах")
+    parser.add_argument("--clients", type=int, default=max(cpu_count // 2, 1), help="Процессов генератора нагрузки")
+    parser.add_argument("--connections", type=int, default=16, help="Соединений на процесс генератора")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа имитатора Bitrix24 в секундах")
+    parser.add_argument("--json", dest="json_path", help="Сохранить результаты в JSON-файл")
+    args = parser.parse_args()
+
+    bitrix_port = free_port()
+    bitrix = multiprocessing.Process(target=run_fake_bitrix, args=(bitrix_port, args.latency), daemon=True)
+    bitrix.start()
+    wait_for_port(bitrix_port)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "tokens.json"), "w", encoding="utf-8") as file:
+            json.dump({MEMBER_ID: {
+                "access_token": "loadtest",
+                "refresh_token": "loadtest",
+                "client_endpoint": f"http://127.0.0.1:{bitrix_port}/rest/",
+                "expires": time.time() + 24 * 3600,
+                "member_id": MEMBER_ID,
+            }}, file)
+
+        print(f"ядер: {cpu_count}, потоков в воркере: {args.threads}, "
+              f"генератор: {args.clients} × {args.connections} соединений, задержка Bitrix24: {args.latency} с")
+        print(f"{'воркеров':>8} {'запросов/с':>11} {'ускорение':>10} {'p50, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+
+        for workers in [int(value) for value in args.workers.split(",")]:
+            port = free_port()
+            server = start_gunicorn(port, workers, args.threads, workdir)
+            try:
+                result = run_load(port, args.clients, args.connections, args.duration)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(60)
+
+            result["workers"] = workers
+            rows.append(result)
+            speedup = result["rps"] / rows[0]["rps"] if rows[0]["rps"] else 0.0
+            print(f"{workers:>8} {result['rps']:>11.1f} {speedup:>9.2f}x "
+                  f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['errors']:>7}")
+
+    bitrix.terminate()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump({"cpu_count": cpu_count, "threads": args.threads, "results": rows}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Набор бенчмарков горячих путей с сохранением результатов в JSON и проверкой регрессий
+
+Сценарии:
+    convert/<диапазон>   — Amount2Words.convert без кеша результатов по порядкам сумм
+    convert/cached       — convert повторяющейся суммы (попадание в кеш)
+    morph                — выбор словоформы
+    parse_nested/<тело>  — parse_qsl + parse_nested на записанных телах вебхуков (benchmarks/payloads)
+    parse_form/<тело>    — разбор тела за один проход
+    extract_fields       — выборка полей вебхука активити
+    handler              — полный путь POST /amount2words-handler: разбор, конвертация, crm.deal.update
+                           и bizproc.event.send к имитатору Bitrix24 с задержкой --latency
+    handler/return       — то же без поля результата: сумма возвращается в bizproc.event.send, один вызов API
+    handler/multi        — три пары сумма → поле в одной активити: одна конвертация пачкой и один crm.deal.update
+
+Для каждого сценария: операций в секунду, p50/p99 времени операции и память, выделяемая
+за операцию (пик tracemalloc сверх уже занятой, отдельный прогон, чтобы трассировка не искажала время).
+
+Запуск из корня проекта:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.15   # код 1 при регрессии
+    python -m benchmarks.run --only convert,morph
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from amount2words.amount2words import Amount2Words
+from amount2words.morph import morph
+from lib.utils import extract_fields, parse_form, parse_nested
+
+PAYLOADS_DIR = Path(__file__).parent / "payloads"
+
+# Диапазоны сумм для convert: от единиц до триллионов
+MAGNITUDES = {
+    "units": (0, 999),
+    "thousands": (1_000, 999_999),
+    "millions": (1_000_000, 999_999_999),
+    "billions": (1_000_000_000, 999_999_999_999),
+    "trillions": (1_000_000_000_000, 999_999_999_999_999),
+}
+
+ACTIVITY_FIELDS = (
+    "event_token",
+    "auth[member_id]",
+    "properties[SOURCE_AMOUNT]",
+    "properties[SOURCE_AMOUNT][]",
+    "properties[RESULT]",
+    "properties[RESULT][]",
+    "properties[LANGUAGE]",
+    "document_id[2]",
+)
+
+# Сценарий: операция для вызова и количество операций в замере
+Case = Tuple[Callable[[], Any], int]
+
+
+def load_payload(name: str) -> bytes:
+    """
+    Записанное тело вебхука Bitrix24 (application/x-www-form-urlencoded)
+    """
+
+    return (PAYLOADS_DIR / f"{name}.txt").read_bytes().strip()
+
+
+def cycle(values: List[Any]) -> Callable[[], Any]:
+    """
+    Функция, по кругу возвращающая значения из набора
+    """
+
+    state = {"index": -1}
+    size = len(values)
+
+    def next_value():
+        state["index"] = (state["index"] + 1) % size
+        return values[state["index"]]
+
+    return next_value
+
+
+def convert_cases(count: int) -> Dict[str, Case]:
+    """
+    Сценарии convert: суммы с копейками из каждого диапазона, набор одинаковый между запусками
+    """
+
+    rng = random.Random(16)
+    converter = Amount2Words(cache_size=0)
+    cases: Dict[str, Case] = {}
+
+    for name, (low, high) in MAGNITUDES.items():
+        amounts = cycle([f"{rng.randint(low, high)}.{rng.randint(0, 99):02d}" for _ in range(1000)])
+        cases[f"convert/{name}"] = (lambda amounts=amounts: converter.convert(amounts()), count)
+
+    cached = Amount2Words()
+    cases["convert/cached"] = (lambda: cached.convert("1234567.89"), count)
+    return cases
+
+
+def parsing_cases(count: int) -> Dict[str, Case]:
+    """
+    Сценарии разбора записанных тел вебхуков
+    """
+
+    cases: Dict[str, Case] = {}
+    forms = ("руб.", "руб.", "руб.")
+    numbers = cycle(list(range(1000)))
+    cases["morph"] = (lambda: morph(numbers(), forms), count)
+
+    for name in ("install", "activity"):
+        body = load_payload(name)
+        text = body.decode()
+        cases[f"parse_nested/{name}"] = (lambda text=text: parse_nested(dict(parse_qsl(text, keep_blank_values=True))), count)
+        cases[f"parse_form/{name}"] = (lambda body=body: parse_form(body), count)
+
+    activity = load_payload("activity")
+    cases["extract_fields"] = (lambda: extract_fields(activity, ACTIVITY_FIELDS), count)
+    return cases
+
+
+def handler_cases(count: int, latency: float, workdir: str):
+    """
+    Полный путь обработки вебхука активити в приложении Flask против имитатора Bitrix24.
+    Каждая операция — уникальный event_token, запись поля не подавляется кешем
+
+    :return: Сценарии и функция остановки имитатора
+    """
+
+    from benchmarks.fake_bitrix import start_server
+
+    server = start_server(latency=latency)
+    os.environ.update(
+        PORT="5000",
+        ENV="PRODUCTION",
+        APP_URL="http://127.0.0.1",
+        BITRIX24_CLIENT_ID="bench",
+        BITRIX24_CLIENT_SECRET="bench",
+        TOKEN_STORE="json",
+        TOKEN_STORE_PATH=os.path.join(workdir, "tokens.json"),
+        IDEMPOTENCY_BACKEND="memory",
+        OUTBOX_PATH=os.path.join(workdir, "outbox.sqlite3"),
+        ASYNC_WORKERS="0",
+        BATCH_WINDOW="0",
+        RATE_LIMIT="0",
+        TOKEN_RENEW_INTERVAL="0",
+        FIELD_VALUE_TTL="0",
+        METRICS_DIR="",
+    )
+
+    import logging
+    import main
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    app = main.create_app()
+    services = app.extensions["amount2words"]
+    services.bx_clients.get("bench").set_tokens({
+        "access_token": "bench",
+        "refresh_token": "bench",
+        "client_endpoint": server.endpoint,
+        "expires": time.time() + 24 * 3600,
+        "member_id": "bench",
+    })
+
+    template = dict(parse_qsl(load_payload("activity").decode(), keep_blank_values=True))
+    template["auth[member_id]"] = "bench"
+    local = threading.local()
+    sequence = iter(range(10 ** 12))
+
+    # Множественные свойства: итог, НДС и предоплата в одной активити
+    multi = {
+        "properties[SOURCE_AMOUNT][0]": template["properties[SOURCE_AMOUNT]"],
+        "properties[SOURCE_AMOUNT][1]": "205761.32|RUB",
+        "properties[SOURCE_AMOUNT][2]": "370370.37|RUB",
+        "properties[RESULT][0]": "UF_CRM_AMOUNT_WORDS",
+        "properties[RESULT][1]": "UF_CRM_VAT_WORDS",
+        "properties[RESULT][2]": "UF_CRM_PREPAYMENT_WORDS",
+    }
+    single = {key: value for key, value in template.items() if key not in ("properties[SOURCE_AMOUNT]", "properties[RESULT]")}
+
+    def request(result_field: str = None):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        if result_field is None:
+            data = dict(single, **multi, event_token=f"bench|{next(sequence)}")
+        else:
+            data = dict(template, event_token=f"bench|{next(sequence)}")
+            data["properties[RESULT]"] = result_field
+        response = client.post("/amount2words-handler", data=data)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.data!r}")
+
+    def stop():
+        services.shutdown()
+        server.shutdown()
+
+    cases = {
+        "handler": (lambda: request(template["properties[RESULT]"]), count),
+        "handler/return": (lambda: request(""), count),
+        "handler/multi": (lambda: request(None), count),
+    }
+    return cases, stop
+
+
+def measure(func: Callable[[], Any], count: int, concurrency: int = 1) -> Dict[str, float]:
+    """
+    Замер сценария: время каждой операции и общая пропускная способность
+
+    :param concurrency: Количество потоков, одновременно вызывающих func
+    """
+
+    # Прогрев: кеши, соединения, ленивые импорты
+    for _ in range(min(count // 10, 100) or 1):
+        func()
+
+    per_thread = max(count // concurrency, 1)
+    timings: List[List[float]] = [[] for _ in range(concurrency)]
+
+    def worker(samples: List[float]):
+        perf_counter = time.perf_counter
+        for _ in range(per_thread):
+            started = perf_counter()
+            func()
+            samples.append(perf_counter() - started)
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(timings[0])
+    else:
+        threads = [threading.Thread(target=worker, args=(samples,)) for samples in timings]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = sorted(value for thread_samples in timings for value in thread_samples)
+    return {
+        "ops": len(samples),
+        "ops_per_sec": len(samples) / elapsed,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1e6,
+        "alloc_bytes": measure_allocations(func, min(count, 500)),
+    }
+
+
+def measure_allocations(func: Callable[[], Any], count: int) -> float:
+    """
+    Средний пик памяти, выделяемой за одну операцию (байт), по данным tracemalloc
+    """
+
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(count):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            total += max(peak - current, 0)
+    finally:
+        tracemalloc.stop()
+
+    return total / count
+
+
+def git_commit() -> Optional[str]:
+    """
+    Текущий коммит репозитория, если он доступен
+    """
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """
+    Сравнивает результаты с базовыми
+
+    :param threshold: Допустимая доля ухудшения пропускной способности и p50
+    :return: Описания регрессий
+    """
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {result['ops_per_sec']:.0f} оп/с против {base['ops_per_sec']:.0f}")
+        if result["p50_us"] > base["p50_us"] * (1 + threshold):
+            regressions.append(f"{name}: p50 {result['p50_us']:.1f} мкс против {base['p50_us']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=50_000, help="Операций в замере микробенчмарков")
+    parser.add_argument("--handler-count", type=int, default=500, help="Запросов в замере handler")
+    parser.add_argument("--concurrency", type=int, default=4, help="Потоков, одновременно отправляющих запросы в handler")
+    parser.add_argument("--latency", type=float, default=0.005, help="Задержка ответа имитатора Bitrix24 в секундах")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов замера, в результат идёт лучший")
+    parser.add_argument("--only", default="", help="Префиксы сценариев через запятую")
+    parser.add_argument("--output", help="Сохранить результаты в JSON-файл")
+    parser.add_argument("--baseline", help="JSON-файл прошлого запуска для проверки регрессий")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Допустимая доля ухудшения")
+    args = parser.parse_args()
+
+    prefixes = [prefix for prefix in args.only.split(",") if prefix]
+
+    def selected(name: str) -> bool:
+        return not prefixes or any(name.startswith(prefix) for prefix in prefixes)
+
+    cases: Dict[str, Case] = {}
+    cases.update(convert_cases(args.count))
+    cases.update(parsing_cases(args.count))
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'сценарий':<24} {'оп/с':>12} {'p50, мкс':>10} {'p99, мкс':>10} {'байт/оп':>9}")
+
+    def report(name: str, result: Dict[str, float]):
+        results[name] = result
+        print(f"{name:<24} {result['ops_per_sec']:>12.0f} {result['p50_us']:>10.1f} "
+              f"{result['p99_us']:>10.1f} {result['alloc_bytes']:>9.0f}")
+
+    for name, (func, count) in cases.items():
+        if selected(name):
+            runs = [measure(func, count) for _ in range(args.repeat)]
+            report(name, max(runs, key=lambda run: run["ops_per_sec"]))
+
+    if selected("handler"):
+        with tempfile.TemporaryDirectory() as workdir:
+            handler, stop = handler_cases(args.handler_count, args.latency, workdir)
+            try:
+                for name, (func, count) in handler.items():
+                    if selected(name):
+                        runs = [measure(func, count, args.concurrency) for _ in range(args.repeat)]
+                        report(name, max(runs, key=lambda run: run["ops_per_sec"]))
+            finally:
+                stop()
+
+    document = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.time(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(document, file, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\nРегрессии:", *regressions, sep="\n  ")
+            sys.exit(1)
+        print(f"\nРегрессий нет (порог {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Конфигурация gunicorn: несколько процессов-воркеров с пулом потоков в каждом
+
+Запуск:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+import os
+import glob
+import tempfile
+import multiprocessing
+from dotenv import load_dotenv
+
+# Переменные из .env нужны уже здесь: порт, число воркеров, каталог метрик
+load_dotenv()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Процессы обходят GIL и масштабируются по ядрам; потоки покрывают ожидание ответов Bitrix24
+workers = int(os.environ.get("WEB_WORKERS") or multiprocessing.cpu_count())
+threads = int(os.environ.get("WEB_THREADS", "4"))
+
+# Лимит запросов к порталу (RATE_LIMIT) общий: каждый воркер получает свою долю
+os.environ["RATE_LIMIT_PROCESSES"] = os.environ.get("RATE_LIMIT_PROCESSES") or str(workers)
+worker_class = "gthread"
+
+# Приложение и таблицы конвертеров загружаются в мастере один раз и разделяются воркерами (copy-on-write)
+preload_app = True
+
+timeout = int(os.environ.get("WEB_TIMEOUT", "30"))
+# Воркеру даётся время дообработать принятые активити (ASYNC_DRAIN_TIMEOUT)
+graceful_timeout = int(float(os.environ.get("ASYNC_DRAIN_TIMEOUT", "30"))) + 5
+keepalive = 5
+
+accesslog = os.environ.get("WEB_ACCESS_LOG") or None
+errorlog = "-"
+
+# Каждый воркер пишет снимок своих метрик, /metrics любого воркера суммирует их все.
+# Конфигурация читается до загрузки приложения, поэтому переменная видна main.py
+metrics_dir = os.environ.get("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "amount2words-metrics")
+os.environ["METRICS_DIR"] = metrics_dir
+
+
+def when_ready(server):
+    """
+    Мастер загрузил приложение: объекты переводятся в постоянное поколение сборщика мусора,
+    чтобы он не трогал их в воркерах и общие страницы памяти не копировались
+    """
+
+    # Снимки метрик предыдущего запуска не относятся к новым воркерам
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        os.unlink(path)
+
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """
+    Воркер загрузил приложение: запускаются фоновые потоки (очередь задач, обновление токенов)
+    """
+
+    worker.wsgi.extensions["amount2words"].start()
+
+
+def worker_exit(server, worker):
+    """
+    Воркер завершается: дообрабатываются принятые активити и закрываются сессии
+    """
+
+    services = getattr(worker.wsgi, "extensions", {}).get("amount2words")
+    if services is not None:
+        services.shutdown()
@@ -0,0 +1,111 @@
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Tuple
+
+from lib.bitrix24_client import BaseBitrix24Client
+from lib.idempotency import TTLCache
+from lib.metrics import REGISTRY
+
+logger = logging.getLogger("app")
+
+ACTIVITY_CHANGES = REGISTRY.counter(
+    "activity_registry_changes", "Изменения активити порталов по действию и результату", ("action", "result")
+)
+
+# Описания активити приложения: код → поля для bizproc.activity.add
+ActivityDefinitions = Dict[str, Dict[str, Any]]
+
+
+def definition_hash(fields: Dict[str, Any]) -> str:
+    """
+    Хеш содержимого описания активити: не зависит от порядка ключей
+    """
+
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ActivityRegistry:
+    """
+    Декларативный реестр активити приложения.
+
+    Описания задаются в коде, синхронизация приводит к ним портал: один вызов bizproc.activity.list,
+    сравнение с локальными описаниями и один вызов batch только с нужными add / update / delete.
+    Изменение описания определяется по хешу, сохранённому после последней успешной записи на портал:
+    неизменившиеся активити не отправляются. Если хеш неизвестен (кеш очищен, хранилище в памяти
+    после перезапуска), установленная активити обновляется — лишний вызов, но не ошибка
+    """
+
+    def __init__(self, definitions: ActivityDefinitions, hashes: TTLCache):
+        """
+        :param definitions: Описания активити: код → поля
+        :param hashes: Хеши описаний, записанных на портал: ключ "member_id:код"
+        """
+
+        self.definitions = definitions
+        self.hashes = {code: definition_hash(fields) for code, fields in definitions.items()}
+        self.stored_hashes = hashes
+
+    def plan(self, member_id: str, installed: List[str]) -> List[Tuple[str, str, Tuple[str, Dict[str, Any]]]]:
+        """
+        Изменения, приводящие портал к локальным описаниям
+
+        :param member_id: Идентификатор портала
+        :param installed: Коды активити, установленных приложением на портале
+        :return: Список (действие: add, update, delete; код; вызов API (метод, параметры))
+        """
+
+        changes = []
+        installed_codes = set(installed)
+
+        for code, fields in self.definitions.items():
+            if code not in installed_codes:
+                changes.append(("add", code, ("bizproc.activity.add", {"CODE": code, **fields})))
+            elif self.stored_hashes.get(f"{member_id}:{code}") != self.hashes[code]:
+                changes.append(("update", code, ("bizproc.activity.update", {"CODE": code, "FIELDS": fields})))
+
+        # Активити, убранные из приложения, удаляются с портала
+        for code in installed:
+            if code not in self.definitions:
+                changes.append(("delete", code, ("bizproc.activity.delete", {"CODE": code})))
+
+        return changes
+
+    def sync(self, client: BaseBitrix24Client, member_id: str) -> Dict[str, List[str]]:
+        """
+        Синхронизирует активити портала с локальными описаниями: не больше двух вызовов API
+
+        :param client: Клиент портала
+        :param member_id: Идентификатор портала
+        :return: Коды активити по результату: added, updated, deleted, unchanged, failed
+        """
+
+        installed = list(client.call("bizproc.activity.list") or [])
+        changes = self.plan(member_id, installed)
+
+        summary: Dict[str, List[str]] = {"added": [], "updated": [], "deleted": [], "unchanged": [], "failed": []}
+        changed_codes = {code for _, code, _ in changes}
+        summary["unchanged"] = [code for code in self.definitions if code not in changed_codes]
+
+        if not changes:
+            return summary
+
+        results = client.call_batch([command for _, _, command in changes])
+
+        for (action, code, _), result in zip(changes, results):
+            error = result["error"]
+            ACTIVITY_CHANGES.inc(action, "error" if error else "ok")
+            if error:
+                logger.warning("Активити %s портала %s: %s не выполнено: %s", code, member_id, action, error)
+                summary["failed"].append(code)
+                continue
+
+            if action == "delete":
+                self.stored_hashes.release(f"{member_id}:{code}")
+                summary["deleted"].append(code)
+            else:
+                self.stored_hashes.set(f"{member_id}:{code}", self.hashes[code])
+                summary["added" if action == "add" else "updated"].append(code)
+
+        return summary
@@ -0,0 +1,281 @@
+import time
+import asyncio
+import aiohttp
+from typing import Any, Dict, List, Optional, Tuple
+
+from lib.bitrix24_client import BaseBitrix24Client, Bitrix24APIError, TOKEN_REFRESH_SECONDS
+from lib.token_store import TokenStore
+
+
+class AsyncBitrix24Client(BaseBitrix24Client):
+    """
+    Асинхронный клиент для работы с Bitrix24 на aiohttp.
+    Хранение токенов, обновление и разбор ответов общие с Bitrix24Client
+    """
+
+    def __init__(
+            self,
+            client_id: str,
+            client_secret: str,
+            tokens_file: str = 'utils_bitrix_app_tokens.json',
+            pool_size: int = 100,
+            timeout: Tuple[float, float] = (5.0, 30.0),
+            max_retries: int = 3,
+            backoff_factor: float = 0.5,
+            token_store: TokenStore = None,
+            member_id: str = None,
+            rate_limit: float = 2.0,
+            rate_burst: int = 50,
+            circuit_threshold: int = 5,
+            circuit_reset_timeout: float = 30.0,
+    ):
+        """
+        Инициализация клиента
+
+        :param client_id: OAuth client_id приложения Bitrix24
+        :param client_secret: OAuth client_secret приложения Bitrix24
+        :param tokens_file: Путь к JSON-файлу для хранения токенов (если token_store не передан)
+        :param pool_size: Максимальное количество одновременных соединений к одному хосту
+        :param timeout: Таймауты (подключение, чтение) в секундах
+        :param max_retries: Количество повторов при 5xx и QUERY_LIMIT_EXCEEDED
+        :param backoff_factor: Базовая задержка экспоненциального повтора в секундах
+        :param token_store: Хранилище токенов нескольких порталов
+        :param member_id: Идентификатор портала в хранилище токенов
+        :param rate_limit: Темп запросов к порталу в секунду, 0 — без ограничения
+        :param rate_burst: Количество запросов, отправляемых подряд без ожидания
+        :param circuit_threshold: Вызовов без ответа портала подряд, после которых вызовы отклоняются сразу;
+            0 — не отклонять
+        :param circuit_reset_timeout: Время отклонения вызовов до пробного вызова в секундах
+        """
+
+        super().__init__(
+            client_id, client_secret, tokens_file,
+            max_retries=max_retries, backoff_factor=backoff_factor,
+            token_store=token_store, member_id=member_id,
+            rate_limit=rate_limit, rate_burst=rate_burst,
+            circuit_threshold=circuit_threshold, circuit_reset_timeout=circuit_reset_timeout,
+        )
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: aiohttp.ClientSession = None
+        self._async_refresh_lock = asyncio.Lock()
+
+    @classmethod
+    def from_client(cls, client: BaseBitrix24Client, **kwargs) -> "AsyncBitrix24Client":
+        """
+        Создаёт асинхронный клиент, разделяющий токены с существующим клиентом.
+        Обновление токенов одним клиентом сразу видно другому, а блокировка
+        обновления общая — refresh_token не обновляется двумя клиентами одновременно.
+        Планировщик запросов и выключатель портала тоже общие: лимит портала соблюдается суммарно,
+        а недоступность портала, замеченная одним клиентом, сразу видна другому
+
+        :param client: Синхронный (или другой асинхронный) клиент
+        :return: Асинхронный клиент
+        """
+
+        async_client = cls(
+            client.client_id, client.client_secret,
+            token_store=client.token_store, member_id=client.member_id, **kwargs
+        )
+        async_client._tokens = client._tokens
+        async_client._refresh_lock = client._refresh_lock
+        async_client.rate_limiter = client.rate_limiter
+        async_client.circuit_breaker = client.circuit_breaker
+        return async_client
+
+    async def __aenter__(self) -> "AsyncBitrix24Client":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает HTTP-сессию, создавая её в текущем event loop при первом обращении
+        """
+
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = self.timeout
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_size),
+                timeout=aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout),
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Закрывает HTTP-сессию и все соединения пула
+        """
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, http_method: str, url: str, rate_limited: bool = False, **kwargs) -> Tuple[int, Any]:
+        """
+        Выполняет HTTP-запрос с повторами при перегрузке портала
+
+        :param rate_limited: Дожидаться очереди планировщика запросов портала перед каждой попыткой
+        :return: Пара (HTTP-статус, разобранное JSON-тело или None)
+        """
+
+        session = self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+
+            if rate_limited and self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+
+            try:
+                async with session.request(http_method, url, **kwargs) as response:
+                    try:
+                        data = await response.json(content_type=None)
+                    except ValueError:
+                        data = None
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+            except aiohttp.ClientConnectionError:
+                if last_attempt:
+                    raise
+                await asyncio.sleep(self._backoff_delay(attempt))
+                continue
+
+            if not last_attempt and self._is_retryable(status, data):
+                await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+                continue
+
+            return status, data
+
+    async def _refresh_access_token(self):
+        """
+        Обновляет access_token, используя refresh_token
+        """
+
+        params = self._refresh_params()
+        started = time.perf_counter()
+        result = "error"
+
+        try:
+            try:
+                status, data = await self._request("GET", self.OAUTH_URL, params=params)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                raise ConnectionError(f"Ошибка при обновлении токена: {error}")
+
+            if status >= 400 or not isinstance(data, dict):
+                raise ConnectionError(f"Ошибка при обновлении токена: HTTP {status}")
+
+            # Сохраняем новые токены
+            self.set_tokens(data)
+            result = "ok"
+        finally:
+            TOKEN_REFRESH_SECONDS.observe(time.perf_counter() - started, result)
+
+    async def _refresh_if_expiring(self):
+        """
+        Обновляет токен, если он всё ещё истекает. Корутины ждут на asyncio.Lock,
+        а общая с синхронным клиентом threading.Lock и блокировка хранилища
+        захватываются без блокировки event loop
+        """
+
+        async with self._async_refresh_lock:
+            if not self._token_expiring():
+                return
+
+            while not self._refresh_lock.acquire(blocking=False):
+                await asyncio.sleep(0.01)
+
+            try:
+                # Блокировка хранилища общая для процессов — тоже без блокировки event loop
+                store_lock = self.token_store.refresh_lock(self.member_id)
+                while not store_lock.acquire(blocking=False):
+                    await asyncio.sleep(0.01)
+
+                try:
+                    self._reload_tokens()
+                    if self._token_expiring():
+                        await self._refresh_access_token()
+                finally:
+                    store_lock.release()
+            finally:
+                self._refresh_lock.release()
+
+    async def call(self, method: str, params: Dict[str, Any] = None):
+        """
+        Выполняет вызов метода API Bitrix24
+
+        :param method: Метод API (например, 'crm.lead.list')
+        :param params: Параметры запроса (словарь)
+        :return: Результат выполнения запроса (содержимое поля 'result')
+        """
+
+        self._ensure_initialized()
+
+        if self._token_expiring():
+            await self._refresh_if_expiring()
+
+        try:
+            return await self._call_once(method, params)
+        except Bitrix24APIError as error:
+            if not self._stale_token(error):
+                raise
+
+        return await self._call_once(method, params)
+
+    async def _call_once(self, method: str, params: Optional[Dict[str, Any]]):
+        """
+        Одна попытка вызова метода с текущим access_token (повторы при перегрузке — в _request)
+        """
+
+        url, params = self._prepare_call(method, params)
+        self._check_circuit(method)
+
+        started = self._call_started()
+        status, error_code = "error", None
+
+        try:
+            try:
+                status, data = await self._request("POST", url, rate_limited=True, json=params)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                error_code = "NETWORK_ERROR"
+                raise ConnectionError(f"Ошибка сетевого запроса: {error}")
+
+            if not isinstance(data, dict):
+                error_code = "HTTP_ERROR"
+                raise ConnectionError(f"Ошибка сетевого запроса: HTTP {status}, ответ не в формате JSON")
+
+            self._observe_response(data)
+            result = self._extract_result(data)
+            if status >= 400:
+                error_code = "HTTP_ERROR"
+                raise ConnectionError(f"Ошибка сетевого запроса: HTTP {status}")
+
+            return result
+        except Bitrix24APIError as error:
+            error_code = error.code
+            raise
+        finally:
+            self._call_finished(method, started, status, error_code)
+            self._record_circuit(status, error_code)
+
+    async def call_batch(self, commands: List[Tuple[str, Dict[str, Any]]], halt: bool = False) -> List[Dict[str, Any]]:
+        """
+        Выполняет несколько методов API через метод batch.
+        Пачки по BATCH_LIMIT команд отправляются параллельно
+
+        :param commands: Список пар (метод, параметры)
+        :param halt: Прерывать пачку при первой ошибке
+        :return: Список словарей {'result': ..., 'error': Bitrix24APIError | None} в порядке команд
+        """
+
+        chunks = [
+            self._batch_command(commands[start:start + self.BATCH_LIMIT])
+            for start in range(0, len(commands), self.BATCH_LIMIT)
+        ]
+        responses = await asyncio.gather(*(self.call("batch", {"halt": int(halt), "cmd": cmd}) for cmd in chunks))
+
+        results: List[Dict[str, Any]] = []
+        for cmd, data in zip(chunks, responses):
+            results.extend(self._batch_results(cmd, data))
+
+        return results
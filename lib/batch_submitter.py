@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+
+from lib.bitrix24_client import Bitrix24Client
+
+logger = logging.getLogger("app")
+
+
+class BatchSubmitter:
+    """
+    Накапливает вызовы API из разных потоков и отправляет их одним запросом batch
+    """
+
+    def __init__(self, client: Bitrix24Client, max_size: int = Bitrix24Client.BATCH_LIMIT, window: float = 0.05):
+        """
+        Инициализация
+
+        :param client: Клиент Bitrix24
+        :param max_size: Количество команд, при котором пачка отправляется немедленно
+        :param window: Максимальное время ожидания пачки в секундах с момента первой команды
+        """
+
+        self.client = client
+        self.max_size = min(max_size, Bitrix24Client.BATCH_LIMIT)
+        self.window = window
+        self._pending: List[Tuple[str, Dict[str, Any], Future]] = []
+        self._first_at = 0.0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """
+        Запускает фоновый поток отправки пачек
+        """
+
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._run, name="bitrix24-batch", daemon=True)
+        self._thread.start()
+
+    def submit(self, method: str, params: Dict[str, Any] = None) -> Future:
+        """
+        Ставит вызов метода API в текущую пачку
+
+        :param method: Метод API
+        :param params: Параметры метода
+        :return: Future с результатом метода или исключением Bitrix24APIError
+        """
+
+        future: Future = Future()
+
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("BatchSubmitter не запущен")
+
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append((method, params or {}, future))
+            self._condition.notify()
+
+        return future
+
+    def call(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> Any:
+        """
+        Синхронная обёртка над submit с той же семантикой, что у Bitrix24Client.call
+        """
+
+        return self.submit(method, params).result(timeout)
+
+    def _take_batch(self) -> List[Tuple[str, Dict[str, Any], Future]]:
+        """
+        Ожидает заполнения пачки или истечения окна и забирает накопленные команды
+        """
+
+        with self._condition:
+            while True:
+                if not self._pending:
+                    if not self._running:
+                        return []
+                    self._condition.wait()
+                    continue
+
+                remaining = self._first_at + self.window - time.monotonic()
+                if len(self._pending) >= self.max_size or remaining <= 0 or not self._running:
+                    batch = self._pending[:self.max_size]
+                    self._pending = self._pending[self.max_size:]
+                    self._first_at = time.monotonic()
+                    return batch
+
+                self._condition.wait(remaining)
+
+    def _run(self):
+        """
+        Цикл фонового потока
+        """
+
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[str, Dict[str, Any], Future]]):
+        """
+        Отправляет пачку и раздаёт результаты ожидающим вызовам
+        """
+
+        try:
+            results = self.client.call_batch([(method, params) for method, params, _ in batch])
+        except Exception as error:
+            logger.exception("Ошибка отправки batch (%s команд): %s", len(batch), error)
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+
+        for (_, _, future), item in zip(batch, results):
+            if item["error"] is not None:
+                future.set_exception(item["error"])
+            else:
+                future.set_result(item["result"])
+
+    def shutdown(self, timeout: float = None):
+        """
+        Отправляет накопленные команды и останавливает фоновый поток
+        """
+
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
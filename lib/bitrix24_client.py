@@ -1,55 +1,149 @@
-import json
 import time
+import random
+import logging
+import threading
 import requests
-from pathlib import Path
-from typing import Any, Dict
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, List, Optional, Tuple
 
+from lib.utils import build_query
+from lib.token_store import DEFAULT_KEY, JsonFileTokenStore, TokenStore
+from lib.rate_limiter import RateLimiter
+from lib.circuit_breaker import CircuitBreaker, CircuitOpenError
+from lib.metrics import REGISTRY
 
-class Bitrix24Client:
+logger = logging.getLogger("app")
+
+# Метрики вызовов API, общие для синхронного и асинхронного клиентов
+API_CALL_SECONDS = REGISTRY.histogram(
+    "bitrix24_api_call_seconds", "Длительность вызова метода API Bitrix24 с повторами", ("method", "status")
+)
+API_CALLS_IN_FLIGHT = REGISTRY.gauge("bitrix24_api_calls_in_flight", "Выполняющиеся вызовы API Bitrix24")
+API_ERRORS = REGISTRY.counter("bitrix24_api_errors", "Ошибки вызовов API Bitrix24", ("method", "error"))
+TOKEN_REFRESH_SECONDS = REGISTRY.histogram(
+    "bitrix24_token_refresh_seconds", "Длительность обновления access_token", ("result",)
+)
+
+
+class Bitrix24APIError(Exception):
     """
-    Клиент для работы с Bitrix24
+    Ошибка, возвращённая REST API Bitrix24
+    """
+
+    def __init__(self, code: str, description: str = None):
+        """
+        :param code: Код ошибки (например, 'QUERY_LIMIT_EXCEEDED')
+        :param description: Текстовое описание ошибки
+        """
+
+        super().__init__(f"Ошибка API Bitrix [{code}]: {description}")
+        self.code = code
+        self.description = description
+
+
+class BaseBitrix24Client:
+    """
+    Общая часть синхронного и асинхронного клиентов: хранение токенов,
+    подготовка запросов и разбор ответов. Сетевой ввод-вывод реализуют наследники
     """
 
     # URL OAuth-сервера Bitrix24 для получения и обновления токенов
     OAUTH_URL = "https://oauth.bitrix24.tech/oauth/token/"
 
-    def __init__(self, client_id: str, client_secret: str, tokens_file: str = 'utils_bitrix_app_tokens.json'):
+    # Максимальное количество команд в одном вызове метода batch
+    BATCH_LIMIT = 50
+
+    # HTTP-статусы и коды ошибок API, при которых запрос повторяется
+    RETRY_STATUSES = frozenset({500, 502, 503, 504})
+    RETRY_ERRORS = frozenset({"QUERY_LIMIT_EXCEEDED"})
+
+    # Коды ошибок API, при которых access_token недействителен: его мог заменить другой процесс
+    STALE_TOKEN_ERRORS = frozenset({"expired_token", "invalid_token"})
+
+    # Запас до истечения access_token, при котором он обновляется (секунды)
+    REFRESH_MARGIN = 180
+
+    def __init__(
+            self,
+            client_id: str,
+            client_secret: str,
+            tokens_file: str = 'utils_bitrix_app_tokens.json',
+            max_retries: int = 3,
+            backoff_factor: float = 0.5,
+            token_store: TokenStore = None,
+            member_id: str = None,
+            rate_limit: float = 2.0,
+            rate_burst: int = 50,
+            circuit_threshold: int = 5,
+            circuit_reset_timeout: float = 30.0,
+    ):
         """
         Инициализация клиента
 
         :param client_id: OAuth client_id приложения Bitrix24
         :param client_secret: OAuth client_secret приложения Bitrix24
-        :param tokens_file: Путь к JSON-файлу для хранения токенов
+        :param tokens_file: Путь к JSON-файлу для хранения токенов (если token_store не передан)
+        :param max_retries: Количество повторов при 5xx и QUERY_LIMIT_EXCEEDED
+        :param backoff_factor: Базовая задержка экспоненциального повтора в секундах
+        :param token_store: Хранилище токенов нескольких порталов
+        :param member_id: Идентификатор портала в хранилище токенов
+        :param rate_limit: Темп запросов к порталу в секунду, 0 — без ограничения
+        :param rate_burst: Количество запросов, отправляемых подряд без ожидания
+        :param circuit_threshold: Вызовов без ответа портала подряд, после которых вызовы отклоняются сразу;
+            0 — не отклонять
+        :param circuit_reset_timeout: Время отклонения вызовов до пробного вызова в секундах
         """
 
         self.client_id = client_id
         self.client_secret = client_secret
-        self.settings_file = Path(tokens_file)
+        self.token_store = token_store if token_store is not None else JsonFileTokenStore(tokens_file)
+        self.member_id = member_id or DEFAULT_KEY
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
         self._tokens: Dict[str, Any] = self._load_tokens()
+        self._retries = 0
+        self.rate_limiter: Optional[RateLimiter] = RateLimiter(rate_limit, rate_burst) if rate_limit > 0 else None
+        self.circuit_breaker = CircuitBreaker(self.member_id, circuit_threshold, circuit_reset_timeout)
+
+        # Обновление токена выполняется одним вызывающим, остальные ждут его результата
+        self._refresh_lock = threading.Lock()
 
     def _load_tokens(self) -> Dict[str, Any]:
         """
-        Загружает токены из файла
+        Загружает токены портала из хранилища
 
-        :return: Словарь с токенами или пустой словарь, если файл отсутствует или повреждён
+        :return: Словарь с токенами или пустой словарь, если портал неизвестен
         """
 
-        if not self.settings_file.exists():
-            return {}
+        return self.token_store.get(self.member_id) or {}
 
-        try:
-            with self.settings_file.open(encoding="utf-8") as file:
-                return json.load(file)
-        except (json.JSONDecodeError, IOError):
-            return {}
+    def _reload_tokens(self):
+        """
+        Перечитывает токены портала из хранилища: их мог обновить другой процесс.
+        Словарь обновляется на месте — его разделяют синхронный и асинхронный клиенты
+        """
+
+        tokens = self.token_store.reload(self.member_id)
+        if tokens:
+            self._tokens.update(tokens)
+
+    def _reload_if_changed(self) -> bool:
+        """
+        Перечитывает токены из хранилища после отказа в доступе
+
+        :return: True, если в хранилище другой access_token (его сохранил другой процесс) и вызов стоит повторить
+        """
+
+        access_token = self._tokens.get("access_token")
+        self._reload_tokens()
+        return self._tokens.get("access_token") != access_token
 
     def _save_tokens(self):
         """
-        Сохраняет текущие токены в JSON-файл. Файл перезаписывается полностью
+        Сохраняет текущие токены портала в хранилище
         """
 
-        with self.settings_file.open("w", encoding="utf-8") as file:
-            json.dump(self._tokens, file, indent=4)
+        self.token_store.set(self.member_id, self._tokens)
 
     def set_tokens(self, auth_data: Dict[str, Any]):
         """
@@ -62,33 +156,447 @@ class Bitrix24Client:
         # Фильтруем входящий словарь, оставляя только нужные ключи
         filtered_data = {key: auth_data.get(key) for key in needed_keys}
 
+        # Портал и домен приходят при установке, при обновлении токена сохраняются прежние
+        for key in ("member_id", "domain"):
+            if auth_data.get(key):
+                filtered_data[key] = auth_data[key]
+
         self._tokens.update(filtered_data)
         self._save_tokens()
 
-    def _refresh_access_token(self):
+    def _ensure_initialized(self):
         """
-        Обновляет access_token, используя refresh_token
+        Проверяет наличие endpoint и токенов. Если их нет, токены перечитываются из хранилища:
+        клиент мог быть создан до установки портала, а токены сохранил другой процесс
+        """
+
+        if not self._tokens or not self._tokens.get("client_endpoint"):
+            self._reload_tokens()
+
+        if not self._tokens or not self._tokens.get("client_endpoint"):
+            raise ValueError("Клиент не инициализирован: отсутствует endpoint или токены.")
+
+    def _token_expiring(self, margin: float = None) -> bool:
+        """
+        Проверяет, что access_token истекает в пределах margin (по умолчанию REFRESH_MARGIN)
+        """
+
+        if margin is None:
+            margin = self.REFRESH_MARGIN
+        return time.time() + margin >= float(self._tokens.get("expires") or 0)
+
+    def _refresh_params(self) -> Dict[str, Any]:
+        """
+        Параметры запроса к OAuth-серверу для обновления access_token
         """
 
         if not self._tokens.get("refresh_token"):
             raise ValueError("Отсутствует refresh_token. Требуется повторная авторизация.")
 
-        params = {
+        return {
             "grant_type": "refresh_token",
             "client_id": self.client_id,
             "client_secret": self.client_secret,
             "refresh_token": self._tokens.get("refresh_token"),
         }
 
+    def _stale_token(self, error: Bitrix24APIError) -> bool:
+        """
+        Проверяет, что вызов отклонён из-за устаревшего access_token, а в хранилище уже другой:
+        портал переустановлен или токен обновил другой процесс. Тогда вызов стоит повторить один раз
+        """
+
+        return error.code in self.STALE_TOKEN_ERRORS and self._reload_if_changed()
+
+    def _check_circuit(self, method: str):
+        """
+        Портал не отвечает — вызов отклоняется сразу, не ожидая таймаутов и повторов
+
+        :raises CircuitOpenError: Выключатель портала разомкнут
+        """
+
         try:
-            response = requests.get(self.OAUTH_URL, params=params)
+            self.circuit_breaker.before_call()
+        except CircuitOpenError:
+            API_ERRORS.inc(method, "CIRCUIT_OPEN")
+            raise
+
+    def _record_circuit(self, status: Any, error_code: Optional[str]):
+        """
+        Учитывает результат вызова в выключателе портала
+
+        :param status: HTTP-статус ответа или "error", если ответа нет
+        :param error_code: Код ошибки вызова
+        """
+
+        # Ответ 4xx (в том числе ошибка API) и ограничение темпа (503 QUERY_LIMIT_EXCEEDED) означают,
+        # что портал работает
+        if isinstance(status, int) and (status < 500 or error_code in self.RETRY_ERRORS):
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+
+    def _prepare_call(self, method: str, params: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Формирует URL метода и параметры запроса с access_token
+
+        :return: Пара (url, параметры)
+        """
+
+        # Формирование URL
+        url = f"{self._tokens.get('client_endpoint')}{method}.json"
+
+        # Копия параметров: словарь вызывающего (например, команда исходящей очереди) не должен получить токен
+        params = dict(params or {})
+
+        # Добавляем access_token в параметры
+        params["auth"] = self._tokens.get("access_token")
+
+        return url, params
+
+    @staticmethod
+    def _extract_result(data: Any) -> Any:
+        """
+        Извлекает поле 'result' из ответа API или выбрасывает Bitrix24APIError
+        """
+
+        if isinstance(data, dict) and "error" in data:
+            raise Bitrix24APIError(data.get("error"), data.get("error_description"))
+
+        return data.get("result")
+
+    def _is_retryable(self, status: int, data: Any) -> bool:
+        """
+        Проверяет, нужно ли повторить запрос: 5xx или QUERY_LIMIT_EXCEEDED
+
+        :param status: HTTP-статус ответа
+        :param data: Разобранное JSON-тело ответа (None, если тело не JSON)
+        """
+
+        limit_exceeded = isinstance(data, dict) and data.get("error") == "QUERY_LIMIT_EXCEEDED"
+        if limit_exceeded and self.rate_limiter is not None:
+            # Портал уже ограничивает запросы — замедляем планировщик
+            self.rate_limiter.penalize()
+
+        if status in self.RETRY_STATUSES:
+            return True
+
+        return status >= 400 and isinstance(data, dict) and data.get("error") in self.RETRY_ERRORS
+
+    def _observe_response(self, data: Any):
+        """
+        Передаёт планировщику блок 'time' ответа для подстройки темпа
+        """
+
+        if self.rate_limiter is not None and isinstance(data, dict):
+            self.rate_limiter.update_from_response(data.get("time"))
+
+    @staticmethod
+    def _call_started() -> float:
+        """
+        Учитывает начало вызова API
+
+        :return: Время начала для _call_finished
+        """
+
+        API_CALLS_IN_FLIGHT.inc()
+        return time.perf_counter()
+
+    @staticmethod
+    def _call_finished(method: str, started: float, status: Any, error_code: Optional[str] = None):
+        """
+        Учитывает завершение вызова API
+
+        :param method: Метод API
+        :param started: Результат _call_started
+        :param status: HTTP-статус последней попытки или 'error', если ответа нет
+        :param error_code: Код ошибки API, HTTP_ERROR или NETWORK_ERROR
+        """
+
+        API_CALLS_IN_FLIGHT.dec()
+        API_CALL_SECONDS.observe(time.perf_counter() - started, method, status)
+        if error_code is not None:
+            API_ERRORS.inc(method, error_code)
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Задержка перед повтором: учитывает Retry-After, иначе экспонента с джиттером
+        """
+
+        delay = self.backoff_factor * (2 ** attempt)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+
+        self._retries += 1
+        return delay * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _batch_command(chunk: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, str]:
+        """
+        Формирует параметр cmd метода batch из пачки команд
+        """
+
+        return {
+            f"cmd{index}": f"{method}?{build_query(params or {})}"
+            for index, (method, params) in enumerate(chunk)
+        }
+
+    @staticmethod
+    def _batch_results(cmd: Dict[str, str], data: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Сопоставляет ответ метода batch с командами пачки
+
+        :return: Список словарей {'result': ..., 'error': Bitrix24APIError | None} в порядке команд
+        """
+
+        data = data or {}
+        chunk_results = data.get("result") or {}
+        chunk_errors = data.get("result_error") or {}
+        results: List[Dict[str, Any]] = []
+
+        for key in cmd:
+            error: Optional[Bitrix24APIError] = None
+            # Bitrix возвращает пустой список вместо словаря, если ошибок/результатов нет
+            raw_error = chunk_errors.get(key) if isinstance(chunk_errors, dict) else None
+            if raw_error:
+                error = Bitrix24APIError(raw_error.get("error"), raw_error.get("error_description"))
+            elif isinstance(chunk_results, dict) and key not in chunk_results:
+                # Команда не выполнялась (halt после ошибки предыдущей команды)
+                error = Bitrix24APIError("BATCH_COMMAND_SKIPPED", "Команда не выполнена")
+
+            result = chunk_results.get(key) if isinstance(chunk_results, dict) else None
+            results.append({"result": result, "error": error})
+
+        return results
+
+
+class Bitrix24Client(BaseBitrix24Client):
+    """
+    Клиент для работы с Bitrix24
+    """
+
+    def __init__(
+            self,
+            client_id: str,
+            client_secret: str,
+            tokens_file: str = 'utils_bitrix_app_tokens.json',
+            pool_size: int = 10,
+            timeout: Tuple[float, float] = (5.0, 30.0),
+            max_retries: int = 3,
+            backoff_factor: float = 0.5,
+            token_store: TokenStore = None,
+            member_id: str = None,
+            rate_limit: float = 2.0,
+            rate_burst: int = 50,
+            circuit_threshold: int = 5,
+            circuit_reset_timeout: float = 30.0,
+    ):
+        """
+        Инициализация клиента
+
+        :param client_id: OAuth client_id приложения Bitrix24
+        :param client_secret: OAuth client_secret приложения Bitrix24
+        :param tokens_file: Путь к JSON-файлу для хранения токенов (если token_store не передан)
+        :param pool_size: Максимальное количество keep-alive соединений к одному хосту
+        :param timeout: Таймауты (подключение, чтение) в секундах
+        :param max_retries: Количество повторов при 5xx и QUERY_LIMIT_EXCEEDED
+        :param backoff_factor: Базовая задержка экспоненциального повтора в секундах
+        :param token_store: Хранилище токенов нескольких порталов
+        :param member_id: Идентификатор портала в хранилище токенов
+        :param rate_limit: Темп запросов к порталу в секунду, 0 — без ограничения
+        :param rate_burst: Количество запросов, отправляемых подряд без ожидания
+        :param circuit_threshold: Вызовов без ответа портала подряд, после которых вызовы отклоняются сразу;
+            0 — не отклонять
+        :param circuit_reset_timeout: Время отклонения вызовов до пробного вызова в секундах
+        """
+
+        super().__init__(
+            client_id, client_secret, tokens_file,
+            max_retries=max_retries, backoff_factor=backoff_factor,
+            token_store=token_store, member_id=member_id,
+            rate_limit=rate_limit, rate_burst=rate_burst,
+            circuit_threshold=circuit_threshold, circuit_reset_timeout=circuit_reset_timeout,
+        )
+        self.timeout = timeout
+
+        # Постоянная сессия: TCP+TLS соединения переиспользуются между вызовами
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=False)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+        self._renewer: Optional[threading.Thread] = None
+        self._renewer_stop = threading.Event()
+
+    def close(self):
+        """
+        Останавливает фоновое обновление токена и закрывает HTTP-сессию
+        """
+
+        self.stop_token_renewer()
+        self.session.close()
+
+    def start_token_renewer(self, interval: float = 30.0):
+        """
+        Запускает фоновый поток, обновляющий access_token заранее,
+        чтобы вызовы API не ждали обновления токена
+
+        :param interval: Период проверки срока действия токена в секундах
+        """
+
+        if self._renewer is not None:
+            return
+
+        self._renewer_stop.clear()
+        self._renewer = threading.Thread(
+            target=self._renew_tokens, args=(interval,), name="bitrix24-token-renewer", daemon=True
+        )
+        self._renewer.start()
+
+    def stop_token_renewer(self):
+        """
+        Останавливает фоновое обновление токена
+        """
+
+        if self._renewer is None:
+            return
+
+        self._renewer_stop.set()
+        self._renewer.join()
+        self._renewer = None
+
+    def _renew_tokens(self, interval: float):
+        """
+        Цикл фонового обновления: токен обновляется с запасом в два периода проверки до REFRESH_MARGIN
+        """
+
+        margin = self.REFRESH_MARGIN + 2 * interval
+
+        while not self._renewer_stop.wait(interval):
+            self.renew_token(margin)
+
+    def renew_token(self, margin: float):
+        """
+        Обновляет токен, если до его истечения осталось меньше margin секунд.
+        Ошибки не выбрасываются: при следующей проверке или вызове API попытка повторится
+
+        :param margin: Запас до истечения токена в секундах
+        """
+
+        if not self._tokens.get("refresh_token") or not self._token_expiring(margin):
+            return
+
+        try:
+            self._refresh_if_expiring(margin)
+        except Exception as error:
+            logger.warning("Ошибка фонового обновления токена портала %s: %s", self.member_id, error)
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Возвращает статистику переиспользования соединений пула
+
+        :return: Словарь: запросы, открытые соединения, запросы по уже открытым соединениям, повторы
+        """
+
+        requests_count = 0
+        connections_count = 0
+
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_count += pool.num_requests
+            connections_count += pool.num_connections
+
+        return {
+            "requests": requests_count,
+            "connections": connections_count,
+            "reused": max(requests_count - connections_count, 0),
+            "retries": self._retries,
+        }
+
+    def _request(self, http_method: str, url: str, rate_limited: bool = False, **kwargs) -> requests.Response:
+        """
+        Выполняет HTTP-запрос через сессию с повторами при перегрузке портала
+
+        :param rate_limited: Дожидаться очереди планировщика запросов портала перед каждой попыткой
+        :return: Ответ сервера (последняя попытка)
+        """
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+
+            if rate_limited and self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                response = self.session.request(http_method, url, timeout=self.timeout, **kwargs)
+            except requests.exceptions.ConnectionError:
+                # Запрос не дошёл до сервера — повтор безопасен
+                if last_attempt:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+                continue
+
+            if not last_attempt and self._should_retry(response):
+                time.sleep(self._backoff_delay(attempt, response.headers.get("Retry-After")))
+                continue
+
+            return response
+
+    def _should_retry(self, response: requests.Response) -> bool:
+        """
+        Проверяет, нужно ли повторить запрос по ответу сервера
+        """
+
+        data = None
+        if response.status_code >= 400:
+            try:
+                data = response.json()
+            except ValueError:
+                pass
+
+        return self._is_retryable(response.status_code, data)
+
+    def _refresh_access_token(self):
+        """
+        Обновляет access_token, используя refresh_token
+        """
+
+        params = self._refresh_params()
+        started = time.perf_counter()
+        result = "error"
+
+        try:
+            response = self._request("GET", self.OAUTH_URL, params=params)
             response.raise_for_status()
             data = response.json()
 
             # Сохраняем новые токены
             self.set_tokens(data)
+            result = "ok"
         except requests.exceptions.RequestException as error:
             raise ConnectionError(f"Ошибка при обновлении токена: {error}")
+        finally:
+            TOKEN_REFRESH_SECONDS.observe(time.perf_counter() - started, result)
+
+    def _refresh_if_expiring(self, margin: float = None):
+        """
+        Обновляет токен, если он всё ещё истекает. Одновременно выполняется только одно
+        обновление: остальные потоки ждут его завершения и используют уже новый токен,
+        не отправляя повторно устаревший refresh_token. Между процессами то же обеспечивает
+        блокировка хранилища: перед обновлением токены перечитываются из него
+        """
+
+        with self._refresh_lock:
+            if not self._token_expiring(margin):
+                return
+
+            with self.token_store.refresh_lock(self.member_id):
+                self._reload_tokens()
+                if self._token_expiring(margin):
+                    self._refresh_access_token()
 
     def call(self, method: str, params: Dict[str, Any] = None):
         """
@@ -100,34 +608,73 @@ class Bitrix24Client:
         """
 
         # Проверка наличия базовых данных
-        if not self._tokens or not self._tokens.get("client_endpoint"):
-            raise ValueError("Клиент не инициализирован: отсутствует endpoint или токены.")
+        self._ensure_initialized()
 
         # Проверка и обновление токена (запас 3 минуты = 180 секунд)
         # Если текущее время + 180 сек больше времени истечения токена -> обновляем
-        if time.time() + 180 >= float(self._tokens.get("expires")):
-            self._refresh_access_token()
+        if self._token_expiring():
+            self._refresh_if_expiring()
 
-        # Формирование URL
-        url = f"{self._tokens.get('client_endpoint')}{method}.json"
+        try:
+            return self._call_once(method, params)
+        except Bitrix24APIError as error:
+            if not self._stale_token(error):
+                raise
 
-        # Подготовка параметров
-        if params is None:
-            params = {}
+        return self._call_once(method, params)
 
-        # Добавляем access_token в параметры
-        params["auth"] = self._tokens.get("access_token")
+    def _call_once(self, method: str, params: Optional[Dict[str, Any]]):
+        """
+        Одна попытка вызова метода с текущим access_token (повторы при перегрузке — в _request)
+        """
+
+        url, params = self._prepare_call(method, params)
+        self._check_circuit(method)
+
+        started = self._call_started()
+        status, error_code = "error", None
 
         try:
-            response = requests.post(url, json=params)
-            response.raise_for_status()
-            data = response.json()
+            response = self._request("POST", url, rate_limited=True, json=params)
+            status = response.status_code
 
-            if "error" in data:
-                error_code = data.get("error")
-                error_message = data.get("error_description")
-                raise Exception(f"Ошибка API Bitrix [{error_code}]: {error_message}")
+            # Ошибки API приходят с кодами 4xx/5xx и JSON-телом — сохраняем код ошибки Bitrix
+            try:
+                data = response.json()
+            except ValueError:
+                response.raise_for_status()
+                raise
 
-            return data.get("result")
+            self._observe_response(data)
+            result = self._extract_result(data)
+            response.raise_for_status()
+
+            return result
+        except Bitrix24APIError as error:
+            error_code = error.code
+            raise
         except requests.exceptions.RequestException as error:
+            error_code = "NETWORK_ERROR" if status == "error" else "HTTP_ERROR"
             raise ConnectionError(f"Ошибка сетевого запроса: {error}")
+        finally:
+            self._call_finished(method, started, status, error_code)
+            self._record_circuit(status, error_code)
+
+    def call_batch(self, commands: List[Tuple[str, Dict[str, Any]]], halt: bool = False) -> List[Dict[str, Any]]:
+        """
+        Выполняет несколько методов API через метод batch.
+        Команды разбиваются на пачки по BATCH_LIMIT, каждая пачка — один HTTP-запрос
+
+        :param commands: Список пар (метод, параметры)
+        :param halt: Прерывать пачку при первой ошибке
+        :return: Список словарей {'result': ..., 'error': Bitrix24APIError | None} в порядке команд
+        """
+
+        results: List[Dict[str, Any]] = []
+
+        for start in range(0, len(commands), self.BATCH_LIMIT):
+            cmd = self._batch_command(commands[start:start + self.BATCH_LIMIT])
+            data = self.call("batch", {"halt": int(halt), "cmd": cmd})
+            results.extend(self._batch_results(cmd, data))
+
+        return results
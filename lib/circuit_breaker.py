@@ -0,0 +1,144 @@
+import time
+import threading
+from typing import Dict
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Портал признан недоступным — вызов отклонён без обращения к сети
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        """
+        :param name: Имя выключателя (member_id портала)
+        :param retry_after: Через сколько секунд будет пропущен пробный вызов
+        """
+
+        super().__init__(f"Портал {name} недоступен, повтор через {retry_after:.1f} с")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель вызовов одного портала.
+
+    closed — вызовы проходят; после failure_threshold сбоев подряд выключатель размыкается.
+    open — вызовы сразу отклоняются CircuitOpenError, потоки не ждут таймаутов недоступного портала.
+    half_open — через reset_timeout пропускается один пробный вызов: успех замыкает выключатель,
+    сбой снова размыкает его на reset_timeout
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        :param name: Имя для сообщений и метрик (member_id портала)
+        :param failure_threshold: Сбоев подряд до размыкания, 0 — выключатель не размыкается
+        :param reset_timeout: Время в разомкнутом состоянии до пробного вызова в секундах
+        """
+
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._opened = 0
+
+    @property
+    def state(self) -> str:
+        """
+        Текущее состояние: closed, open или half_open
+        """
+
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        """
+        Через сколько секунд выключатель пропустит пробный вызов (0 — вызовы проходят)
+        """
+
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(self._opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def before_call(self):
+        """
+        Проверяет, можно ли выполнить вызов
+
+        :raises CircuitOpenError: Выключатель разомкнут или пробный вызов уже выполняется
+        """
+
+        if self.failure_threshold <= 0:
+            return
+
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+
+            now = time.monotonic()
+            if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            # Пробный вызов один: остальные отклоняются, пока его результат неизвестен
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+            self._rejected += 1
+            retry_after = max(self._opened_at + self.reset_timeout - now, 0.0)
+
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        """
+        Вызов дошёл до портала и получил ответ — выключатель замыкается
+        """
+
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """
+        Вызов не получил ответа портала (сеть, таймаут, 5xx после всех повторов)
+        """
+
+        if self.failure_threshold <= 0:
+            return
+
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает состояние выключателя
+
+        :return: Словарь: разомкнут ли, сбоев подряд, сколько раз размыкался, отклонённых вызовов
+        """
+
+        state = self.state
+        with self._lock:
+            return {
+                "open": int(state != self.CLOSED),
+                "failures": self._failures,
+                "opened": self._opened,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,191 @@
+import logging
+import threading
+from urllib.parse import urlsplit
+from typing import Any, Dict, List, Optional
+
+from lib.batch_submitter import BatchSubmitter
+from lib.bitrix24_client import Bitrix24Client
+from lib.token_store import DEFAULT_KEY, TokenStore
+
+logger = logging.getLogger("app")
+
+
+def _portal_host(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Домен портала из данных авторизации: поле domain или хост client_endpoint
+    """
+
+    host = data.get("domain") or urlsplit(data.get("client_endpoint") or "").hostname
+    return host.lower() if host else None
+
+
+def _same_portal(tokens: Dict[str, Any], auth: Dict[str, Any]) -> bool:
+    """
+    Проверяет, что сохранённые токены и данные авторизации запроса относятся к одному порталу
+    """
+
+    host = _portal_host(tokens)
+    return host is not None and host == _portal_host(auth or {})
+
+
+class Bitrix24ClientPool:
+    """
+    Клиенты Bitrix24 для нескольких порталов: один клиент (и одна HTTP-сессия) на портал,
+    поиск по member_id — обращение к словарю
+    """
+
+    def __init__(self, client_id: str, client_secret: str, token_store: TokenStore, batch_window: float = 0, **client_options):
+        """
+        Инициализация
+
+        :param client_id: OAuth client_id приложения Bitrix24
+        :param client_secret: OAuth client_secret приложения Bitrix24
+        :param token_store: Хранилище токенов порталов
+        :param batch_window: Окно объединения вызовов в batch в секундах, 0 — без объединения
+        :param client_options: Дополнительные параметры Bitrix24Client (pool_size, timeout, ...)
+        """
+
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_store = token_store
+        self.batch_window = batch_window
+        self.client_options = client_options
+        self._clients: Dict[str, Bitrix24Client] = {}
+        self._submitters: Dict[str, BatchSubmitter] = {}
+        self._lock = threading.Lock()
+        self._renewer: Optional[threading.Thread] = None
+        self._renewer_stop = threading.Event()
+
+    def get(self, member_id: str = None) -> Bitrix24Client:
+        """
+        Возвращает клиент портала, создавая его при первом обращении
+
+        :param member_id: Идентификатор портала (None — портал однопортальной установки)
+        :return: Клиент Bitrix24
+        """
+
+        key = member_id or DEFAULT_KEY
+
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = Bitrix24Client(
+                    self.client_id, self.client_secret,
+                    token_store=self.token_store, member_id=key, **self.client_options
+                )
+                self._clients[key] = client
+
+        return client
+
+    def adopt_default_tokens(self, member_id: str, auth: Dict[str, Any]) -> bool:
+        """
+        Переносит токены однопортальной установки (старый формат файла) на member_id портала,
+        если данные авторизации запроса указывают на тот же портал (домен или client_endpoint).
+        Запрос другого портала токены не получает и не удаляет
+
+        :param member_id: Идентификатор портала из запроса
+        :param auth: Данные авторизации запроса: domain и/или client_endpoint
+        :return: True, если токены перенесены
+        """
+
+        key = member_id or DEFAULT_KEY
+        if key == DEFAULT_KEY or self.token_store.get(key) is not None:
+            return False
+
+        with self._lock:
+            tokens = self.token_store.get(DEFAULT_KEY)
+            if tokens is None or not _same_portal(tokens, auth):
+                return False
+
+            self.token_store.set(key, {**tokens, "member_id": key})
+            self.token_store.delete(DEFAULT_KEY)
+            # Клиент портала, созданный до переноса, перечитает токены из хранилища при вызове
+            self._clients.pop(DEFAULT_KEY, None)
+
+        logger.info("Токены однопортальной установки перенесены на портал %s", key)
+        return True
+
+    def call(self, member_id: str, method: str, params: Dict[str, Any] = None) -> Any:
+        """
+        Вызывает метод API портала — через batch, если объединение вызовов включено
+        """
+
+        if self.batch_window <= 0:
+            return self.get(member_id).call(method, params)
+
+        return self._get_submitter(member_id).call(method, params)
+
+    def _get_submitter(self, member_id: str) -> BatchSubmitter:
+        """
+        Возвращает BatchSubmitter портала, создавая и запуская его при первом обращении
+        """
+
+        key = member_id or DEFAULT_KEY
+
+        submitter = self._submitters.get(key)
+        if submitter is not None:
+            return submitter
+
+        client = self.get(key)
+        with self._lock:
+            submitter = self._submitters.get(key)
+            if submitter is None:
+                submitter = BatchSubmitter(client, window=self.batch_window)
+                submitter.start()
+                self._submitters[key] = submitter
+
+        return submitter
+
+    def clients(self) -> List[Bitrix24Client]:
+        """
+        Возвращает уже созданные клиенты
+        """
+
+        return list(self._clients.values())
+
+    def start_token_renewer(self, interval: float = 30.0):
+        """
+        Запускает один фоновый поток, заранее обновляющий токены всех созданных клиентов
+
+        :param interval: Период проверки срока действия токенов в секундах
+        """
+
+        if self._renewer is not None:
+            return
+
+        self._renewer_stop.clear()
+        self._renewer = threading.Thread(
+            target=self._renew_tokens, args=(interval,), name="bitrix24-token-renewer", daemon=True
+        )
+        self._renewer.start()
+
+    def _renew_tokens(self, interval: float):
+        """
+        Цикл фонового обновления токенов
+        """
+
+        margin = Bitrix24Client.REFRESH_MARGIN + 2 * interval
+
+        while not self._renewer_stop.wait(interval):
+            for client in self.clients():
+                client.renew_token(margin)
+
+    def shutdown(self, timeout: float = None):
+        """
+        Отправляет накопленные batch-команды, останавливает фоновые потоки и закрывает сессии
+        """
+
+        if self._renewer is not None:
+            self._renewer_stop.set()
+            self._renewer.join(timeout)
+            self._renewer = None
+
+        for submitter in list(self._submitters.values()):
+            submitter.shutdown(timeout)
+
+        for client in self.clients():
+            client.close()
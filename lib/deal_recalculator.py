@@ -0,0 +1,326 @@
+import os
+import json
+import logging
+import time
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from amount2words.amount2words import Amount2Words
+from lib.bitrix24_client import Bitrix24Client
+from lib.idempotency import TTLCache, written_value_key
+from lib.outbox import is_transient
+
+logger = logging.getLogger("app")
+
+
+class DealRecalculator:
+    """
+    Пересчёт суммы прописью во всех сделках портала.
+
+    Сделки читаются страницами crm.deal.list с фильтром ID > последнего обработанного и start=-1:
+    портал не считает общее количество, каждая страница — быстрый запрос по первичному ключу.
+    Страница конвертируется пачкой (convert_many) и записывается одним batch с crm.deal.update.
+    В памяти одновременно только одна страница, темп запросов ограничивает планировщик клиента.
+    После каждой записанной страницы сохраняется контрольная точка — прерванный пересчёт продолжается с неё.
+    Команды batch, не выполненные из-за перегрузки портала, повторяются; сделки, которые так и не удалось
+    записать, сохраняются в контрольной точке (retry_ids) и записываются в конце этого или следующего запуска
+    """
+
+    # Размер страницы crm.deal.list; совпадает с лимитом batch — страница записывается одним запросом
+    PAGE_SIZE = Bitrix24Client.BATCH_LIMIT
+
+    def __init__(
+            self,
+            client: Bitrix24Client,
+            converter: Amount2Words,
+            source_field: str,
+            result_field: str,
+            checkpoint_path: str = None,
+            deal_filter: Dict[str, Any] = None,
+            written_values: TTLCache = None,
+            dry_run: bool = False,
+            retry_attempts: int = 3,
+            retry_delay: float = 1.0,
+    ):
+        """
+        :param client: Клиент портала
+        :param converter: Конвертер суммы прописью нужного языка
+        :param source_field: Поле с исходной суммой (денежное поле "1234.50|RUB" или OPPORTUNITY)
+        :param result_field: Поле для суммы прописью
+        :param checkpoint_path: JSON-файл контрольной точки (None — без возобновления)
+        :param deal_filter: Дополнительный фильтр crm.deal.list (например, {"CATEGORY_ID": 1})
+        :param written_values: Кеш записанных значений обработчика активити, обновляется после записи
+        :param dry_run: Только посчитать изменения, ничего не записывая
+        :param retry_attempts: Повторов команд batch с временной ошибкой (QUERY_LIMIT_EXCEEDED, OPERATION_TIME_LIMIT, ...)
+        :param retry_delay: Задержка перед первым повтором в секундах, далее удваивается
+        """
+
+        self.client = client
+        self.converter = converter
+        self.source_field = source_field
+        self.result_field = result_field
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.deal_filter = deal_filter or {}
+        self.written_values = written_values
+        self.dry_run = dry_run
+        self.retry_attempts = retry_attempts
+        self.retry_delay = retry_delay
+        self.state = self._new_state()
+
+    def _new_state(self) -> Dict[str, Any]:
+        """
+        Начальное состояние пересчёта
+        """
+
+        return {
+            "member_id": self.client.member_id,
+            "source_field": self.source_field,
+            "result_field": self.result_field,
+            "last_id": 0,
+            "processed": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "skipped": 0,
+            "failed": 0,
+            # Сделки, не записанные из-за временных ошибок портала: записываются повторно
+            "retry_ids": [],
+            "done": False,
+        }
+
+    def load_checkpoint(self) -> bool:
+        """
+        Загружает контрольную точку
+
+        :return: True, если пересчёт продолжается с сохранённой точки
+        :raises ValueError: Контрольная точка относится к другому порталу или другим полям
+        """
+
+        if self.checkpoint_path is None or not self.checkpoint_path.exists():
+            return False
+
+        with self.checkpoint_path.open(encoding="utf-8") as file:
+            state = json.load(file)
+
+        for key in ("member_id", "source_field", "result_field"):
+            if state.get(key) != self.state[key]:
+                raise ValueError(
+                    f"Контрольная точка {self.checkpoint_path} относится к другому пересчёту: "
+                    f"{key}={state.get(key)!r}, ожидалось {self.state[key]!r}"
+                )
+
+        self.state.update(state)
+        return True
+
+    def _save_checkpoint(self):
+        """
+        Атомарно сохраняет контрольную точку: временный файл + rename
+        """
+
+        if self.checkpoint_path is None or self.dry_run:
+            return
+
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.checkpoint_path.parent), prefix=f".{self.checkpoint_path.name}.", suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(self.state, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.checkpoint_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _select(self) -> List[str]:
+        """
+        Поля сделки, которые читает пересчёт
+        """
+
+        select = ["ID", self.source_field, self.result_field]
+        if self.source_field == "OPPORTUNITY":
+            select.append("CURRENCY_ID")
+        return select
+
+    def iter_pages(self, after_id: int = 0) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Читает сделки страницами по возрастанию ID без подсчёта общего количества
+
+        :param after_id: ID, после которого начинать
+        :return: Генератор страниц (списков сделок)
+        """
+
+        last_id = after_id
+        while True:
+            page = self.client.call("crm.deal.list", {
+                "order": {"ID": "ASC"},
+                "filter": {**self.deal_filter, ">ID": last_id},
+                "select": self._select(),
+                "start": -1,
+            }) or []
+
+            if not page:
+                return
+
+            yield page
+
+            if len(page) < self.PAGE_SIZE:
+                return
+            last_id = int(page[-1]["ID"])
+
+    def _amount(self, deal: Dict[str, Any]) -> Optional[str]:
+        """
+        Исходная сумма сделки в формате конвертера или None, если сумма не заполнена
+        """
+
+        value = deal.get(self.source_field)
+        if value is None or str(value).strip() == "":
+            return None
+
+        value = str(value)
+        # У стандартного поля OPPORTUNITY валюта хранится отдельно
+        currency = deal.get("CURRENCY_ID")
+        if currency and "|" not in value:
+            value = f"{value}|{currency}"
+        return value
+
+    def _convert_page(self, amounts: List[str]) -> List[Optional[str]]:
+        """
+        Конвертирует суммы страницы пачкой. Если в пачке есть некорректная сумма,
+        страница конвертируется поштучно, а некорректные суммы дают None
+        """
+
+        try:
+            return list(self.converter.convert_many(amounts))
+        except ValueError:
+            pass
+
+        results: List[Optional[str]] = []
+        for amount in amounts:
+            try:
+                results.append(self.converter.convert(amount))
+            except ValueError as error:
+                logger.warning("Сумма '%s' не конвертирована: %s", amount, error)
+                results.append(None)
+        return results
+
+    def process_page(self, page: List[Dict[str, Any]], advance: bool = True):
+        """
+        Конвертирует страницу сделок и записывает изменившиеся значения одним batch
+
+        :param advance: Учесть страницу в processed и last_id (False — повторная запись сделок из retry_ids)
+        """
+
+        deals = []
+        amounts = []
+        for deal in page:
+            amount = self._amount(deal)
+            if amount is None:
+                self.state["skipped"] += 1
+                continue
+            deals.append(deal)
+            amounts.append(amount)
+
+        commands = []
+        changed = []
+        for deal, text in zip(deals, self._convert_page(amounts)):
+            if text is None:
+                self.state["failed"] += 1
+            elif deal.get(self.result_field) == text:
+                self.state["unchanged"] += 1
+            else:
+                commands.append(("crm.deal.update", {"id": deal["ID"], "fields": {self.result_field: text}}))
+                changed.append((deal["ID"], text))
+
+        if commands and not self.dry_run:
+            self._write(list(zip(changed, commands)))
+        else:
+            self.state["updated"] += len(commands)
+
+        if advance:
+            self.state["processed"] += len(page)
+            self.state["last_id"] = int(page[-1]["ID"])
+
+    def _write(self, pending: List[tuple]):
+        """
+        Записывает значения одним batch. Команды с временной ошибкой повторяются с растущей задержкой,
+        после retry_attempts повторов сделка попадает в retry_ids — контрольная точка не теряет её
+
+        :param pending: Список ((ID сделки, сумма прописью), команда crm.deal.update)
+        """
+
+        for attempt in range(self.retry_attempts + 1):
+            retry = []
+            results = self.client.call_batch([command for _, command in pending])
+
+            for item, result in zip(pending, results):
+                (deal_id, text), _ = item
+                error = result["error"]
+                if error is None:
+                    self.state["updated"] += 1
+                    if self.written_values is not None:
+                        # Ключ как у обработчика активити: иначе он счёл бы прежнее значение всё ещё записанным
+                        self.written_values.set(written_value_key(self.client.member_id, "DEAL", deal_id, self.result_field), text)
+                elif not is_transient(error):
+                    self.state["failed"] += 1
+                    logger.warning("Сделка %s не обновлена: %s", deal_id, error)
+                elif attempt < self.retry_attempts:
+                    retry.append(item)
+                else:
+                    self.state["retry_ids"].append(int(deal_id))
+                    logger.warning("Сделка %s не обновлена, будет записана повторно: %s", deal_id, error)
+
+            if not retry:
+                return
+
+            pending = retry
+            time.sleep(self.retry_delay * 2 ** attempt)
+
+    def retry_pending(self):
+        """
+        Повторно читает и записывает сделки из retry_ids. Сделки, снова не записанные
+        из-за временной ошибки, остаются в retry_ids до следующего запуска
+        """
+
+        deal_ids, self.state["retry_ids"] = self.state["retry_ids"], []
+
+        for start in range(0, len(deal_ids), self.PAGE_SIZE):
+            page = self.client.call("crm.deal.list", {
+                "order": {"ID": "ASC"},
+                "filter": {**self.deal_filter, "ID": deal_ids[start:start + self.PAGE_SIZE]},
+                "select": self._select(),
+                "start": -1,
+            }) or []
+            if page:
+                self.process_page(page, advance=False)
+            self._save_checkpoint()
+
+    def run(self, resume: bool = True) -> Dict[str, Any]:
+        """
+        Выполняет пересчёт
+
+        :param resume: Продолжить с контрольной точки, если она есть
+        :return: Итоговое состояние: обработано, обновлено, без изменений, пропущено (пустая сумма), ошибок
+        """
+
+        if resume and self.load_checkpoint():
+            logger.info("Пересчёт продолжается после сделки %s", self.state["last_id"])
+        else:
+            self.state = self._new_state()
+
+        for page in self.iter_pages(self.state["last_id"]):
+            self.process_page(page)
+            self._save_checkpoint()
+            logger.info(
+                "Обработано сделок: %s, обновлено: %s, последняя: %s",
+                self.state["processed"], self.state["updated"], self.state["last_id"],
+            )
+
+        if self.state["retry_ids"]:
+            logger.info("Повторная запись сделок: %s", len(self.state["retry_ids"]))
+            self.retry_pending()
+
+        # Незаписанные сделки остались — следующий запуск с контрольной точкой запишет их
+        self.state["done"] = not self.state["retry_ids"]
+        self._save_checkpoint()
+        return self.state
@@ -0,0 +1,300 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from lib.sqlite_util import PerProcessConnection
+from lib.token_store import DEFAULT_KEY
+
+
+class CacheBackend(ABC):
+    """
+    Хранилище строковых значений со сроком жизни. Общее хранилище (SQLite)
+    позволяет нескольким процессам-воркерам видеть одни и те же ключи
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает значение или None, если ключа нет или срок его жизни истёк
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: float):
+        """
+        Сохраняет значение на ttl секунд
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        """
+        Атомарно сохраняет значение, только если ключа нет (или срок его жизни истёк)
+
+        :return: True — значение сохранено, False — ключ уже занят
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Удаляет ключ
+        """
+
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Хранилище в памяти процесса, ограниченное по числу ключей: при переполнении
+    вытесняются самые старые записи
+    """
+
+    def __init__(self, max_size: int = 100_000):
+        """
+        :param max_size: Наибольшее количество ключей
+        """
+
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def _get_alive(self, key: str, now: float) -> Optional[str]:
+        """
+        Возвращает значение ключа, удаляя его, если срок жизни истёк (вызывается под блокировкой)
+        """
+
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] <= now:
+            del self._data[key]
+            return None
+        return item[0]
+
+    def _put(self, key: str, value: str, expires_at: float):
+        """
+        Сохраняет значение и вытесняет самые старые записи сверх max_size (вызывается под блокировкой)
+        """
+
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._get_alive(key, time.monotonic())
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._put(key, value, time.monotonic() + ttl)
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._get_alive(key, now) is not None:
+                return False
+            self._put(key, value, now + ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Хранилище в SQLite, общее для всех процессов на одном сервере.
+    Каждый процесс открывает своё соединение — в том числе после fork.
+    Просроченные записи удаляются периодически при записи
+    """
+
+    # Через сколько записей удалять просроченные ключи
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        """
+        :param path: Путь к файлу базы данных
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = PerProcessConnection(path)
+        self._db.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _purge_if_needed(self, now: float):
+        """
+        Удаляет просроченные записи раз в PURGE_EVERY записей (вызывается под блокировкой)
+        """
+
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._db.connection.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.connection.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            now = time.time()
+            self._db.connection.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (key, value, now + ttl),
+            )
+            self._purge_if_needed(now)
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        with self._lock:
+            now = time.time()
+            # Запись занимает ключ, только если его нет или он просрочен — одной командой,
+            # поэтому из нескольких процессов ключ получает ровно один
+            cursor = self._db.connection.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE cache.expires_at <= ?",
+                (key, value, now + ttl, now),
+            )
+            self._purge_if_needed(now)
+            return cursor.rowcount > 0
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def close(self):
+        """
+        Закрывает соединение с базой данных
+        """
+
+        self._db.close()
+
+
+class TTLCache:
+    """
+    Кеш с общим сроком жизни записей поверх CacheBackend: отдельное пространство ключей
+    и счётчики попаданий. ttl <= 0 отключает кеш — каждое обращение считается промахом
+    """
+
+    def __init__(self, backend: CacheBackend, namespace: str, ttl: float):
+        """
+        :param backend: Хранилище значений
+        :param namespace: Префикс ключей, чтобы несколько кешей делили одно хранилище
+        :param ttl: Срок жизни записей в секундах
+        """
+
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _count(self, hit: bool):
+        """
+        Учитывает попадание или промах
+        """
+
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает значение ключа или None
+        """
+
+        value = self.backend.get(f"{self.namespace}:{key}") if self.ttl > 0 else None
+        self._count(value is not None)
+        return value
+
+    def set(self, key: str, value: str):
+        """
+        Сохраняет значение ключа
+        """
+
+        if self.ttl > 0:
+            self.backend.set(f"{self.namespace}:{key}", value, self.ttl)
+
+    def claim(self, key: str, value: str = "1") -> bool:
+        """
+        Занимает ключ, если он ещё не занят. Повторная попытка в пределах ttl считается попаданием
+
+        :return: True — ключ занят этим вызовом, False — ключ уже был занят
+        """
+
+        claimed = self.backend.add(f"{self.namespace}:{key}", value, self.ttl) if self.ttl > 0 else True
+        self._count(not claimed)
+        return claimed
+
+    def release(self, key: str):
+        """
+        Освобождает ключ, чтобы следующая попытка снова была обработана
+        """
+
+        if self.ttl > 0:
+            self.backend.delete(f"{self.namespace}:{key}")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Возвращает метрики кеша
+
+        :return: Словарь: попадания, промахи, доля попаданий
+        """
+
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / total if total else 0.0,
+            }
+
+
+def written_value_key(member_id: Optional[str], entity_type: str, entity_id: Any, field: str) -> str:
+    """
+    Ключ последнего записанного значения поля, общий для обработчика активити и пересчёта сделок.
+    Портал однопортальной установки (вебхук без member_id) — DEFAULT_KEY, как в хранилище токенов
+
+    :param member_id: Идентификатор портала
+    :param entity_type: Тип документа (DEAL, LEAD, ...)
+    :param entity_id: ID документа
+    :param field: Код поля
+    :return: Ключ "портал:ТИП_ID:поле"
+    """
+
+    return f"{member_id or DEFAULT_KEY}:{entity_type}_{entity_id}:{field}"
+
+
+def create_cache_backend(backend: str, path: str = None, max_size: int = 100_000) -> CacheBackend:
+    """
+    Создаёт хранилище кеша
+
+    :param backend: Тип хранилища: 'memory' (в процессе) или 'sqlite' (общее для процессов)
+    :param path: Путь к файлу базы данных для 'sqlite'
+    :param max_size: Наибольшее количество ключей для 'memory'
+    :return: Хранилище кеша
+    """
+
+    if backend == "memory":
+        return MemoryCacheBackend(max_size)
+    if backend == "sqlite":
+        return SQLiteCacheBackend(path)
+
+    raise ValueError(f"Неизвестный тип хранилища кеша: {backend}")
@@ -0,0 +1,396 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Границы корзин гистограмм по умолчанию (секунды): от долей миллисекунды до десятков секунд
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Отсчёт значения метрики: (имя, метки [(имя, значение), ...], значение)
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+class Metric:
+    """
+    Метрика с набором меток. Значения хранятся по кортежу значений меток;
+    обновление — словарь и блокировка, без выделения объектов на каждый вызов
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        """
+        :param name: Имя метрики в формате Prometheus
+        :param documentation: Описание (строка HELP)
+        :param labelnames: Имена меток
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _labels(self, values: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+        """
+        Пары (метка, значение) для отсчёта
+        """
+
+        return tuple(zip(self.labelnames, (str(value) for value in values)))
+
+    def samples(self) -> List[Sample]:
+        """
+        Текущие отсчёты метрики
+        """
+
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """
+    Монотонно растущий счётчик
+    """
+
+    type = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        """
+        Увеличивает счётчик
+
+        :param labelvalues: Значения меток в порядке labelnames
+        :param amount: Приращение
+        """
+
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(f"{self.name}_total", self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """
+    Значение, которое может расти и уменьшаться (например, количество выполняющихся запросов)
+    """
+
+    type = "gauge"
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) - amount
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    @contextmanager
+    def track_inprogress(self, *labelvalues):
+        """
+        Увеличивает значение на время выполнения блока
+        """
+
+        self.inc(*labelvalues)
+        try:
+            yield
+        finally:
+            self.dec(*labelvalues)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    """
+    Распределение значений по корзинам (латентность). Наблюдение — бинарный поиск корзины
+    и три сложения под блокировкой
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """
+        :param buckets: Верхние границы корзин по возрастанию (корзина +Inf добавляется автоматически)
+        """
+
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        """
+        Учитывает наблюдение
+
+        :param value: Значение (для латентности — секунды)
+        :param labelvalues: Значения меток в порядке labelnames
+        """
+
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labelvalues) -> "_Timer":
+        """
+        Измеряет длительность выполнения блока: with histogram.time('label'): ...
+        """
+
+        return _Timer(self, labelvalues)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+
+        result: List[Sample] = []
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                result.append((f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative))
+            result.append((f"{self.name}_sum", labels, total))
+            result.append((f"{self.name}_count", labels, count))
+        return result
+
+
+class _Timer:
+    """
+    Контекстный менеджер замера для Histogram.time. Класс, а не генератор с contextmanager:
+    замер обходится дешевле, чем самые быстрые из измеряемых операций
+    """
+
+    __slots__ = ("_histogram", "_labelvalues", "_started")
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple[str, ...]):
+        self._histogram = histogram
+        self._labelvalues = labelvalues
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labelvalues)
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса и вывод в текстовом формате Prometheus.
+
+    Если задан каталог снимков, каждый процесс сохраняет в него свои значения, а /metrics
+    суммирует снимки всех процессов (воркеров gunicorn). Снимки завершившихся процессов
+    учитываются для счётчиков и гистограмм и отбрасываются для gauge
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+        self.snapshot_dir: Optional[str] = None
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Регистрирует метрику. Повторная регистрация с тем же именем возвращает уже существующую
+        """
+
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """
+        Регистрирует функцию, которая при каждом выводе возвращает метрики из уже имеющейся
+        статистики (очереди, кеши, планировщик запросов): [(имя, тип, описание, отсчёты), ...]
+        """
+
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """
+        Собирает все метрики процесса
+
+        :return: Список семейств {'name', 'type', 'help', 'samples'}
+        """
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families = [
+            {"name": metric.name, "type": metric.type, "help": metric.documentation, "samples": metric.samples()}
+            for metric in metrics
+        ]
+        for collector in collectors:
+            for name, metric_type, documentation, samples in collector():
+                families.append({"name": name, "type": metric_type, "help": documentation, "samples": samples})
+
+        return families
+
+    def write_snapshot(self):
+        """
+        Сохраняет значения метрик процесса в каталог снимков (атомарно)
+        """
+
+        if not self.snapshot_dir:
+            return
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(self.collect(), file, separators=(",", ":"))
+            os.replace(tmp_path, os.path.join(self.snapshot_dir, f"{os.getpid()}.json"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _read_snapshots(self) -> List[Tuple[bool, List[Dict[str, Any]]]]:
+        """
+        Читает снимки других процессов
+
+        :return: Список (процесс жив, семейства метрик)
+        """
+
+        snapshots = []
+        for filename in os.listdir(self.snapshot_dir):
+            pid_text, _, extension = filename.partition(".")
+            if extension != "json" or not pid_text.isdigit() or int(pid_text) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.snapshot_dir, filename), encoding="utf-8") as file:
+                    snapshots.append((_process_alive(int(pid_text)), json.load(file)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """
+        Выводит метрики в текстовом формате Prometheus 0.0.4
+        """
+
+        families = self.collect()
+        if self.snapshot_dir and os.path.isdir(self.snapshot_dir):
+            families = _merge([(True, families)] + self._read_snapshots())
+
+        lines = []
+        for family in families:
+            if not family["samples"]:
+                continue
+            lines.append(f"# HELP {family['name']} {family['help']}")
+            lines.append(f"# TYPE {family['name']} {family['type']}")
+            for name, labels, value in family["samples"]:
+                if labels:
+                    label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def start_snapshots(self, directory: str, interval: float = 5.0):
+        """
+        Запускает фоновую запись снимков процесса (для воркеров gunicorn)
+
+        :param directory: Каталог снимков, общий для всех процессов приложения
+        :param interval: Период записи в секундах
+        """
+
+        self.snapshot_dir = directory
+
+        def loop():
+            while True:
+                try:
+                    self.write_snapshot()
+                except OSError:
+                    pass
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name="metrics-snapshot", daemon=True).start()
+
+
+def _merge(snapshots: List[Tuple[bool, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """
+    Суммирует одноимённые отсчёты снимков нескольких процессов
+    """
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    values: Dict[str, Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]] = {}
+
+    for alive, families in snapshots:
+        for family in families:
+            # Gauge завершившегося процесса (например, выполняющиеся запросы) уже не актуален
+            if not alive and family["type"] == "gauge":
+                continue
+            name = family["name"]
+            if name not in merged:
+                merged[name] = {"name": name, "type": family["type"], "help": family["help"]}
+                values[name] = {}
+            family_values = values[name]
+            for sample_name, labels, value in family["samples"]:
+                key = (sample_name, tuple(tuple(pair) for pair in labels))
+                family_values[key] = family_values.get(key, 0.0) + value
+
+    return [
+        dict(family, samples=[(sample_name, labels, value) for (sample_name, labels), value in values[name].items()])
+        for name, family in merged.items()
+    ]
+
+
+def _process_alive(pid: int) -> bool:
+    """
+    Проверяет, что процесс с данным pid существует
+    """
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    """
+    Экранирует значение метки
+    """
+
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """
+    Число в формате Prometheus: целые — без дробной части, бесконечность — +Inf
+    """
+
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# Реестр метрик процесса
+REGISTRY = MetricsRegistry()
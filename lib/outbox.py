@@ -0,0 +1,401 @@
+import json
+import time
+import random
+import logging
+import threading
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Tuple
+
+from lib.bitrix24_client import BaseBitrix24Client, Bitrix24APIError
+from lib.client_pool import Bitrix24ClientPool
+from lib.metrics import REGISTRY
+from lib.sqlite_util import PerProcessConnection
+
+logger = logging.getLogger("app")
+
+OUTBOX_ENTRIES = REGISTRY.counter("outbox_entries", "Записи исходящей очереди вызовов API по результату", ("result",))
+
+# Коды ошибок API, при которых вызов повторяется позже: перегрузка или временный сбой портала
+TRANSIENT_ERRORS = BaseBitrix24Client.RETRY_ERRORS | {
+    "INTERNAL_SERVER_ERROR",
+    "OPERATION_TIME_LIMIT",
+    "BATCH_COMMAND_SKIPPED",
+}
+
+# Команда исходящей очереди: метод API и параметры
+Command = Tuple[str, Dict[str, Any]]
+
+
+def _strip_auth(commands: Optional[List[Command]]) -> Optional[List[Command]]:
+    """
+    Команды без параметра auth: токен доступа не сохраняется на диск, а к моменту доставки
+    он обновится — при отправке подставляется текущий токен клиента
+    """
+
+    if not commands:
+        return commands
+    return [(method, {key: value for key, value in (params or {}).items() if key != "auth"})
+            for method, params in commands]
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Проверяет, что вызов не выполнен из-за временной недоступности портала и его стоит повторить позже:
+    сетевая ошибка, таймаут, 5xx после всех повторов, отклонение выключателем или перегрузка портала
+    """
+
+    if isinstance(error, Bitrix24APIError):
+        return error.code in TRANSIENT_ERRORS
+    return isinstance(error, ConnectionError)
+
+
+class Outbox:
+    """
+    Исходящая очередь вызовов API в SQLite: вызовы, которые не удалось выполнить сразу, переживают
+    перезапуск процесса и доставляются фоновым OutboxDispatcher.
+
+    Запись — цепочка команд одного портала, выполняемых строго по порядку (например, запись полей,
+    затем bizproc.event.send), и необязательная цепочка on_error, которая заменяет оставшиеся команды,
+    если команда завершилась постоянной ошибкой. Файл общий для воркеров: запись забирается одним процессом
+    на время lease — если процесс упал, запись снова становится доступной после его истечения
+    """
+
+    def __init__(self, path: str, lease: float = 120.0):
+        """
+        :param path: Путь к файлу базы данных
+        :param lease: На сколько секунд запись закрепляется за забравшим её процессом
+        """
+
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._db = PerProcessConnection(path)
+        self._db.connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "member_id TEXT NOT NULL, "
+            "commands TEXT NOT NULL, "
+            "on_error TEXT, "
+            "status TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_error TEXT)"
+        )
+        self._db.connection.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+    def add(self, member_id: str, commands: List[Command], on_error: List[Command] = None, delay: float = 0.0) -> int:
+        """
+        Добавляет цепочку команд портала для доставки
+
+        :param member_id: Идентификатор портала
+        :param commands: Команды (метод, параметры) в порядке выполнения
+        :param on_error: Команды, выполняемые вместо оставшихся при постоянной ошибке
+        :param delay: Через сколько секунд начать доставку
+        :return: Идентификатор записи
+        """
+
+        commands, on_error = _strip_auth(commands), _strip_auth(on_error)
+        now = time.time()
+        with self._lock:
+            cursor = self._db.connection.execute(
+                "INSERT INTO outbox (member_id, commands, on_error, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (member_id, json.dumps(commands, ensure_ascii=False),
+                 json.dumps(on_error, ensure_ascii=False) if on_error else None, now + delay, now),
+            )
+        OUTBOX_ENTRIES.inc("enqueued")
+        return cursor.lastrowid
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Забирает записи, время доставки которых наступило, и закрепляет их за процессом на lease секунд
+
+        :param limit: Наибольшее количество записей
+        :return: Записи {'id', 'member_id', 'commands', 'on_error', 'attempts'} в порядке добавления
+        """
+
+        now = time.time()
+        with self._lock:
+            db = self._db.connection
+            # Выборка и закрепление в одной транзакции с блокировкой записи: запись получает один процесс
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT id, member_id, commands, on_error, attempts FROM outbox "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                db.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?", [(now + self.lease, row[0]) for row in rows])
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+        return [
+            {
+                "id": entry_id,
+                "member_id": member_id,
+                "commands": json.loads(commands),
+                "on_error": json.loads(on_error) if on_error else None,
+                "attempts": attempts,
+            }
+            for entry_id, member_id, commands, on_error, attempts in rows
+        ]
+
+    def complete(self, entry_id: int):
+        """
+        Удаляет доставленную запись
+        """
+
+        with self._lock:
+            self._db.connection.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+        OUTBOX_ENTRIES.inc("delivered")
+
+    def advance(self, entry_id: int, commands: List[Command], on_error: List[Command] = None):
+        """
+        Заменяет оставшиеся команды записи (первая команда выполнена или заменена цепочкой on_error)
+        и делает запись доступной сразу
+        """
+
+        with self._lock:
+            self._db.connection.execute(
+                "UPDATE outbox SET commands = ?, on_error = ?, attempts = 0, next_attempt_at = ? WHERE id = ?",
+                (json.dumps(commands, ensure_ascii=False),
+                 json.dumps(on_error, ensure_ascii=False) if on_error else None, time.time(), entry_id),
+            )
+
+    def retry(self, entry_id: int, delay: float, error: str):
+        """
+        Откладывает запись после неудачной попытки
+        """
+
+        with self._lock:
+            self._db.connection.execute(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, entry_id),
+            )
+        OUTBOX_ENTRIES.inc("retried")
+
+    def postpone(self, entry_ids: List[int], delay: float):
+        """
+        Откладывает записи без учёта попытки (портал отклонён выключателем, запрос не отправлялся)
+        """
+
+        with self._lock:
+            self._db.connection.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(time.time() + delay, entry_id) for entry_id in entry_ids],
+            )
+
+    def dead(self, entry_id: int, error: str):
+        """
+        Прекращает доставку записи: она остаётся в таблице со статусом dead для разбора
+        """
+
+        with self._lock:
+            self._db.connection.execute(
+                "UPDATE outbox SET status = 'dead', last_error = ? WHERE id = ?", (error, entry_id)
+            )
+        OUTBOX_ENTRIES.inc("dead")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Возвращает состояние очереди
+
+        :return: Словарь: ожидают доставки, недоставленные, возраст самой старой ожидающей записи в секундах
+        """
+
+        with self._lock:
+            counts = dict(self._db.connection.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = self._db.connection.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status = 'pending'"
+            ).fetchone()[0]
+
+        return {
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_age": time.time() - oldest if oldest is not None else 0.0,
+        }
+
+    def close(self):
+        """
+        Закрывает соединение с базой данных
+        """
+
+        self._db.close()
+
+
+class OutboxDispatcher:
+    """
+    Фоновый поток доставки исходящей очереди. За проход забираются записи, время которых наступило;
+    первые команды записей одного портала отправляются одним вызовом batch. Временная ошибка
+    откладывает запись с экспоненциальной задержкой и джиттером, постоянная — запускает цепочку
+    on_error или прекращает доставку. Пока выключатель портала разомкнут, записи портала откладываются
+    без запросов к нему
+    """
+
+    def __init__(
+            self,
+            outbox: Outbox,
+            clients: Bitrix24ClientPool,
+            interval: float = 1.0,
+            batch_size: int = BaseBitrix24Client.BATCH_LIMIT,
+            base_delay: float = 1.0,
+            max_delay: float = 300.0,
+            max_attempts: int = 20,
+    ):
+        """
+        :param outbox: Исходящая очередь
+        :param clients: Клиенты порталов
+        :param interval: Период проверки очереди, когда доставлять нечего, в секундах
+        :param batch_size: Записей за проход
+        :param base_delay: Задержка после первой неудачной попытки в секундах
+        :param max_delay: Наибольшая задержка между попытками в секундах
+        :param max_attempts: Попыток до прекращения доставки
+        """
+
+        self.outbox = outbox
+        self.clients = clients
+        self.interval = interval
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def start(self):
+        """
+        Запускает фоновый поток доставки. Повторный вызов ничего не делает
+        """
+
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """
+        Запускает проход доставки, не дожидаясь окончания периода (в очередь добавлена запись)
+        """
+
+        self._wakeup.set()
+
+    def _run(self):
+        """
+        Цикл фонового потока: пока есть записи к доставке, проходы идут подряд
+        """
+
+        while not self._stop.is_set():
+            try:
+                claimed = self.dispatch_once()
+            except Exception as error:
+                logger.exception("Ошибка доставки исходящей очереди: %s", error)
+                claimed = 0
+
+            if claimed < self.batch_size:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+
+    def dispatch_once(self) -> int:
+        """
+        Один проход доставки
+
+        :return: Количество забранных записей
+        """
+
+        entries = self.outbox.claim(self.batch_size)
+        entries.sort(key=lambda entry: entry["member_id"])
+        for member_id, portal_entries in groupby(entries, key=lambda entry: entry["member_id"]):
+            self._dispatch_portal(member_id, list(portal_entries))
+        return len(entries)
+
+    def _dispatch_portal(self, member_id: str, entries: List[Dict[str, Any]]):
+        """
+        Отправляет первые команды записей портала одним batch и разбирает результаты
+        """
+
+        client = self.clients.get(member_id)
+
+        retry_after = client.circuit_breaker.retry_after()
+        if retry_after > 0:
+            self.outbox.postpone([entry["id"] for entry in entries], retry_after)
+            return
+
+        try:
+            results = client.call_batch([tuple(entry["commands"][0]) for entry in entries])
+        except Exception as error:
+            # Портал недоступен — записи повторяются позже; клиент не инициализирован или токены
+            # отозваны — повтор не поможет, выполняется цепочка on_error
+            transient = is_transient(error)
+            for entry in entries:
+                self._failed(entry, error, transient=transient)
+            return
+
+        for entry, result in zip(entries, results):
+            if result["error"] is None:
+                self._succeeded(entry)
+            else:
+                self._failed(entry, result["error"], transient=is_transient(result["error"]))
+
+    def _succeeded(self, entry: Dict[str, Any]):
+        """
+        Первая команда записи выполнена: запись удаляется или ждёт следующего прохода со следующей командой
+        """
+
+        remaining = entry["commands"][1:]
+        if remaining:
+            self.outbox.advance(entry["id"], remaining, entry["on_error"])
+        else:
+            self.outbox.complete(entry["id"])
+            logger.info("Отложенные вызовы портала %s доставлены (запись %s)", entry["member_id"], entry["id"])
+
+    def _failed(self, entry: Dict[str, Any], error: Exception, transient: bool):
+        """
+        Первая команда записи не выполнена: повтор позже, цепочка on_error или прекращение доставки
+        """
+
+        method = entry["commands"][0][0]
+        attempts = entry["attempts"] + 1
+
+        if transient and attempts < self.max_attempts:
+            delay = self._backoff_delay(attempts)
+            self.outbox.retry(entry["id"], delay, str(error))
+            logger.warning("Вызов %s портала %s отложен на %.1f с (попытка %s): %s",
+                           method, entry["member_id"], delay, attempts, error)
+            return
+
+        if entry["on_error"]:
+            # Например, запись полей невозможна — активити всё равно завершается, но со статусом error
+            self.outbox.advance(entry["id"], entry["on_error"])
+            logger.error("Вызов %s портала %s не выполнен, выполняется цепочка on_error: %s",
+                         method, entry["member_id"], error)
+            return
+
+        self.outbox.dead(entry["id"], str(error))
+        logger.error("Доставка вызова %s портала %s прекращена (запись %s, попыток %s): %s",
+                     method, entry["member_id"], entry["id"], attempts, error)
+
+    def _backoff_delay(self, attempts: int) -> float:
+        """
+        Задержка перед следующей попыткой: экспонента с джиттером, ограниченная max_delay
+        """
+
+        delay = min(self.base_delay * (2 ** (attempts - 1)), self.max_delay)
+        return delay * (0.5 + random.random() / 2)
+
+    def shutdown(self, timeout: float = None):
+        """
+        Останавливает фоновый поток. Недоставленные записи остаются в очереди до следующего запуска
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,160 @@
+import time
+import asyncio
+import threading
+from typing import Any, Dict
+
+
+class RateLimiter:
+    """
+    Планировщик запросов к порталу по схеме token bucket (аналог «дырявого ведра» Bitrix24).
+    Лишние вызовы не отклоняются, а ставятся в очередь: каждый получает своё время отправки
+    """
+
+    # Лимит Bitrix24 на суммарное время выполнения метода за 10 минут (секунды)
+    OPERATING_LIMIT = 480.0
+
+    # Доля OPERATING_LIMIT, начиная с которой темп запросов снижается
+    OPERATING_SLOWDOWN = 0.5
+
+    # Минимальная доля исходного темпа при замедлении
+    MIN_RATE_FACTOR = 0.1
+
+    def __init__(self, rate: float = 2.0, burst: int = 50):
+        """
+        :param rate: Количество запросов в секунду в установившемся режиме
+        :param burst: Размер ведра — сколько запросов можно отправить подряд без ожидания
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._factor = 1.0
+        self._slowdown_until = 0.0
+
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _current_rate(self, now: float) -> float:
+        """
+        Текущий темп с учётом замедления по данным портала
+        """
+
+        if self._factor < 1.0 and now >= self._slowdown_until:
+            self._factor = 1.0
+        return self.rate * self._factor
+
+    def _reserve(self) -> float:
+        """
+        Забирает токен из ведра (баланс может уйти в минус — это очередь)
+
+        :return: Время ожидания до отправки запроса в секундах
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            rate = self._current_rate(now)
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * rate)
+            self._updated_at = now
+            self._tokens -= 1
+
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+            if wait > 0:
+                self._waits += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+            return wait
+
+    def acquire(self) -> float:
+        """
+        Блокирует поток до наступления его очереди на отправку запроса
+
+        :return: Время ожидания в секундах
+        """
+
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """
+        Асинхронный вариант acquire: ожидание не блокирует event loop
+
+        :return: Время ожидания в секундах
+        """
+
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def penalize(self, duration: float = 10.0):
+        """
+        Реакция на QUERY_LIMIT_EXCEEDED: опустошает ведро и вдвое снижает темп
+
+        :param duration: Длительность замедления в секундах
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens, 0.0)
+            self._updated_at = now
+            self._factor = max(self._factor / 2, self.MIN_RATE_FACTOR)
+            self._slowdown_until = max(self._slowdown_until, now + duration)
+
+    def update_from_response(self, time_block: Dict[str, Any]):
+        """
+        Подстраивает темп по блоку 'time' ответа Bitrix24: чем ближе operating к лимиту,
+        тем медленнее отправляются запросы до момента operating_reset_at
+
+        :param time_block: Блок 'time' ответа API
+        """
+
+        if not isinstance(time_block, dict):
+            return
+
+        try:
+            operating = float(time_block.get("operating") or 0)
+        except (TypeError, ValueError):
+            return
+
+        usage = operating / self.OPERATING_LIMIT
+        if usage < self.OPERATING_SLOWDOWN:
+            return
+
+        try:
+            reset_at = float(time_block.get("operating_reset_at") or 0)
+        except (TypeError, ValueError):
+            reset_at = 0.0
+
+        # operating_reset_at — unix-время, переводим в шкалу monotonic
+        reset_in = max(reset_at - time.time(), 1.0) if reset_at else 60.0
+        factor = max(1.0 - usage, self.MIN_RATE_FACTOR)
+
+        with self._lock:
+            now = time.monotonic()
+            self._factor = min(self._factor, factor) if now < self._slowdown_until else factor
+            self._slowdown_until = max(self._slowdown_until, now + reset_in)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Возвращает метрики планировщика
+
+        :return: Словарь: текущий темп, длина очереди, количество и длительность ожиданий
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            rate = self._current_rate(now)
+            tokens = self._tokens + (now - self._updated_at) * rate
+            return {
+                "rate": rate,
+                "queued": max(-tokens, 0.0),
+                "waits": self._waits,
+                "wait_total": self._wait_total,
+                "wait_max": self._wait_max,
+            }
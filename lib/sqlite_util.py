@@ -0,0 +1,43 @@
+import os
+import sqlite3
+
+
+class PerProcessConnection:
+    """
+    Соединение SQLite, своё у каждого процесса: унаследованное через fork соединение использовать нельзя,
+    поэтому после fork (воркеры gunicorn) соединение открывается заново. Внутри процесса соединение
+    общее для потоков — доступ к нему хранилища упорядочивают своей блокировкой
+    """
+
+    def __init__(self, path: str, timeout: float = 10):
+        """
+        :param path: Путь к файлу базы данных
+        :param timeout: Ожидание блокировки базы другим процессом в секундах
+        """
+
+        self.path = path
+        self.timeout = timeout
+        self._pid = None
+        self._db = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Соединение текущего процесса в режиме автофиксации и журнала WAL
+        """
+
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=self.timeout)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._db
+
+    def close(self):
+        """
+        Закрывает соединение, открытое этим процессом; соединение родительского процесса не трогается
+        """
+
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+        self._db = None
+        self._pid = None
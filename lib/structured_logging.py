@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# Контекст запроса: идентификатор и время начала. Переходит в фоновые задачи вместе с contextvars
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_request_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_started", default=None)
+
+# Атрибуты LogRecord, которые не относятся к полям, переданным через extra
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "sample", "request_id", "elapsed_ms",
+}
+
+_EXC_FORMATTER = logging.Formatter()
+
+
+def start_request(request_id: str = None) -> str:
+    """
+    Начинает контекст запроса: записи журнала получат request_id и время от начала запроса
+
+    :param request_id: Идентификатор (например, из заголовка X-Request-ID); None — сгенерировать
+    :return: Идентификатор запроса
+    """
+
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    _request_started.set(time.perf_counter())
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    """
+    Идентификатор текущего запроса или None вне запроса
+    """
+
+    return _request_id.get()
+
+
+def request_elapsed_ms() -> Optional[float]:
+    """
+    Время от начала текущего запроса в миллисекундах или None вне запроса
+    """
+
+    started = _request_started.get()
+    return None if started is None else (time.perf_counter() - started) * 1000
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Добавляет к записи request_id и elapsed_ms текущего запроса
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = current_request_id()
+        if not hasattr(record, "elapsed_ms"):
+            elapsed = request_elapsed_ms()
+            record.elapsed_ms = None if elapsed is None else round(elapsed, 3)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Прореживает массовые записи: записи с extra={'sample': True} уровня INFO и ниже
+    проходят с вероятностью rate. Предупреждения и ошибки проходят всегда
+    """
+
+    def __init__(self, rate: float = 1.0):
+        """
+        :param rate: Доля пропускаемых записей (0–1)
+        """
+
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or record.levelno > logging.INFO or not getattr(record, "sample", False):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись журнала одной строкой JSON: время, уровень, логгер, сообщение, контекст запроса,
+    поля из extra и трассировка исключения
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Записи идут потоком: строка времени до секунды вычисляется один раз в секунду
+        self._second = None
+        self._second_text = ""
+
+    def _timestamp(self, created: float) -> str:
+        """
+        Время записи в UTC, ISO 8601 с миллисекундами
+        """
+
+        second = int(created)
+        if second != self._second:
+            self._second_text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._second = second
+        return f"{self._second_text}.{int((created - second) * 1000):03d}Z"
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": self._timestamp(record.created),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "elapsed_ms": getattr(record, "elapsed_ms", None),
+        }
+
+        fields = vars(record)
+        for key in fields.keys() - _RECORD_ATTRS:
+            entry[key] = fields[key]
+
+        # Пустые поля не выводятся
+        entry = {key: value for key, value in entry.items() if value is not None}
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _Listener(QueueListener):
+    """
+    Поток вывода. Маркер остановки ставится с ожиданием: очередь при остановке может быть заполнена
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    Неблокирующий обработчик: запись кладётся в ограниченную очередь, форматирование
+    и вывод выполняет фоновый поток. Если очередь заполнена, запись отбрасывается
+    и учитывается в dropped — поток запроса не ждёт вывода никогда.
+
+    Поток вывода запускается при первой записи в каждом процессе: после fork (воркеры gunicorn)
+    у процесса своя очередь и свой поток
+    """
+
+    def __init__(self, target: logging.Handler, max_size: int = 10_000):
+        """
+        :param target: Обработчик вывода (например, StreamHandler с JsonFormatter)
+        :param max_size: Максимальная глубина очереди записей
+        """
+
+        super().__init__(queue.Queue(max_size))
+        self.target = target
+        self.max_size = max_size
+        self.dropped = 0
+        self._listener: Optional[_Listener] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        """
+        Запускает поток вывода в текущем процессе
+        """
+
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Очередь и поток, унаследованные через fork, принадлежат родителю
+            self.queue = queue.Queue(self.max_size)
+            self._listener = _Listener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.flush_and_stop)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Подготовка записи в потоке вызывающего: сообщение подставляется сразу (аргументы могут
+        измениться позже), трассировка исключения переводится в текст. JSON собирается в потоке вывода
+        """
+
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            self._ensure_listener()
+        super().emit(record)
+
+    def flush_and_stop(self):
+        """
+        Выводит оставшиеся записи и останавливает поток вывода
+        """
+
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                self._listener = None
+                self._pid = None
+
+        try:
+            self.target.flush()
+        except ValueError:
+            # Поток вывода уже закрыт (завершение интерпретатора, перехваченный stderr)
+            pass
+
+
+def build_handler(log_format: str = "json", sample_rate: float = 1.0, queue_size: int = 10_000) -> AsyncLogHandler:
+    """
+    Создаёт обработчик журнала: вывод в stderr через очередь, контекст запроса и прореживание
+
+    :param log_format: 'json' — строка JSON на запись, 'text' — человекочитаемый формат
+    :param sample_rate: Доля выводимых массовых записей (extra={'sample': True})
+    :param queue_size: Глубина очереди записей
+    :return: Обработчик
+    """
+
+    stream = logging.StreamHandler()
+    if log_format == "json":
+        stream.setFormatter(JsonFormatter())
+    elif log_format == "text":
+        stream.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)-8s %(name)s [%(request_id)s] — %(message)s"))
+    else:
+        raise ValueError(f"Неизвестный формат журнала: {log_format}")
+
+    handler = AsyncLogHandler(stream, queue_size)
+    # Фильтры выполняются в потоке вызывающего: там доступен контекст запроса
+    handler.addFilter(SamplingFilter(sample_rate))
+    handler.addFilter(RequestContextFilter())
+    return handler
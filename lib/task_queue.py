@@ -0,0 +1,178 @@
+import logging
+import queue
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from lib.metrics import REGISTRY
+
+logger = logging.getLogger("app")
+
+# Время ожидания задачи в очереди и время её выполнения
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("task_queue_wait_seconds", "Ожидание задачи в очереди", ("queue",))
+TASK_SECONDS = REGISTRY.histogram("task_queue_task_seconds", "Выполнение фоновой задачи", ("queue", "result"))
+TASKS_IN_PROGRESS = REGISTRY.gauge("task_queue_tasks_in_progress", "Выполняющиеся фоновые задачи", ("queue",))
+
+# Маркер остановки рабочего потока
+_STOP = object()
+
+
+class QueueFullError(Exception):
+    """
+    Очередь задач переполнена — новая задача не может быть принята
+    """
+
+
+class TaskQueue:
+    """
+    Ограниченная очередь фоновых задач с пулом рабочих потоков
+    """
+
+    def __init__(self, workers: int = 4, max_size: int = 1000, name: str = "task-queue"):
+        """
+        Инициализация очереди
+
+        :param workers: Количество рабочих потоков
+        :param max_size: Максимальная глубина очереди (0 — без ограничений)
+        :param name: Префикс имени рабочих потоков
+        """
+
+        self.workers = workers
+        self.max_size = max_size
+        self.name = name
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_size)
+        self._threads: List[threading.Thread] = []
+        self._accepting = False
+        self._lock = threading.Lock()
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def start(self):
+        """
+        Запускает рабочие потоки. Повторный вызов ничего не делает
+        """
+
+        with self._lock:
+            if self._threads:
+                return
+
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+            self._accepting = True
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs):
+        """
+        Ставит задачу в очередь, не блокируя вызывающий поток
+
+        :param func: Вызываемый объект
+        :raises QueueFullError: Очередь заполнена или остановлена
+        """
+
+        if not self._accepting:
+            raise QueueFullError("Очередь задач остановлена")
+
+        try:
+            # Контекст вызывающего (например, request_id для журнала) переходит в задачу
+            self._queue.put_nowait((func, args, kwargs, contextvars.copy_context(), time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise QueueFullError(f"Очередь задач заполнена ({self.max_size})")
+
+    def _worker(self):
+        """
+        Цикл рабочего потока: забирает задачи из очереди до получения маркера остановки
+        """
+
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+
+                func, args, kwargs, context, enqueued = item
+                started = time.perf_counter()
+                QUEUE_WAIT_SECONDS.observe(started - enqueued, self.name)
+                TASKS_IN_PROGRESS.inc(self.name)
+                result = "error"
+                try:
+                    context.run(func, *args, **kwargs)
+                    result = "ok"
+                except Exception as error:
+                    logger.exception("Ошибка фоновой задачи: %s", error)
+                finally:
+                    # Счётчики обновляют несколько рабочих потоков — под блокировкой, иначе обновления теряются
+                    with self._lock:
+                        if result == "ok":
+                            self._processed += 1
+                        else:
+                            self._failed += 1
+                    TASKS_IN_PROGRESS.dec(self.name)
+                    TASK_SECONDS.observe(time.perf_counter() - started, self.name, result)
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, timeout: float = None):
+        """
+        Прекращает приём задач, дожидается обработки очереди и останавливает потоки
+
+        :param timeout: Максимальное время ожидания в секундах (None — без ограничений)
+        """
+
+        with self._lock:
+            if not self._threads:
+                return
+            self._accepting = False
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Ждём, пока рабочие потоки обработают накопившиеся задачи
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+
+        # Не успели — отбрасываем оставшиеся задачи, чтобы освободить место для маркеров
+        dropped = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            dropped += 1
+
+        if dropped:
+            logger.warning("Очередь %s остановлена, необработанных задач: %s", self.name, dropped)
+
+        for _ in self._threads:
+            self._queue.put(_STOP)
+
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+        self._threads = []
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает текущее состояние очереди
+
+        :return: Словарь с глубиной очереди и счётчиками задач
+        """
+
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "size": self._queue.qsize(),
+                "max_size": self.max_size,
+                "processed": self._processed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
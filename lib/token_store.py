@@ -0,0 +1,414 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from lib.sqlite_util import PerProcessConnection
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна, остаётся блокировка потоков
+    fcntl = None
+
+# Ключ токенов, когда портал не указан (однопортальная установка)
+DEFAULT_KEY = "default"
+
+
+class InterProcessLock:
+    """
+    Блокировка между процессами на основе flock файла. Интерфейс как у threading.Lock.
+    Внутри процесса одновременно захватывать её должен один поток (захват под блокировкой потоков)
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Путь к файлу блокировки
+        """
+
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Захватывает блокировку
+
+        :param blocking: Ждать освобождения блокировки другим процессом
+        :return: True — блокировка захвачена
+        """
+
+        if fcntl is None:
+            return True
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+
+        self._file = file
+        return True
+
+    def release(self):
+        """
+        Освобождает блокировку
+        """
+
+        if self._file is not None:
+            file, self._file = self._file, None
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            file.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class _NullLock:
+    """
+    Блокировка, которая ничего не блокирует: для хранилищ, не разделяемых между процессами
+    """
+
+    def acquire(self, blocking: bool = True) -> bool:
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class TokenStore(ABC):
+    """
+    Хранилище OAuth-токенов порталов Bitrix24, ключ — member_id портала
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает токены портала или None, если портал неизвестен
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, tokens: Dict[str, Any]):
+        """
+        Сохраняет токены портала
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Удаляет токены портала
+        """
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def keys(self) -> List[str]:
+        """
+        Возвращает ключи всех сохранённых порталов
+        """
+
+        raise NotImplementedError
+
+    def reload(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Перечитывает токены портала в обход кешей: их мог обновить другой процесс
+        """
+
+        return self.get(key)
+
+    def refresh_lock(self, key: str):
+        """
+        Возвращает блокировку обновления токенов портала, общую для всех процессов.
+        refresh_token одноразовый, поэтому обновлять его должен только один процесс
+        """
+
+        return _NullLock()
+
+
+class _FileLocks:
+    """
+    Блокировки рядом с файлом хранилища: запись файла и обновление токенов каждого портала
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Путь к файлу хранилища
+        """
+
+        self._path = path
+        self._refresh_locks: Dict[str, InterProcessLock] = {}
+        self.write_lock = InterProcessLock(f"{path}.lock")
+
+    def refresh_lock(self, key: str) -> InterProcessLock:
+        """
+        Возвращает блокировку обновления токенов портала (один объект на портал в процессе)
+        """
+
+        lock = self._refresh_locks.get(key)
+        if lock is None:
+            lock = self._refresh_locks.setdefault(key, InterProcessLock(f"{self._path}.{key}.refresh.lock"))
+        return lock
+
+
+class JsonFileTokenStore(TokenStore):
+    """
+    Хранилище в JSON-файле вида {member_id: токены}. Запись атомарная: временный файл + rename.
+    Несколько процессов могут работать с одним файлом: запись перечитывает файл под блокировкой,
+    чтение перечитывает его, если файл заменил другой процесс (изменились inode, размер или mtime)
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Путь к JSON-файлу
+        """
+
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._locks = _FileLocks(str(self.path))
+        self._signature = None
+        self._data: Dict[str, Dict[str, Any]] = self._read()
+
+    def _file_signature(self) -> Optional[tuple]:
+        """
+        Признак версии файла: запись заменяет файл (rename), поэтому меняется inode
+        """
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _refresh(self):
+        """
+        Перечитывает файл, если после последнего чтения его записал другой процесс
+        (например, другой воркер gunicorn сохранил токены нового портала при установке)
+        """
+
+        if self._file_signature() != self._signature:
+            with self._lock:
+                if self._file_signature() != self._signature:
+                    self._data = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Читает файл. Файл старого формата (токены одного портала) переносится под DEFAULT_KEY
+        """
+
+        # Признак снимается до чтения: запись, случившаяся во время чтения, будет замечена следующим get
+        self._signature = self._file_signature()
+        if self._signature is None:
+            return {}
+
+        try:
+            with self.path.open(encoding="utf-8") as file:
+                data = json.load(file)
+        except (json.JSONDecodeError, IOError):
+            return {}
+
+        if not isinstance(data, dict):
+            return {}
+
+        if "access_token" in data:
+            return {DEFAULT_KEY: data}
+
+        return data
+
+    def _write(self):
+        """
+        Записывает все токены во временный файл и атомарно заменяет им основной
+        """
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=f".{self.path.name}.", suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(self._data, file, ensure_ascii=False, separators=(",", ":"))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+            self._signature = self._file_signature()
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self._refresh()
+        tokens = self._data.get(key)
+        return dict(tokens) if tokens is not None else None
+
+    def set(self, key: str, tokens: Dict[str, Any]):
+        with self._lock, self._locks.write_lock:
+            # Порталы, записанные другими процессами, не должны потеряться
+            self._data = self._read()
+            self._data[key] = dict(tokens)
+            self._write()
+
+    def delete(self, key: str):
+        with self._lock, self._locks.write_lock:
+            self._data = self._read()
+            if self._data.pop(key, None) is not None:
+                self._write()
+
+    def keys(self) -> List[str]:
+        self._refresh()
+        return list(self._data)
+
+    def reload(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._data = self._read()
+        tokens = self._data.get(key)
+        return dict(tokens) if tokens is not None else None
+
+    def refresh_lock(self, key: str) -> InterProcessLock:
+        return self._locks.refresh_lock(key)
+
+
+class SQLiteTokenStore(TokenStore):
+    """
+    Хранилище в SQLite: запись одного портала не переписывает остальные.
+    Каждый процесс открывает своё соединение — в том числе после fork
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Путь к файлу базы данных
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._locks = _FileLocks(path)
+        self._db = PerProcessConnection(path)
+        self._db.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "member_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.connection.execute("SELECT data FROM tokens WHERE member_id = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, tokens: Dict[str, Any]):
+        with self._lock:
+            self._db.connection.execute(
+                "INSERT INTO tokens (member_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(member_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (key, json.dumps(tokens, ensure_ascii=False), time.time()),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.connection.execute("DELETE FROM tokens WHERE member_id = ?", (key,))
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.connection.execute("SELECT member_id FROM tokens")]
+
+    def refresh_lock(self, key: str) -> InterProcessLock:
+        return self._locks.refresh_lock(key)
+
+    def close(self):
+        """
+        Закрывает соединение с базой данных
+        """
+
+        self._db.close()
+
+
+class CachedTokenStore(TokenStore):
+    """
+    Кеш в памяти перед другим хранилищем: чтение — обращение к словарю,
+    запись проходит в хранилище сразу (write-through).
+    Отсутствие токенов не кешируется: портал мог установить другой процесс, следующее чтение спросит хранилище
+    """
+
+    def __init__(self, backend: TokenStore):
+        """
+        :param backend: Постоянное хранилище токенов
+        """
+
+        self.backend = backend
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        tokens = self._cache.get(key)
+        if tokens is None:
+            tokens = self.backend.get(key)
+            if tokens is not None:
+                self._cache[key] = tokens
+        return dict(tokens) if tokens is not None else None
+
+    def set(self, key: str, tokens: Dict[str, Any]):
+        with self._lock:
+            self.backend.set(key, tokens)
+            self._cache[key] = dict(tokens)
+
+    def delete(self, key: str):
+        with self._lock:
+            self.backend.delete(key)
+            self._cache.pop(key, None)
+
+    def keys(self) -> List[str]:
+        return self.backend.keys()
+
+    def reload(self, key: str) -> Optional[Dict[str, Any]]:
+        tokens = self.backend.reload(key)
+        with self._lock:
+            if tokens is not None:
+                self._cache[key] = tokens
+            else:
+                self._cache.pop(key, None)
+        return dict(tokens) if tokens is not None else None
+
+    def refresh_lock(self, key: str):
+        return self.backend.refresh_lock(key)
+
+    def invalidate(self, key: str = None):
+        """
+        Сбрасывает кеш портала (или весь кеш), чтобы перечитать токены из хранилища
+        """
+
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+
+def create_token_store(backend: str, path: str) -> TokenStore:
+    """
+    Создаёт хранилище токенов с кешем в памяти
+
+    :param backend: Тип хранилища: 'json' или 'sqlite'
+    :param path: Путь к файлу хранилища
+    :return: Хранилище токенов
+    """
+
+    if backend == "sqlite":
+        return CachedTokenStore(SQLiteTokenStore(path))
+    if backend == "json":
+        return CachedTokenStore(JsonFileTokenStore(path))
+
+    raise ValueError(f"Неизвестный тип хранилища токенов: {backend}")
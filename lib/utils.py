@@ -1,4 +1,5 @@
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import unquote_plus, urlencode
 
 
 def parse_nested(form_dict: Dict[str, Any]) -> Dict[str, Any]:
@@ -24,3 +25,158 @@ def parse_nested(form_dict: Dict[str, Any]) -> Dict[str, Any]:
         # Устанавливаем значение для последнего ключа
         d[keys[-1]] = v
     return result
+
+
+def parse_form(body: Union[bytes, str]) -> Dict[str, Any]:
+    """
+    Разбирает тело application/x-www-form-urlencoded сразу во вложенные словари за один проход.
+    Ключи вида 'key[]' собираются в список, остальные скобки — во вложенные словари.
+
+    :param body: Тело запроса (request.get_data()).
+    :return: Вложенный словарь, как у parse_nested.
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+
+    result: Dict[str, Any] = {}
+    for pair in body.split("&"):
+        if not pair:
+            continue
+
+        key, _, value = pair.partition("=")
+        key = _unquote(key)
+        value = _unquote(value)
+
+        bracket = key.find("[")
+        if bracket <= 0 or key[-1] != "]":
+            result[key] = value
+            continue
+
+        # 'auth[member_id]' → ['auth', 'member_id']; 'ids[]' → ['ids', '']
+        names = [key[:bracket]] + key[bracket + 1:-1].split("][")
+        d: Any = result
+        for name, next_name in zip(names, names[1:]):
+            d = _child(d, name, list if next_name == "" else dict)
+
+        if isinstance(d, list):
+            d.append(value)
+        else:
+            d[names[-1]] = value
+
+    return result
+
+
+def extract_fields(body: Union[bytes, str], paths: Iterable[str]) -> Dict[str, Union[str, List[str]]]:
+    """
+    Извлекает из тела form-urlencoded только нужные поля, не строя вложенную структуру.
+    Значения остальных полей не декодируются; разбор прекращается, когда найдены все поля.
+
+    :param body: Тело запроса (request.get_data()).
+    :param paths: Ключи в том виде, как они передаются: 'event_token', 'properties[SOURCE_AMOUNT]'.
+        Ключ с '[]' в конце ('properties[SOURCE_AMOUNT][]') собирает в список значения
+        всех ключей 'properties[SOURCE_AMOUNT][0]', '[1]', ... в порядке следования.
+    :return: Словарь ключ → значение (или список значений) только для найденных ключей.
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+
+    wanted = set(paths)
+    # Префиксы списков: 'properties[SOURCE_AMOUNT][' → 'properties[SOURCE_AMOUNT][]'
+    lists = {path[:-1]: path for path in wanted if path.endswith("[]")}
+    # Ключ списка 'key[]' сам встречается в теле — он не должен попасть в скалярные значения
+    scalars = wanted - set(lists.values())
+    found: Dict[str, Union[str, List[str]]] = {}
+    found_scalars = 0
+
+    for pair in body.split("&"):
+        key, _, value = pair.partition("=")
+        key = _unquote(key)
+        if key in scalars and key not in found:
+            found[key] = _unquote(value)
+            found_scalars += 1
+            # Списки могут продолжаться до конца тела — досрочно разбор прекращается только без них
+            if not lists and found_scalars == len(scalars):
+                break
+        elif lists and key.endswith("]") and "[" in key:
+            bracket = key.rindex("[")
+            path = lists.get(key[:bracket + 1])
+            # 'key[]' и 'key[N]' — элементы списка, другие вложенные ключи — нет
+            index = key[bracket + 1:-1]
+            if path is not None and (not index or index.isdigit()):
+                found.setdefault(path, []).append(_unquote(value))
+
+    return found
+
+
+def _unquote(text: str) -> str:
+    """
+    Декодирует компонент form-urlencoded; строки без '%' и '+' возвращаются как есть.
+    """
+    if "%" in text or "+" in text:
+        return unquote_plus(text)
+    return text
+
+
+def _child(container: Any, name: str, kind: type) -> Any:
+    """
+    Возвращает вложенный контейнер (dict или list) по имени, создавая его при первом обращении.
+    В списке ('key[][...]') каждый раз добавляется новый элемент.
+    """
+    if isinstance(container, list):
+        child = kind()
+        container.append(child)
+        return child
+
+    child = container.get(name)
+    if not isinstance(child, kind):
+        child = container[name] = kind()
+    return child
+
+
+def build_query(params: Dict[str, Any]) -> str:
+    """
+    Формирует строку запроса из вложенного словаря в формате PHP http_build_query.
+    Используется для команд метода batch: 'crm.deal.update?id=1&fields[TITLE]=...'
+
+    :param params: Словарь параметров (значения — словари, списки или скаляры).
+    :return: URL-кодированная строка запроса.
+    """
+    pairs: List[Tuple[str, Any]] = []
+    _flatten_query(params, "", pairs)
+    return urlencode(pairs)
+
+
+def _flatten_query(value: Any, prefix: str, pairs: List[Tuple[str, Any]]):
+    """
+    Рекурсивно раскладывает значение в список пар 'key[sub][...]' → значение.
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, (list, tuple)):
+        items = enumerate(value)
+    else:
+        # PHP передаёт булевы значения как 1/0, а None — как пустую строку
+        if isinstance(value, bool):
+            value = int(value)
+        elif value is None:
+            value = ""
+        pairs.append((prefix, value))
+        return
+
+    for key, item in items:
+        _flatten_query(item, f"{prefix}[{key}]" if prefix else str(key), pairs)
+
+
+def parse_document_id(document_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Разбирает идентификатор документа бизнес-процесса (document_id[2]) на тип сущности и ID.
+    Примеры: 'DEAL_7' → ('DEAL', '7'), 'CONTACT_12' → ('CONTACT', '12'),
+    элемент смарт-процесса 'DYNAMIC_183_5' → ('DYNAMIC_183', '5').
+
+    :param document_id: Идентификатор документа.
+    :return: Пара (тип сущности, ID) или (None, None), если формат не распознан.
+    """
+    entity_type, _, entity_id = (document_id or "").rpartition("_")
+    if not entity_type or not entity_id.isdigit():
+        return None, None
+    return entity_type, entity_id
@@ -1,131 +1,675 @@
 import os
+import sys
+import time
+import atexit
+import signal
 import logging
-from flask import Flask, request, jsonify
+import threading
+import contextvars
+from typing import Any, Dict, List, Optional, Tuple
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from http import HTTPStatus
 from dotenv import load_dotenv
 
-from lib.utils import parse_nested
-from lib.bitrix24_client import Bitrix24Client
+from lib.activity_registry import ActivityRegistry
+from lib.utils import extract_fields, parse_document_id, parse_form
+from lib.client_pool import Bitrix24ClientPool
+from lib.token_store import DEFAULT_KEY, create_token_store
+from lib.task_queue import TaskQueue, QueueFullError
+from lib.idempotency import TTLCache, create_cache_backend, written_value_key
+from lib.outbox import Outbox, OutboxDispatcher, is_transient
+from lib.metrics import REGISTRY
+from lib.structured_logging import AsyncLogHandler, build_handler, current_request_id, request_elapsed_ms, start_request
 from amount2words.amount2words import Amount2Words
+from amount2words.locales import LOCALES
 
-load_dotenv()
+# .env читают точки входа (wsgi.py, gunicorn.conf.py, python main.py): импорт модуля не меняет окружение
+if __name__ == "__main__":
+    load_dotenv()
 
 CLIENT_ID = os.environ.get("BITRIX24_CLIENT_ID")
 CLIENT_SECRET = os.environ.get("BITRIX24_CLIENT_SECRET")
 ENV = os.environ.get("ENV")
-PORT = int(os.environ.get("PORT"))
+PORT = int(os.environ.get("PORT") or "5000")
 APP_URL = os.environ.get("APP_URL")
 
-app = Flask(__name__)
-bx_client = Bitrix24Client(CLIENT_ID, CLIENT_SECRET)
-converter = Amount2Words()
+# Хранилище токенов порталов: json или sqlite
+TOKEN_STORE = os.environ.get("TOKEN_STORE", "json")
+TOKEN_STORE_PATH = os.environ.get("TOKEN_STORE_PATH", "utils_bitrix_app_tokens.json")
+
+# Асинхронная обработка активити: 0 — обработка прямо в запросе
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", "0"))
+ASYNC_QUEUE_SIZE = int(os.environ.get("ASYNC_QUEUE_SIZE", "1000"))
+ASYNC_DRAIN_TIMEOUT = float(os.environ.get("ASYNC_DRAIN_TIMEOUT", "30"))
+
+# Объединение вызовов API в batch: окно ожидания в секундах, 0 — каждый вызов отдельным запросом
+BATCH_WINDOW = float(os.environ.get("BATCH_WINDOW", "0"))
+
+# Темп запросов к одному порталу (запросов в секунду) и размер пачки без ожидания — суммарно для всех процессов
+RATE_LIMIT = float(os.environ.get("RATE_LIMIT", "2"))
+RATE_BURST = int(os.environ.get("RATE_BURST", "50"))
+# Процессов, делящих лимит портала: планировщик запросов у каждого процесса свой, поэтому процесс
+# получает свою долю темпа и пачки. gunicorn.conf.py подставляет число воркеров
+RATE_LIMIT_PROCESSES = max(int(os.environ.get("RATE_LIMIT_PROCESSES") or "1"), 1)
+
+# Вызовов без ответа портала подряд, после которых вызовы к нему отклоняются сразу (0 — не отклонять),
+# и время отклонения до пробного вызова в секундах
+CIRCUIT_THRESHOLD = int(os.environ.get("CIRCUIT_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Исходящая очередь: вызовы, не выполненные из-за недоступности портала, доставляются в фоне. Пусто — отключена
+OUTBOX_PATH = os.environ.get("OUTBOX_PATH", "utils_bitrix_app_outbox.sqlite3")
+# Период проверки очереди, наибольшая задержка между попытками в секундах и число попыток до отказа
+OUTBOX_INTERVAL = float(os.environ.get("OUTBOX_INTERVAL", "1"))
+OUTBOX_MAX_DELAY = float(os.environ.get("OUTBOX_MAX_DELAY", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "20"))
+
+# Язык суммы прописью, если он не выбран в настройках активити
+DEFAULT_LANGUAGE = os.environ.get("DEFAULT_LANGUAGE", "ru")
+
+# Подавление повторных вебхуков и неизменившихся записей: memory (в процессе) или sqlite (общий для процессов)
+IDEMPOTENCY_BACKEND = os.environ.get("IDEMPOTENCY_BACKEND", "memory")
+IDEMPOTENCY_PATH = os.environ.get("IDEMPOTENCY_PATH", "utils_bitrix_app_cache.sqlite3")
+# Срок хранения event_token обработанных активити в секундах, 0 — без подавления повторов
+EVENT_TOKEN_TTL = float(os.environ.get("EVENT_TOKEN_TTL", "3600"))
+# Срок хранения последнего записанного в поле значения в секундах, 0 — всегда вызывать crm.deal.update
+FIELD_VALUE_TTL = float(os.environ.get("FIELD_VALUE_TTL", "600"))
+# Срок хранения хешей описаний активити, записанных на портал, в секундах. После истечения
+# (и с IDEMPOTENCY_BACKEND=memory после перезапуска) установленные активити при установке обновляются заново
+ACTIVITY_HASH_TTL = float(os.environ.get("ACTIVITY_HASH_TTL", str(30 * 24 * 3600)))
+
+# Период фоновой проверки срока действия токена в секундах, 0 — обновление только при вызове API
+TOKEN_RENEW_INTERVAL = float(os.environ.get("TOKEN_RENEW_INTERVAL", "0"))
+
+# Каталог снимков метрик процессов: /metrics суммирует все воркеры gunicorn. Пусто — метрики только своего процесса
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+
+# Журнал: json (строка JSON на запись) или text; по умолчанию json в продакшене
+LOG_FORMAT = os.environ.get("LOG_FORMAT") or ("json" if ENV == "PRODUCTION" else "text")
+# Доля выводимых массовых INFO-записей (конвертация, запись поля, завершение запроса), 1 — все
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+# Глубина очереди журнала: при переполнении записи отбрасываются, запросы не ждут вывода
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
 
 
 def build_logger() -> logging.Logger:
+    """
+    Настраивает журнал приложения. Вызывается из create_app; повторный вызов ничего не делает
+    """
+
     app_logger = logging.getLogger("app")
+    if any(isinstance(handler, AsyncLogHandler) for handler in app_logger.handlers):
+        return app_logger
+
     app_logger.setLevel(logging.DEBUG if ENV != "PRODUCTION" else logging.INFO)
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(
-        logging.Formatter("[%(asctime)s] %(levelname)-8s %(name)s — %(message)s")
-    )
-    app_logger.addHandler(handler)
+    # Вывод в отдельном потоке: запись журнала в потоке запроса — только постановка в очередь
+    app_logger.addHandler(build_handler(LOG_FORMAT, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE))
     return app_logger
 
 
-logger = build_logger()
+logger = logging.getLogger("app")
+
+# Длительность этапов обработки активити: разбор вебхука, конвертация, запись поля, завершение активити
+STAGE_SECONDS = REGISTRY.histogram("amount2words_stage_seconds", "Длительность этапа обработки активити", ("stage",))
+ACTIVITIES = REGISTRY.counter("amount2words_activities", "Обработанные активити", ("status",))
 
 
-def register_activity():
+class AppServices:
     """
-    Регистрирует активити Сумма прописью в бизнес-процессах Bitrix24
+    Сервисы приложения: клиенты порталов, конвертеры, кеши и очередь задач.
+    Создание не запускает потоков и не строит таблиц — объект создаётся быстро. Подготовку к первому
+    запросу выполняет warm_up: в gunicorn — в мастер-процессе до fork (preload, см. wsgi.py),
+    чтобы таблицы конвертеров строились один раз и разделялись воркерами
     """
 
-    try:
-        bx_client.call("bizproc.activity.add", {
-            "CODE": "utils-bitrix-app.amount2words",
-            "HANDLER": f"{APP_URL}/amount2words-handler",
-            "USE_SUBSCRIPTION": "Y",
-            "NAME": "Сумма прописью",
-            "DESCRIPTION": "Преобразует число в текстовое представление суммы",
-            "PROPERTIES": {
-                "SOURCE_AMOUNT": {
-                    "NAME": "Исходная сумма",
-                    "DESCRIPTION": "Укажите код поля с исходной суммой (UF_CRM_***)",
-                    "TYPE": "string",
-                    "REQUIRED": "Y",
-                    "MULTIPLE": "N",
-                    "DEFAULT": ""
-                },
-                "RESULT": {
-                    "NAME": "Сумма прописью",
-                    "DESCRIPTION": "Укажите код поля для суммы прописью (UF_CRM_***)",
-                    "TYPE": "string",
-                    "REQUIRED": "Y",
-                    "MULTIPLE": "N",
-                    "DEFAULT": ""
-                }
+    def __init__(self):
+        self.bx_clients = Bitrix24ClientPool(
+            CLIENT_ID, CLIENT_SECRET, create_token_store(TOKEN_STORE, TOKEN_STORE_PATH),
+            batch_window=BATCH_WINDOW, rate_limit=RATE_LIMIT / RATE_LIMIT_PROCESSES,
+            rate_burst=max(RATE_BURST // RATE_LIMIT_PROCESSES, 1),
+            circuit_threshold=CIRCUIT_THRESHOLD, circuit_reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        )
+        # Конвертеры по языкам создаются при первом обращении (get_converter) или прогреве;
+        # валюта берётся из денежного поля ("1234.50|USD"), без кода — рубли
+        self.converters: Dict[str, Amount2Words] = {}
+        self._converters_lock = threading.Lock()
+
+        cache_backend = create_cache_backend(IDEMPOTENCY_BACKEND, IDEMPOTENCY_PATH)
+        # event_token активити, которые уже приняты в обработку
+        self.processed_events = TTLCache(cache_backend, "event", EVENT_TOKEN_TTL)
+        # Последнее записанное значение поля сделки: портал, сделка, поле → значение
+        self.written_values = TTLCache(cache_backend, "field", FIELD_VALUE_TTL)
+        # Активити приложения и хеши их описаний, уже записанных на порталы
+        self.activity_registry = ActivityRegistry(activity_definitions(), TTLCache(cache_backend, "activity", ACTIVITY_HASH_TTL))
+
+        self.task_queue = None
+        if ASYNC_WORKERS > 0:
+            self.task_queue = TaskQueue(workers=ASYNC_WORKERS, max_size=ASYNC_QUEUE_SIZE, name="amount2words")
+
+        # Вызовы, отложенные до восстановления портала; файл общий для воркеров
+        self.outbox = None
+        self.outbox_dispatcher = None
+        if OUTBOX_PATH:
+            self.outbox = Outbox(OUTBOX_PATH)
+            self.outbox_dispatcher = OutboxDispatcher(
+                self.outbox, self.bx_clients,
+                interval=OUTBOX_INTERVAL, max_delay=OUTBOX_MAX_DELAY, max_attempts=OUTBOX_MAX_ATTEMPTS,
+            )
+
+        # Прогрев: длительность шагов в секундах, признак завершения
+        self.warmup_seconds: Dict[str, float] = {}
+        self.warmed_up = False
+        self._warmup_lock = threading.Lock()
+
+        self._started = False
+        self._stopped = False
+
+    def get_converter(self, language: str) -> Optional[Amount2Words]:
+        """
+        Конвертер языка; таблицы языка строятся при первом обращении
+
+        :return: Конвертер или None, если язык не поддерживается
+        """
+
+        converter = self.converters.get(language)
+        if converter is None and language in LOCALES:
+            with self._converters_lock:
+                converter = self.converters.get(language)
+                if converter is None:
+                    converter = self.converters[language] = Amount2Words(language)
+        return converter
+
+    def warm_up(self):
+        """
+        Подготовка к первому запросу: таблицы конвертеров всех языков, NumPy для convert_many
+        и клиенты порталов с сохранёнными токенами. Длительность шагов сохраняется в warmup_seconds.
+        Ошибка шага не мешает работе — то же будет выполнено при первом обращении.
+        Повторный вызов ничего не делает
+        """
+
+        with self._warmup_lock:
+            if self.warmed_up:
+                return
+
+            for name, step in (("converters", self._warm_up_converters), ("clients", self._warm_up_clients)):
+                started = time.perf_counter()
+                try:
+                    step()
+                except Exception as error:
+                    logger.warning("Ошибка прогрева (%s): %s", name, error)
+                self.warmup_seconds[name] = time.perf_counter() - started
+
+            self.warmed_up = True
+
+        logger.info("Прогрев завершён за %.3f с: %s", sum(self.warmup_seconds.values()),
+                    ", ".join(f"{name} {seconds * 1000:.1f} мс" for name, seconds in self.warmup_seconds.items()))
+
+    def _warm_up_converters(self):
+        """
+        Строит таблицы всех языков; числовая сумма проходит векторный путь convert_many и загружает NumPy
+        """
+
+        for language in LOCALES:
+            list(self.get_converter(language).convert_many([1234.5]))
+
+    def _warm_up_clients(self):
+        """
+        Создаёт клиенты порталов, токены которых уже сохранены
+        """
+
+        for member_id in self.bx_clients.token_store.keys():
+            self.bx_clients.get(member_id)
+
+    def run_in_background(self, func, *args):
+        """
+        Выполняет функцию вне потока запроса: в очереди задач, если она включена,
+        иначе в отдельном потоке. Контекст вызывающего (request_id журнала) переходит в функцию
+        """
+
+        if self.task_queue is not None:
+            try:
+                self.task_queue.submit(func, *args)
+                return
+            except QueueFullError as error:
+                logger.warning("Фоновая задача выполняется в отдельном потоке: %s", error)
+
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(func, *args), name=f"amount2words-{func.__name__}", daemon=True).start()
+
+    def readiness(self) -> Tuple[bool, str]:
+        """
+        Готовность принимать активити
+
+        :return: Пара (готов, состояние: ready, warming_up, starting, stopping)
+        """
+
+        if self._stopped:
+            return False, "stopping"
+        if not self.warmed_up:
+            return False, "warming_up"
+        if not self._started:
+            return False, "starting"
+        return True, "ready"
+
+    def start(self):
+        """
+        Запускает фоновые потоки. В gunicorn вызывается в каждом воркере (post_worker_init):
+        потоки не переживают fork
+        """
+
+        if self._started:
+            return
+        self._started = True
+
+        # Без preload (сервер разработки) прогрев идёт в фоне: процесс уже отвечает на /healthz
+        if not self.warmed_up:
+            threading.Thread(target=self.warm_up, name="amount2words-warmup", daemon=True).start()
+
+        if TOKEN_RENEW_INTERVAL > 0:
+            self.bx_clients.start_token_renewer(TOKEN_RENEW_INTERVAL)
+
+        if self.task_queue is not None:
+            self.task_queue.start()
+
+        if self.outbox_dispatcher is not None:
+            self.outbox_dispatcher.start()
+
+        if METRICS_DIR:
+            REGISTRY.start_snapshots(METRICS_DIR)
+
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        """
+        Дожидается обработки уже принятых активити, затем отправляет накопленные
+        batch-команды и закрывает сессии. Повторный вызов ничего не делает
+        """
+
+        if self._stopped:
+            return
+        self._stopped = True
+
+        if self.task_queue is not None:
+            self.task_queue.shutdown(ASYNC_DRAIN_TIMEOUT)
+        # Недоставленные записи остаются в файле очереди — их доставит следующий запуск
+        if self.outbox_dispatcher is not None:
+            self.outbox_dispatcher.shutdown(ASYNC_DRAIN_TIMEOUT)
+        self.bx_clients.shutdown(ASYNC_DRAIN_TIMEOUT)
+
+        # Последний снимок: счётчики завершившегося воркера остаются в /metrics
+        REGISTRY.write_snapshot()
+
+    def collect_metrics(self):
+        """
+        Метрики из статистики сервисов: очередь задач, кеши, конвертеры, планировщики и соединения порталов
+
+        :return: Список (имя, тип, описание, отсчёты) для MetricsRegistry.register_collector
+        """
+
+        families = []
+
+        for handler in logger.handlers:
+            if hasattr(handler, "dropped"):
+                families.append(("log_records_dropped", "counter", "Записи журнала, отброшенные при переполнении очереди", [
+                    ("log_records_dropped_total", (), handler.dropped),
+                ]))
+
+        if self.task_queue is not None:
+            stats = self.task_queue.stats()
+            labels = (("queue", self.task_queue.name),)
+            families += [
+                ("task_queue_size", "gauge", "Задачи в очереди", [("task_queue_size", labels, stats["size"])]),
+                ("task_queue_workers", "gauge", "Рабочие потоки очереди", [("task_queue_workers", labels, stats["workers"])]),
+                ("task_queue_tasks", "counter", "Фоновые задачи по результату", [
+                    ("task_queue_tasks_total", labels + (("result", result),), stats[result])
+                    for result in ("processed", "failed", "rejected")
+                ]),
+            ]
+
+        cache_samples = []
+        for name, cache in (("event", self.processed_events), ("field", self.written_values)):
+            stats = cache.stats()
+            cache_samples += [
+                ("idempotency_cache_requests_total", (("cache", name), ("result", "hit")), stats["hits"]),
+                ("idempotency_cache_requests_total", (("cache", name), ("result", "miss")), stats["misses"]),
+            ]
+        families.append(("idempotency_cache_requests", "counter", "Обращения к кешам идемпотентности", cache_samples))
+
+        families.append(("amount2words_warmup_seconds", "gauge", "Длительность шагов прогрева", [
+            ("amount2words_warmup_seconds", (("step", name),), seconds) for name, seconds in self.warmup_seconds.items()
+        ]))
+
+        converter_samples = []
+        for language, converter in list(self.converters.items()):
+            info = converter.cache_info()
+            converter_samples += [
+                ("amount2words_cache_requests_total", (("language", language), ("result", "hit")), info["hits"]),
+                ("amount2words_cache_requests_total", (("language", language), ("result", "miss")), info["misses"]),
+            ]
+        families.append(("amount2words_cache_requests", "counter", "Обращения к кешу результатов конвертера", converter_samples))
+
+        if self.outbox is not None:
+            stats = self.outbox.stats()
+            # Таблица общая для воркеров: метка pid не даёт сложить одно и то же значение из всех процессов
+            labels = (("pid", str(os.getpid())),)
+            families += [
+                ("outbox_entries_pending", "gauge", "Записи исходящей очереди, ожидающие доставки", [
+                    ("outbox_entries_pending", labels, stats["pending"]),
+                ]),
+                ("outbox_entries_dead", "gauge", "Записи исходящей очереди, доставка которых прекращена", [
+                    ("outbox_entries_dead", labels, stats["dead"]),
+                ]),
+                ("outbox_oldest_entry_age_seconds", "gauge", "Возраст самой старой ожидающей записи", [
+                    ("outbox_oldest_entry_age_seconds", labels, stats["oldest_age"]),
+                ]),
+            ]
+
+        rate_samples, wait_samples, connection_samples = [], [], []
+        circuit_open_samples, circuit_rejected_samples = [], []
+        for client in self.bx_clients.clients():
+            labels = (("member_id", client.member_id),)
+            stats = client.circuit_breaker.stats()
+            circuit_open_samples.append(("bitrix24_circuit_open", labels, stats["open"]))
+            circuit_rejected_samples.append(("bitrix24_circuit_rejected_total", labels, stats["rejected"]))
+            if client.rate_limiter is not None:
+                stats = client.rate_limiter.stats()
+                rate_samples.append(("bitrix24_rate_limit", labels, stats["rate"]))
+                wait_samples.append(("bitrix24_rate_limit_wait_seconds_total", labels, stats["wait_total"]))
+            stats = client.connection_stats()
+            connection_samples += [
+                ("bitrix24_http_requests_total", labels + (("connection", "new"),), stats["connections"]),
+                ("bitrix24_http_requests_total", labels + (("connection", "reused"),), stats["reused"]),
+            ]
+        families += [
+            ("bitrix24_rate_limit", "gauge", "Текущий темп запросов к порталу в секунду", rate_samples),
+            ("bitrix24_rate_limit_wait_seconds", "counter", "Ожидание очереди планировщика запросов", wait_samples),
+            ("bitrix24_http_requests", "counter", "HTTP-запросы к порталу по новым и переиспользованным соединениям", connection_samples),
+            ("bitrix24_circuit_open", "gauge", "Вызовы к порталу отклоняются выключателем", circuit_open_samples),
+            ("bitrix24_circuit_rejected", "counter", "Вызовы, отклонённые выключателем без запроса к порталу", circuit_rejected_samples),
+        ]
+
+        return families
+
+
+bp = Blueprint("amount2words", __name__)
+
+
+# Проверки оркестратора: запрос без журнала, чтобы частые опросы не засоряли его
+PROBE_PATHS = frozenset({"/healthz", "/readyz"})
+
+
+@bp.before_app_request
+def begin_request():
+    """
+    Контекст запроса для журнала: request_id из заголовка X-Request-ID или новый
+    """
+
+    start_request(request.headers.get("X-Request-ID"))
+
+
+@bp.after_app_request
+def finish_request(response: Response) -> Response:
+    """
+    Возвращает request_id в заголовке ответа и записывает итог запроса с длительностью
+    """
+
+    request_id = current_request_id()
+    if request_id:
+        response.headers["X-Request-ID"] = request_id
+
+    if request.path in PROBE_PATHS:
+        return response
+
+    logger.info(
+        "%s %s → %s", request.method, request.path, response.status_code,
+        extra={"sample": True, "status": response.status_code, "duration_ms": round(request_elapsed_ms() or 0.0, 3)},
+    )
+    return response
+
+
+def get_services() -> AppServices:
+    """
+    Сервисы текущего приложения
+    """
+
+    return current_app.extensions["amount2words"]
+
+
+def create_app(start_services: bool = True) -> Flask:
+    """
+    Создаёт приложение Flask
+
+    :param start_services: Сразу запустить фоновые потоки. False — для preload в gunicorn,
+        потоки запускаются в воркерах хуком post_worker_init (см. gunicorn.conf.py)
+    :return: Приложение
+    """
+
+    build_logger()
+    app = Flask(__name__)
+    services = AppServices()
+    app.extensions["amount2words"] = services
+    app.register_blueprint(bp)
+    REGISTRY.register_collector(services.collect_metrics)
+
+    if start_services:
+        services.start()
+
+    return app
+
+
+# Код активити в бизнес-процессах портала
+ACTIVITY_CODE = "utils-bitrix-app.amount2words"
+
+
+def activity_fields() -> Dict[str, Any]:
+    """
+    Описание активити Сумма прописью для bizproc.activity.add / bizproc.activity.update
+    """
+
+    return {
+        "HANDLER": f"{APP_URL}/amount2words-handler",
+        "USE_SUBSCRIPTION": "Y",
+        "NAME": "Сумма прописью",
+        "DESCRIPTION": "Преобразует число в текстовое представление суммы",
+        "PROPERTIES": {
+            "SOURCE_AMOUNT": {
+                "NAME": "Исходные суммы",
+                "DESCRIPTION": "Поля с исходными суммами (UF_CRM_***): итог, НДС, предоплата, ...",
+                "TYPE": "string",
+                "REQUIRED": "Y",
+                "MULTIPLE": "Y",
+                "DEFAULT": ""
             },
-            "RETURN_PROPERTIES": {
-                "ERROR": {
-                    "NAME": "Ошибка",
-                    "TYPE": "string",
-                },
-                "STATUS": {
-                    "NAME": "Статус операции",
-                    "TYPE": "string"
-                }
+            "RESULT": {
+                "NAME": "Поля для сумм прописью",
+                "DESCRIPTION": "Коды полей для сумм прописью в том же порядке, что и исходные суммы (UF_CRM_***). "
+                               "Все заполненные поля записываются одним обновлением. Не заполняйте, "
+                               "чтобы взять результат из возвращаемого значения «Сумма прописью»",
+                "TYPE": "string",
+                "REQUIRED": "N",
+                "MULTIPLE": "Y",
+                "DEFAULT": ""
+            },
+            "LANGUAGE": {
+                "NAME": "Язык",
+                "TYPE": "select",
+                "OPTIONS": {"ru": "Русский", "en": "English"},
+                "REQUIRED": "N",
+                "MULTIPLE": "N",
+                "DEFAULT": DEFAULT_LANGUAGE
             }
-        })
-    except Exception as exc:
-        # Активити уже зарегистрирована — нормальная ситуация при переустановке
-        if "ERROR_ACTIVITY_ALREADY_INSTALLED" in str(exc):
-            logger.info("Активити 'Сумма прописью' уже зарегистрирована, пропускаем")
-            return
-        raise
+        },
+        "RETURN_PROPERTIES": {
+            "AMOUNT_WORDS": {
+                "NAME": "Сумма прописью",
+                "TYPE": "string",
+                "MULTIPLE": "Y",
+            },
+            "ERROR": {
+                "NAME": "Ошибка",
+                "TYPE": "string",
+            },
+            "STATUS": {
+                "NAME": "Статус операции",
+                "TYPE": "string"
+            }
+        }
+    }
+
 
+def activity_definitions() -> Dict[str, Dict[str, Any]]:
+    """
+    Активити приложения: код → описание. Новая активити добавляется сюда — при установке
+    она будет зарегистрирована на портале вместе с остальными одним вызовом batch
+    """
+
+    return {
+        ACTIVITY_CODE: activity_fields(),
+    }
 
-def send_bizproc_event(event_token: str, error_msg: str = "", status_msg: str = "ok"):
+
+def register_activities(services: AppServices, member_id: str):
     """
-    Завершает активити бизнес-процесса через bizproc.event.send
+    Приводит активити портала к описаниям приложения: добавляет новые, обновляет изменившиеся
+    (новые свойства и возвращаемые значения), удаляет убранные. Выполняется в фоне после установки
     """
 
     try:
-        bx_client.call("bizproc.event.send", {
-            "event_token": event_token,
-            "return_values": {"ERROR": error_msg, "STATUS": status_msg},
-        })
+        summary = services.activity_registry.sync(services.bx_clients.get(member_id), member_id)
     except Exception as error:
-        logger.exception("Ошибка API при отправке bizproc.event.send:", error)
+        logger.exception("Ошибка регистрации активити портала %s: %s", member_id, error)
+        return
+
+    logger.info("Активити портала %s: добавлены %s, обновлены %s, удалены %s, без изменений %s, с ошибкой %s",
+                member_id, summary["added"], summary["updated"], summary["deleted"], summary["unchanged"], summary["failed"])
 
 
-def update_crm_field(deal_id: str, field: str, value: str):
+def bizproc_event(event_token: str, error_msg: str = "", status_msg: str = "ok", amount_words: List[str] = ()) -> Tuple[str, Dict[str, Any]]:
     """
-    Обновляет поле CRM-сущности
+    Вызов bizproc.event.send, завершающий активити
+
+    :param amount_words: Суммы прописью — множественное возвращаемое значение AMOUNT_WORDS
+    :return: Пара (метод, параметры)
     """
 
-    try:
-        bx_client.call("crm.deal.update", {
-            "id": deal_id,
-            "fields": {
-                field: value
-            }
-        })
+    return "bizproc.event.send", {
+        "event_token": event_token,
+        "return_values": {"AMOUNT_WORDS": list(amount_words), "ERROR": error_msg, "STATUS": status_msg},
+    }
+
+
+def defer_calls(services: AppServices, member_id: str, commands: List[Tuple[str, Dict[str, Any]]],
+                on_error: List[Tuple[str, Dict[str, Any]]] = None) -> bool:
+    """
+    Откладывает вызовы портала в исходящую очередь: они будут выполнены по порядку, когда портал восстановится
+
+    :param on_error: Вызовы вместо оставшихся, если вызов завершится постоянной ошибкой
+    :return: True, если вызовы приняты очередью (False — очередь отключена)
+    """
+
+    if services.outbox is None:
+        return False
+
+    # Первая попытка — не раньше, чем выключатель портала пропустит пробный вызов
+    delay = max(services.bx_clients.get(member_id).circuit_breaker.retry_after(), OUTBOX_INTERVAL)
+    services.outbox.add(member_id, commands, on_error, delay=delay)
+    return True
+
+
+def send_bizproc_event(services: AppServices, member_id: str, event_token: str, error_msg: str = "", status_msg: str = "ok",
+                       amount_words: List[str] = ()):
+    """
+    Завершает активити бизнес-процесса через bizproc.event.send.
+    Если портал недоступен, вызов откладывается в исходящую очередь
 
-        logger.info("Поле %s обновлено: → %s", field, value)
+    :param amount_words: Суммы прописью — множественное возвращаемое значение AMOUNT_WORDS
+    :return: True, если событие отправлено или отложено
+    """
+
+    method, params = bizproc_event(event_token, error_msg, status_msg, amount_words)
+
+    try:
+        with STAGE_SECONDS.time("event_send"):
+            services.bx_clients.call(member_id, method, params)
     except Exception as error:
-        logger.exception("Ошибка API при обновлении: %s", error)
+        if is_transient(error) and defer_calls(services, member_id, [(method, params)]):
+            logger.warning("Портал недоступен, bizproc.event.send отложен: %s", error)
+            return True
+        logger.exception("Ошибка API при отправке bizproc.event.send: %s", error)
+        return False
+
+    return True
+
+
+# Методы обновления CRM-сущностей по типу документа бизнес-процесса (document_id[2])
+ENTITY_UPDATE_METHODS = {
+    "DEAL": "crm.deal.update",
+    "LEAD": "crm.lead.update",
+    "CONTACT": "crm.contact.update",
+    "COMPANY": "crm.company.update",
+}
+
+
+def entity_update_call(entity_type: str, entity_id: str, fields: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Метод API и параметры обновления полей CRM-сущности
+
+    :param entity_type: Тип сущности из parse_document_id: DEAL, LEAD, CONTACT, COMPANY, DYNAMIC_<entityTypeId>
+    :return: Пара (метод, параметры)
+    :raises ValueError: Запись в сущности этого типа не поддерживается
+    """
+
+    method = ENTITY_UPDATE_METHODS.get(entity_type)
+    if method is not None:
+        return method, {"id": entity_id, "fields": fields}
+
+    # Элементы смарт-процессов обновляются универсальным crm.item.update
+    if entity_type and entity_type.startswith("DYNAMIC_") and entity_type[8:].isdigit():
+        return "crm.item.update", {"entityTypeId": int(entity_type[8:]), "id": entity_id, "fields": fields}
+
+    raise ValueError(f"Запись полей не поддерживается для документа {entity_type}, используйте возвращаемое значение")
+
+
+def update_crm_fields(services: AppServices, member_id: str, entity_type: str, entity_id: str, values: Dict[str, str]):
+    """
+    Обновляет поля CRM-сущности одним вызовом API. Ошибка API пробрасывается вызывающему,
+    чтобы активити завершилась со статусом error, а не молча без записи полей.
+    Поля, в которые уже записано это же значение, не отправляются; если не изменилось ни одно — запроса нет
+    """
+
+    method, _ = entity_update_call(entity_type, entity_id, {})
+
+    # Ключ — портал, документ и поле; тот же ключ у пересчёта сделок (lib/deal_recalculator.py)
+    cache_keys = {field: written_value_key(member_id, entity_type, entity_id, field) for field in values}
+    changed = {
+        field: value for field, value in values.items()
+        if services.written_values.get(cache_keys[field]) != value
+    }
+
+    if not changed:
+        logger.info("Поля %s не изменились, обновление пропущено", ", ".join(values), extra={"sample": True})
+        return
+
+    _, params = entity_update_call(entity_type, entity_id, changed)
+    with STAGE_SECONDS.time("update"):
+        services.bx_clients.call(member_id, method, params)
 
+    for field, value in changed.items():
+        services.written_values.set(cache_keys[field], value)
 
-@app.route("/install", methods=["POST"])
+    logger.info("Поля обновлены (%s): %s", method, changed, extra={"sample": True})
+
+
+@bp.route("/install", methods=["POST"])
 def install():
     """
     Endpoint для обработки установки приложения Bitrix24
     """
 
     try:
-        # Bitrix присылает вложенные ключи — приводим к нормальной структуре
-        data = parse_nested(request.form.to_dict())
+        # Bitrix присылает вложенные ключи — разбираем тело сразу в нормальную структуру
+        data = parse_form(request.get_data())
     except Exception as error:
         logger.exception("Ошибка парсинга form-data при установке: %s", error)
         return jsonify({"error": "bad_request"}), HTTPStatus.BAD_REQUEST
@@ -140,27 +684,90 @@ def install():
         logger.error("Отсутствуют auth-данные в запросе установки")
         return jsonify({"error": "missing_auth"}), HTTPStatus.BAD_REQUEST
 
-    # Сохраняем токены Bitrix24
-    bx_client.set_tokens(auth_data)
+    services = get_services()
+
+    # Сохраняем токены Bitrix24 под member_id портала
+    member_id = auth_data.get("member_id")
+    # Переустановка портала однопортальной установки: его токены старого формата переходят под member_id
+    services.bx_clients.adopt_default_tokens(member_id, auth_data)
+    services.bx_clients.get(member_id).set_tokens(auth_data)
     logger.info("Токены сохранены. Портал: %s", auth_data.get("domain"))
 
-    try:
-        register_activity()
-        logger.info("Активити 'amount2words' успешно зарегистрирована")
-    except Exception as error:
-        logger.exception("Ошибка регистрации активити: %s", error)
+    # Регистрация активити — вызовы портала; ответ на вебхук установки их не ждёт
+    services.run_in_background(register_activities, services, member_id)
 
     return "", HTTPStatus.OK
 
 
-@app.route("/amount2words-handler", methods=["POST"])
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Метрики в текстовом формате Prometheus
+    """
+
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/healthz", methods=["GET"])
+def healthz():
+    """
+    Проверка живости: процесс отвечает на запросы. Не зависит от портала и прогрева
+    """
+
+    return jsonify({"status": "ok"}), HTTPStatus.OK
+
+
+@bp.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Проверка готовности: прогрев завершён, фоновые потоки запущены, процесс не останавливается.
+    Пока ответ 503, балансировщик не направляет запросы в этот процесс
+    """
+
+    ready, state = get_services().readiness()
+    warmup = {name: round(seconds * 1000, 3) for name, seconds in get_services().warmup_seconds.items()}
+    return jsonify({"status": state, "warmup_ms": warmup}), HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE
+
+
+# Поля вебхука активити, которые читает обработчик
+ACTIVITY_FIELDS = (
+    "event_token",
+    "auth[member_id]",
+    "auth[domain]",
+    "auth[client_endpoint]",
+    "properties[SOURCE_AMOUNT]",
+    "properties[SOURCE_AMOUNT][]",
+    "properties[RESULT]",
+    "properties[RESULT][]",
+    "properties[LANGUAGE]",
+    "document_id[2]",
+)
+
+
+def _property_values(data: Dict[str, Any], name: str) -> List[str]:
+    """
+    Значения свойства активити списком: множественное свойство приходит как properties[NAME][0], [1], ...,
+    а в шаблонах, настроенных до появления множественных свойств, — одним значением
+    """
+
+    values = data.get(f"properties[{name}][]")
+    if values is not None:
+        return values
+
+    value = data.get(f"properties[{name}]")
+    return [value] if value is not None else []
+
+
+@bp.route("/amount2words-handler", methods=["POST"])
 def amount2words_handler():
     """
     Обработчик активити Сумма прописью бизнес-процесса
     """
 
     try:
-        data = parse_nested(request.form.to_dict())
+        # Из тела нужны только несколько полей — остальные (auth, document_type, ...) не разбираются
+        with STAGE_SECONDS.time("parse"):
+            data = extract_fields(request.get_data(), ACTIVITY_FIELDS)
     except Exception as error:
         logger.exception("Ошибка парсинга form-data в обработчике активити: %s", error)
         return jsonify({"error": "bad_request"}), HTTPStatus.BAD_REQUEST
@@ -170,42 +777,107 @@ def amount2words_handler():
         logger.error("Отсутствует event_token — невозможно завершить активити")
         return jsonify({"error": "missing_event_token"}), HTTPStatus.BAD_REQUEST
 
-    properties = data.get("properties") or {}
-    source_amount = properties.get("SOURCE_AMOUNT")
+    # Без member_id — портал однопортальной установки: ключ токенов, очереди и кешей тот же, что у пересчёта сделок
+    member_id = data.get("auth[member_id]") or DEFAULT_KEY
 
-    if source_amount == "":
-        source_amount = "0"
-    else:
-        source_amount = str(source_amount).split("|")[0]
+    # Денежное поле приходит как "1234.50|RUB" — разбирается конвертером целиком
+    source_amounts = [amount or "0" for amount in _property_values(data, "SOURCE_AMOUNT")] or ["0"]
 
-    try:
-        amount_in_words = converter.convert(source_amount)
-        logger.info("Конвертация: %s → %s", source_amount, amount_in_words)
-    except Exception as error:
-        logger.exception("Ошибка конвертации суммы '%s': %s", source_amount, error)
-        send_bizproc_event(event_token, error_msg="Ошибка конвертации суммы", status_msg="error")
-        return "", HTTPStatus.OK
+    # Пустые поля результата — суммы, которые нужны только в возвращаемом значении
+    result_fields = _property_values(data, "RESULT")
+    language = data.get("properties[LANGUAGE]") or DEFAULT_LANGUAGE
+    document = parse_document_id(data.get("document_id[2]", ""))
 
-    result_field = properties.get("RESULT")
-    document_id = data.get("document_id")
-    deal_raw = document_id.get("2")
+    services = get_services()
 
-    if deal_raw.startswith("DEAL_"):
-        deal_id = deal_raw.split("_")[1]
-    else:
-        deal_id = None
+    # Портал однопортальной установки: токены старого формата переходят под его member_id,
+    # только если домен вебхука совпадает с доменом сохранённых токенов
+    services.bx_clients.adopt_default_tokens(
+        member_id, {"domain": data.get("auth[domain]"), "client_endpoint": data.get("auth[client_endpoint]")}
+    )
 
-    try:
-        update_crm_field(deal_id, result_field, amount_in_words)
-        send_bizproc_event(event_token, error_msg="", status_msg="ok")
-    except Exception as error:
-        logger.exception("Ошибка обновления поля суммы: %s", error)
-        send_bizproc_event(event_token, error_msg="Ошибка обновления поля суммы", status_msg="error")
+    # Повторная доставка того же вебхука: активити уже обработана или обрабатывается
+    if not services.processed_events.claim(event_token):
+        logger.info("Повторный вебхук активити пропущен: %s", event_token)
         return "", HTTPStatus.OK
 
+    if services.task_queue is None:
+        process_activity(services, member_id, event_token, source_amounts, document, result_fields, language)
+        return "", HTTPStatus.OK
+
+    try:
+        services.task_queue.submit(
+            process_activity, services, member_id, event_token, source_amounts, document, result_fields, language
+        )
+    except QueueFullError as error:
+        # Bitrix24 повторит доставку вебхука позже — повтор должен быть обработан
+        services.processed_events.release(event_token)
+        logger.warning("Активити отклонена: %s", error)
+        return jsonify({"error": "queue_full"}), HTTPStatus.SERVICE_UNAVAILABLE
+
     return "", HTTPStatus.OK
 
 
+def process_activity(services: AppServices, member_id: str, event_token: str, source_amounts: List[str],
+                     document: Tuple[Optional[str], Optional[str]], result_fields: List[str],
+                     language: str = DEFAULT_LANGUAGE):
+    """
+    Конвертирует суммы и завершает активити, возвращая суммы прописью в AMOUNT_WORDS (в порядке исходных сумм).
+    Суммы, для которых задано поле результата (пары SOURCE_AMOUNT[i] → RESULT[i]), записываются
+    в документ одним вызовом API. Без полей результата вызов один (bizproc.event.send),
+    и активити работает в любом документе.
+    Если портал недоступен, вызовы откладываются в исходящую очередь и активити завершится после его восстановления.
+    Если завершить активити не удалось, event_token освобождается для повторной доставки
+    """
+
+    entity_type, entity_id = document
+
+    try:
+        converter = services.get_converter(language)
+        if converter is None:
+            raise ValueError(f"Язык не поддерживается: {language}")
+        if len(result_fields) > len(source_amounts):
+            raise ValueError(f"Полей результата ({len(result_fields)}) больше, чем исходных сумм ({len(source_amounts)})")
+        with STAGE_SECONDS.time("convert"):
+            amounts_in_words = list(converter.convert_many(source_amounts))
+        logger.info("Конвертация: %s → %s", source_amounts, amounts_in_words, extra={"sample": True})
+    except Exception as error:
+        logger.exception("Ошибка конвертации сумм %s: %s", source_amounts, error)
+        status = "convert_error"
+        sent = send_bizproc_event(services, member_id, event_token, error_msg="Ошибка конвертации суммы", status_msg="error")
+    else:
+        values = {field: text for field, text in zip(result_fields, amounts_in_words) if field}
+        try:
+            if values:
+                update_crm_fields(services, member_id, entity_type, entity_id, values)
+            status = "ok"
+            sent = send_bizproc_event(services, member_id, event_token, status_msg="ok", amount_words=amounts_in_words)
+        except Exception as error:
+            # Портал недоступен: запись полей и завершение активити откладываются вместе и выполнятся по порядку
+            if is_transient(error) and defer_calls(
+                    services, member_id,
+                    [entity_update_call(entity_type, entity_id, values),
+                     bizproc_event(event_token, status_msg="ok", amount_words=amounts_in_words)],
+                    on_error=[bizproc_event(event_token, "Ошибка обновления поля суммы", "error", amounts_in_words)],
+            ):
+                logger.warning("Портал недоступен, обновление полей и bizproc.event.send отложены: %s", error)
+                status, sent = "deferred", True
+            else:
+                logger.exception("Ошибка обновления полей суммы: %s", error)
+                status = "update_error"
+                sent = send_bizproc_event(services, member_id, event_token, error_msg="Ошибка обновления поля суммы", status_msg="error",
+                                          amount_words=amounts_in_words)
+
+    ACTIVITIES.inc(status if sent else "event_send_error")
+
+    if not sent:
+        services.processed_events.release(event_token)
+
+
 if __name__ == "__main__":
+    # SIGTERM (docker stop) завершает процесс через sys.exit, чтобы отработали atexit-обработчики
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # Сервер разработки; в продакшене — gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app()
     logger.info(f"Запуск сервера в среде: {ENV}")
     app.run(host="0.0.0.0", port=PORT, debug=(ENV != "PRODUCTION"))
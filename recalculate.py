@@ -0,0 +1,82 @@
+"""
+Пересчёт суммы прописью во всех сделках портала — после смены полей или для исправления записанных значений
+
+Запуск:
+    python recalculate.py --member-id <member_id> --source UF_CRM_AMOUNT --result UF_CRM_AMOUNT_WORDS
+    python recalculate.py ... --checkpoint recalc.json   # прерванный пересчёт продолжится с контрольной точки
+    python recalculate.py ... --dry-run                  # только посчитать изменения
+
+Токены портала, лимит запросов и кеш записанных значений берутся из тех же переменных окружения, что и у приложения.
+Темп запросов к порталу складывается с темпом работающего приложения — при необходимости задайте --rate-limit меньше.
+Сделки, не записанные из-за перегрузки портала, остаются в контрольной точке (retry_ids):
+повторный запуск с тем же --checkpoint запишет их
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from dotenv import load_dotenv
+
+from amount2words.amount2words import Amount2Words
+from lib.bitrix24_client import Bitrix24Client
+from lib.deal_recalculator import DealRecalculator
+from lib.idempotency import TTLCache, create_cache_backend
+from lib.token_store import create_token_store
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--member-id", help="Портал (member_id); без него — портал однопортальной установки")
+    parser.add_argument("--source", required=True, help="Поле с исходной суммой (UF_CRM_*** или OPPORTUNITY)")
+    parser.add_argument("--result", required=True, help="Поле для суммы прописью")
+    parser.add_argument("--language", default=os.environ.get("DEFAULT_LANGUAGE", "ru"), help="Язык суммы прописью")
+    parser.add_argument("--filter", default="{}", help='Дополнительный фильтр crm.deal.list в JSON, например {"CATEGORY_ID": 1}')
+    parser.add_argument("--checkpoint", help="Файл контрольной точки для возобновления")
+    parser.add_argument("--restart", action="store_true", help="Начать заново, не используя контрольную точку")
+    parser.add_argument("--rate-limit", type=float, default=float(os.environ.get("RATE_LIMIT", "2")), help="Запросов к порталу в секунду")
+    parser.add_argument("--dry-run", action="store_true", help="Ничего не записывать")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)-8s %(name)s — %(message)s")
+
+    client = Bitrix24Client(
+        os.environ.get("BITRIX24_CLIENT_ID"), os.environ.get("BITRIX24_CLIENT_SECRET"),
+        token_store=create_token_store(
+            os.environ.get("TOKEN_STORE", "json"), os.environ.get("TOKEN_STORE_PATH", "utils_bitrix_app_tokens.json")
+        ),
+        member_id=args.member_id,
+        rate_limit=args.rate_limit,
+        rate_burst=int(os.environ.get("RATE_BURST", "50")),
+    )
+
+    # Кеш записанных значений обработчика активити: общий с приложением только в SQLite
+    written_values = None
+    if os.environ.get("IDEMPOTENCY_BACKEND", "memory") == "sqlite":
+        written_values = TTLCache(
+            create_cache_backend("sqlite", os.environ.get("IDEMPOTENCY_PATH", "utils_bitrix_app_cache.sqlite3")),
+            "field", float(os.environ.get("FIELD_VALUE_TTL", "600")),
+        )
+
+    recalculator = DealRecalculator(
+        client, Amount2Words(args.language), args.source, args.result,
+        checkpoint_path=args.checkpoint, deal_filter=json.loads(args.filter),
+        written_values=written_values, dry_run=args.dry_run,
+    )
+
+    try:
+        state = recalculator.run(resume=not args.restart)
+    except KeyboardInterrupt:
+        print(f"Прервано после сделки {recalculator.state['last_id']}", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        client.close()
+
+    print(json.dumps(state, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Общие фикстуры тестов: локальный имитатор REST API Bitrix24 и токены портала
+"""
+
+import time
+
+import pytest
+
+from benchmarks.fake_bitrix import start_server
+from lib.token_store import JsonFileTokenStore
+
+MEMBER_ID = "test"
+
+
+@pytest.fixture
+def fake_bitrix():
+    """
+    Имитатор Bitrix24 без задержек и сбоев; выключается после теста
+    """
+
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def token_store(tmp_path, fake_bitrix):
+    """
+    Хранилище с действующими токенами портала MEMBER_ID, указывающими на имитатор
+    """
+
+    store = JsonFileTokenStore(str(tmp_path / "tokens.json"))
+    store.set(MEMBER_ID, portal_tokens(fake_bitrix))
+    return store
+
+
+def portal_tokens(server, expires_in: float = 3600) -> dict:
+    """
+    Токены портала имитатора; отрицательный expires_in — истёкший access_token
+    """
+
+    return {
+        "access_token": "access-initial",
+        "refresh_token": "refresh-initial",
+        "client_endpoint": server.endpoint,
+        "expires": time.time() + expires_in,
+        "member_id": MEMBER_ID,
+    }
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, fake_bitrix):
+    """
+    Приложение с порталом MEMBER_ID на имитаторе: обработка в запросе, файлы во временном каталоге
+    """
+
+    import main
+
+    monkeypatch.setattr(main, "TOKEN_STORE", "json")
+    monkeypatch.setattr(main, "TOKEN_STORE_PATH", str(tmp_path / "tokens.json"))
+    monkeypatch.setattr(main, "IDEMPOTENCY_BACKEND", "memory")
+    monkeypatch.setattr(main, "OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(main, "ASYNC_WORKERS", 0)
+    monkeypatch.setattr(main, "BATCH_WINDOW", 0)
+    monkeypatch.setattr(main, "RATE_LIMIT", 0)
+    monkeypatch.setattr(main, "METRICS_DIR", "")
+
+    app = main.create_app(start_services=False)
+    services = app.extensions["amount2words"]
+    services.bx_clients.get(MEMBER_ID).set_tokens(portal_tokens(fake_bitrix))
+    yield app
+    services.shutdown()
@@ -0,0 +1,81 @@
+from amount2words.amount2words import Amount2Words
+from lib.deal_recalculator import DealRecalculator
+from tests.conftest import MEMBER_ID, portal_tokens
+
+
+def post_activity(app, **fields):
+    data = {"event_token": "token-1", "auth[member_id]": MEMBER_ID, "document_id[2]": "DEAL_7", **fields}
+    return app.test_client().post("/amount2words-handler", data=data)
+
+
+def sent(server, method):
+    return [params for name, params in server.requests if name == method]
+
+
+def test_multiple_amounts_are_written_in_one_update(app, fake_bitrix):
+    response = post_activity(app, **{
+        "properties[SOURCE_AMOUNT][0]": "15", "properties[SOURCE_AMOUNT][1]": "2.50|USD",
+        "properties[RESULT][0]": "UF_A", "properties[RESULT][1]": "UF_B",
+    })
+
+    assert response.status_code == 200
+    (update,) = sent(fake_bitrix, "crm.deal.update")
+    assert update["id"] == "7"
+    assert update["fields"] == {"UF_A": "Пятнадцать рублей 00 копеек", "UF_B": "Два доллара 50 центов"}
+    (event,) = sent(fake_bitrix, "bizproc.event.send")
+    assert event["return_values"]["AMOUNT_WORDS"] == ["Пятнадцать рублей 00 копеек", "Два доллара 50 центов"]
+    assert event["return_values"]["STATUS"] == "ok"
+
+
+def test_literal_empty_bracket_keys_are_lists(app, fake_bitrix):
+    response = post_activity(app, **{"properties[SOURCE_AMOUNT][]": "15", "properties[RESULT][]": "UF_B"})
+
+    assert response.status_code == 200
+    (update,) = sent(fake_bitrix, "crm.deal.update")
+    assert update["fields"] == {"UF_B": "Пятнадцать рублей 00 копеек"}
+    (event,) = sent(fake_bitrix, "bizproc.event.send")
+    assert event["return_values"]["STATUS"] == "ok"
+
+
+def test_repeated_empty_bracket_keys(app, fake_bitrix):
+    body = ("event_token=token-2&auth[member_id]=test&document_id[2]=DEAL_7"
+            "&properties[SOURCE_AMOUNT][]=15&properties[SOURCE_AMOUNT][]=16&properties[RESULT][]=UF_A")
+    response = app.test_client().post("/amount2words-handler", data=body,
+                                      content_type="application/x-www-form-urlencoded")
+
+    assert response.status_code == 200
+    (update,) = sent(fake_bitrix, "crm.deal.update")
+    assert update["fields"] == {"UF_A": "Пятнадцать рублей 00 копеек"}
+    (event,) = sent(fake_bitrix, "bizproc.event.send")
+    assert event["return_values"]["AMOUNT_WORDS"] == ["Пятнадцать рублей 00 копеек", "Шестнадцать рублей 00 копеек"]
+
+
+def test_single_value_template_still_works(app, fake_bitrix):
+    response = post_activity(app, **{"properties[SOURCE_AMOUNT]": "1", "properties[RESULT]": "UF_A"})
+
+    assert response.status_code == 200
+    (update,) = sent(fake_bitrix, "crm.deal.update")
+    assert update["fields"] == {"UF_A": "Один рубль 00 копеек"}
+
+
+def test_single_portal_handler_shares_written_values_with_recalculator(app, fake_bitrix):
+    services = app.extensions["amount2words"]
+    client = services.bx_clients.get(None)
+    client.set_tokens(portal_tokens(fake_bitrix))
+    fake_bitrix.deals = 1
+
+    recalculator = DealRecalculator(client, Amount2Words("ru"), "OPPORTUNITY", "UF_CRM_WORDS",
+                                    written_values=services.written_values, retry_delay=0)
+    assert recalculator.run()["updated"] == 1
+
+    # Вебхук однопортальной установки без auth[member_id]: значение уже записано пересчётом
+    fake_bitrix.requests.clear()
+    response = app.test_client().post("/amount2words-handler", data={
+        "event_token": "token-3", "document_id[2]": "DEAL_1",
+        "properties[SOURCE_AMOUNT]": "37.01|RUB", "properties[RESULT]": "UF_CRM_WORDS",
+    })
+
+    assert response.status_code == 200
+    assert sent(fake_bitrix, "crm.deal.update") == []
+    (event,) = sent(fake_bitrix, "bizproc.event.send")
+    assert event["return_values"]["STATUS"] == "ok"
@@ -0,0 +1,228 @@
+import asyncio
+
+import pytest
+
+from lib.async_bitrix24_client import AsyncBitrix24Client
+from lib.bitrix24_client import Bitrix24APIError, Bitrix24Client
+from lib.circuit_breaker import CircuitOpenError
+from lib.token_store import JsonFileTokenStore
+from tests.conftest import MEMBER_ID, portal_tokens
+
+
+def make_client(token_store, **options) -> AsyncBitrix24Client:
+    """
+    Асинхронный клиент портала имитатора без ограничения темпа и пауз между повторами
+    """
+
+    options.setdefault("max_retries", 3)
+    return AsyncBitrix24Client("client", "secret", token_store=token_store, member_id=MEMBER_ID,
+                               rate_limit=0, backoff_factor=0, **options)
+
+
+def run(client: AsyncBitrix24Client, coroutine_factory):
+    """
+    Выполняет корутину клиента в новом event loop и закрывает сессию
+    """
+
+    async def main():
+        async with client:
+            return await coroutine_factory()
+
+    return asyncio.run(main())
+
+
+def test_call_returns_result_and_sends_access_token(fake_bitrix, token_store):
+    client = make_client(token_store)
+
+    assert run(client, lambda: client.call("crm.deal.update", {"id": 1})) is True
+
+    method, params = fake_bitrix.requests[-1]
+    assert method == "crm.deal.update"
+    assert params == {"id": 1, "auth": "access-initial"}
+
+
+def test_call_batch_keeps_command_order_and_maps_errors(fake_bitrix, token_store):
+    fake_bitrix.script("batch", (200, {"result": {
+        "result": {"cmd0": {"ID": 1}, "cmd2": {"ID": 3}},
+        "result_error": {"cmd1": {"error": "NOT_FOUND", "error_description": "Не найдено"}},
+    }}))
+    client = make_client(token_store)
+
+    results = run(client, lambda: client.call_batch([("crm.deal.get", {"id": index}) for index in (1, 2, 3)]))
+
+    assert [result["result"] for result in results] == [{"ID": 1}, None, {"ID": 3}]
+    assert results[0]["error"] is None and results[2]["error"] is None
+    assert results[1]["error"].code == "NOT_FOUND"
+
+
+def test_call_batch_splits_commands_by_batch_limit(fake_bitrix, token_store):
+    client = make_client(token_store)
+    commands = [("crm.deal.update", {"id": index}) for index in range(client.BATCH_LIMIT * 2 + 1)]
+
+    results = run(client, lambda: client.call_batch(commands))
+
+    assert len(results) == len(commands)
+    assert all(result["error"] is None for result in results)
+    assert fake_bitrix.calls["batch"] == 3
+
+
+def test_call_batch_marks_commands_skipped_after_halt(fake_bitrix, token_store):
+    fake_bitrix.script("batch", (200, {"result": {
+        "result": {"cmd0": True},
+        "result_error": {"cmd1": {"error": "ACCESS_DENIED", "error_description": "Нет доступа"}},
+    }}))
+    client = make_client(token_store)
+
+    results = run(client, lambda: client.call_batch([("crm.deal.update", {"id": index}) for index in range(3)], halt=True))
+
+    assert [result["error"] and result["error"].code for result in results] == [None, "ACCESS_DENIED", "BATCH_COMMAND_SKIPPED"]
+
+
+@pytest.mark.parametrize("failure", [
+    (503, {"error": "INTERNAL_SERVER_ERROR", "error_description": "Сбой"}),
+    (503, {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"}),
+    (429, {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"}),
+    (502, b"<html>Bad Gateway</html>"),
+])
+def test_call_retries_overload_and_server_errors(fake_bitrix, token_store, failure):
+    fake_bitrix.script("crm.deal.get", failure, failure, (200, {"result": {"ID": 1}}))
+    client = make_client(token_store)
+
+    assert run(client, lambda: client.call("crm.deal.get", {"id": 1})) == {"ID": 1}
+    assert fake_bitrix.calls["crm.deal.get"] == 3
+
+
+def test_call_raises_api_error_when_retries_exhausted(fake_bitrix, token_store):
+    failure = (503, {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"})
+    fake_bitrix.script("crm.deal.get", failure, failure, failure)
+    client = make_client(token_store, max_retries=2)
+
+    with pytest.raises(Bitrix24APIError) as error:
+        run(client, lambda: client.call("crm.deal.get", {"id": 1}))
+
+    assert error.value.code == "QUERY_LIMIT_EXCEEDED"
+    assert fake_bitrix.calls["crm.deal.get"] == 3
+
+
+def test_call_does_not_retry_api_errors(fake_bitrix, token_store):
+    fake_bitrix.script("crm.deal.get", (400, {"error": "ACCESS_DENIED", "error_description": "Нет доступа"}))
+    client = make_client(token_store)
+
+    with pytest.raises(Bitrix24APIError) as error:
+        run(client, lambda: client.call("crm.deal.get", {"id": 1}))
+
+    assert error.value.code == "ACCESS_DENIED"
+    assert fake_bitrix.calls["crm.deal.get"] == 1
+
+
+def test_call_maps_non_json_response_to_connection_error(fake_bitrix, token_store):
+    fake_bitrix.script("crm.deal.get", (502, b"<html>Bad Gateway</html>"))
+    client = make_client(token_store, max_retries=0)
+
+    with pytest.raises(ConnectionError, match="не в формате JSON"):
+        run(client, lambda: client.call("crm.deal.get", {"id": 1}))
+
+
+def test_call_maps_http_error_without_api_error_to_connection_error(fake_bitrix, token_store):
+    fake_bitrix.script("crm.deal.get", (404, {"result": None}))
+    client = make_client(token_store)
+
+    with pytest.raises(ConnectionError, match="HTTP 404"):
+        run(client, lambda: client.call("crm.deal.get", {"id": 1}))
+
+    assert fake_bitrix.calls["crm.deal.get"] == 1
+
+
+def test_call_maps_network_error_to_connection_error(token_store):
+    tokens = token_store.get(MEMBER_ID)
+    tokens["client_endpoint"] = "http://127.0.0.1:9/rest/"
+    token_store.set(MEMBER_ID, tokens)
+    client = make_client(token_store, max_retries=0)
+
+    with pytest.raises(ConnectionError, match="Ошибка сетевого запроса"):
+        run(client, lambda: client.call("crm.deal.get", {"id": 1}))
+
+
+def test_token_refresh_is_shared_with_sync_client(fake_bitrix, token_store):
+    token_store.set(MEMBER_ID, portal_tokens(fake_bitrix, expires_in=-60))
+    sync_client = Bitrix24Client("client", "secret", token_store=token_store, member_id=MEMBER_ID,
+                                 rate_limit=0, backoff_factor=0)
+    sync_client.OAUTH_URL = fake_bitrix.oauth_url
+    client = AsyncBitrix24Client.from_client(sync_client, max_retries=0)
+    client.OAUTH_URL = fake_bitrix.oauth_url
+
+    # Одновременные вызовы с истёкшим токеном: обновление одно, все вызовы идут с новым токеном
+    async def calls():
+        return await asyncio.gather(*(client.call("crm.deal.get", {"id": index}) for index in range(10)))
+
+    assert run(client, calls) == [True] * 10
+    assert fake_bitrix.calls["oauth"] == 1
+
+    refreshed = sync_client._tokens["access_token"]
+    assert refreshed != "access-initial"
+    assert {params["auth"] for method, params in fake_bitrix.requests} == {refreshed}
+    assert token_store.get(MEMBER_ID)["access_token"] == refreshed
+
+    # Синхронный клиент видит новый токен и не обновляет его повторно
+    assert sync_client.call("crm.deal.get", {"id": 1}) is True
+    assert fake_bitrix.requests[-1][1]["auth"] == refreshed
+    assert fake_bitrix.calls["oauth"] == 1
+    sync_client.close()
+
+
+def test_token_refresh_failure_is_connection_error(fake_bitrix, token_store):
+    token_store.set(MEMBER_ID, portal_tokens(fake_bitrix, expires_in=-60))
+    fake_bitrix.script("oauth", (401, {"error": "invalid_grant"}))
+    client = make_client(token_store, max_retries=0)
+    client.OAUTH_URL = fake_bitrix.oauth_url
+
+    with pytest.raises(ConnectionError, match="обновлении токена"):
+        run(client, lambda: client.call("crm.deal.get", {"id": 1}))
+
+    assert "crm.deal.get" not in fake_bitrix.calls
+
+
+def test_call_retries_with_tokens_saved_by_another_process(fake_bitrix, token_store):
+    client = make_client(JsonFileTokenStore(token_store.path))
+
+    # Другой воркер обновил токен: токен этого процесса уже отозван порталом
+    tokens = portal_tokens(fake_bitrix)
+    tokens["access_token"] = "access-refreshed"
+    token_store.set(MEMBER_ID, tokens)
+    fake_bitrix.script("crm.deal.get", (401, {"error": "expired_token", "error_description": "The access token provided has expired"}))
+
+    assert run(client, lambda: client.call("crm.deal.get", {"id": 1})) is True
+    assert [params["auth"] for method, params in fake_bitrix.requests] == ["access-initial", "access-refreshed"]
+
+
+def test_open_circuit_rejects_calls_without_requests(fake_bitrix, token_store):
+    client = make_client(token_store, max_retries=0, circuit_threshold=2, circuit_reset_timeout=30)
+    fake_bitrix.failure_rate = 1.0
+
+    async def calls():
+        errors = []
+        for _ in range(4):
+            try:
+                await client.call("crm.deal.get", {"id": 1})
+            except Exception as error:
+                errors.append(type(error))
+        return errors
+
+    assert run(client, calls) == [Bitrix24APIError, Bitrix24APIError, CircuitOpenError, CircuitOpenError]
+    assert fake_bitrix.calls["crm.deal.get"] == 2
+
+
+def test_circuit_breaker_is_shared_with_sync_client(fake_bitrix, token_store):
+    sync_client = Bitrix24Client("client", "secret", token_store=token_store, member_id=MEMBER_ID,
+                                 rate_limit=0, max_retries=0, backoff_factor=0, circuit_threshold=1)
+    client = AsyncBitrix24Client.from_client(sync_client, max_retries=0)
+
+    fake_bitrix.failure_rate = 1.0
+    with pytest.raises(Bitrix24APIError):
+        sync_client.call("crm.deal.get", {"id": 1})
+
+    # Портал недоступен для обоих клиентов: асинхронный не отправляет запрос
+    with pytest.raises(CircuitOpenError):
+        run(client, lambda: client.call("crm.deal.get", {"id": 1}))
+    assert fake_bitrix.calls["crm.deal.get"] == 1
+    sync_client.close()
@@ -0,0 +1,134 @@
+"""
+Выключатель портала: после reset_timeout к недоступному порталу уходит один пробный вызов,
+остальные отклоняются, пока его результат неизвестен
+"""
+
+import threading
+import time
+
+import pytest
+
+from lib.bitrix24_client import Bitrix24Client
+from lib.circuit_breaker import CircuitBreaker, CircuitOpenError
+from tests.conftest import MEMBER_ID
+
+RESET_TIMEOUT = 0.1
+
+
+def call_concurrently(func, count: int) -> list:
+    """
+    Вызывает func одновременно из count потоков
+
+    :return: Результаты или исключения вызовов
+    """
+
+    barrier = threading.Barrier(count)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        try:
+            result = func()
+        except Exception as error:
+            result = error
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def opened_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(MEMBER_ID, failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold_and_rejects_calls():
+    breaker = CircuitBreaker(MEMBER_ID, failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    breaker.record_failure()
+    breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert 0 < error.value.retry_after <= RESET_TIMEOUT
+    assert breaker.stats() == {"open": 1, "failures": 2, "opened": 1, "rejected": 1}
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = opened_breaker()
+    time.sleep(RESET_TIMEOUT)
+
+    results = call_concurrently(breaker.before_call, 10)
+
+    assert results.count(None) == 1
+    assert all(isinstance(result, CircuitOpenError) for result in results if result is not None)
+    assert breaker.state == "half_open"
+
+
+def test_failed_probe_reopens_breaker_and_successful_probe_closes_it():
+    breaker = opened_breaker()
+    time.sleep(RESET_TIMEOUT)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.retry_after() > 0
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(RESET_TIMEOUT)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert call_concurrently(breaker.before_call, 5) == [None] * 5
+
+
+def test_client_sends_single_probe_to_recovered_portal(fake_bitrix, token_store):
+    client = Bitrix24Client("client", "secret", token_store=token_store, member_id=MEMBER_ID, rate_limit=0,
+                            max_retries=0, backoff_factor=0, circuit_threshold=1, circuit_reset_timeout=RESET_TIMEOUT)
+
+    fake_bitrix.failure_rate = 1.0
+    with pytest.raises(Exception, match="INTERNAL_SERVER_ERROR"):
+        client.call("crm.deal.get", {"id": 1})
+    with pytest.raises(CircuitOpenError):
+        client.call("crm.deal.get", {"id": 1})
+    assert fake_bitrix.calls["crm.deal.get"] == 1
+
+    # Портал восстановился; пробный вызов отвечает медленно — параллельные вызовы его не ждут
+    fake_bitrix.failure_rate = 0.0
+    fake_bitrix.latency = 0.2
+    time.sleep(RESET_TIMEOUT)
+    results = call_concurrently(lambda: client.call("crm.deal.get", {"id": 1}), 8)
+
+    assert results.count(True) == 1
+    assert sum(isinstance(result, CircuitOpenError) for result in results) == 7
+    assert fake_bitrix.calls["crm.deal.get"] == 2
+
+    fake_bitrix.latency = 0.0
+    assert client.circuit_breaker.state == "closed"
+    assert client.call("crm.deal.get", {"id": 1}) is True
+    client.close()
+
+
+def test_rate_limited_portal_does_not_open_breaker(fake_bitrix, token_store):
+    client = Bitrix24Client("client", "secret", token_store=token_store, member_id=MEMBER_ID, rate_limit=0,
+                            max_retries=0, backoff_factor=0, circuit_threshold=1, circuit_reset_timeout=RESET_TIMEOUT)
+    fake_bitrix.script("crm.deal.get", *[(503, {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"})] * 3)
+
+    for _ in range(3):
+        with pytest.raises(Exception, match="QUERY_LIMIT_EXCEEDED"):
+            client.call("crm.deal.get", {"id": 1})
+
+    # Портал отвечает — ограничение темпа не делает его недоступным
+    assert client.circuit_breaker.state == "closed"
+    assert client.call("crm.deal.get", {"id": 1}) is True
+    client.close()
@@ -0,0 +1,89 @@
+"""
+Перенос токенов однопортальной установки (файл старого формата) на member_id портала:
+только для запроса того же портала, токены другого портала не затрагиваются
+"""
+
+import json
+
+import pytest
+
+from lib.client_pool import Bitrix24ClientPool
+from lib.token_store import DEFAULT_KEY, create_token_store
+from tests.conftest import portal_tokens
+
+LEGACY_MEMBER_ID = "portal-a"
+
+
+@pytest.fixture
+def legacy_path(tmp_path, fake_bitrix):
+    """
+    Файл токенов старого формата: токены одного портала без member_id
+    """
+
+    path = tmp_path / "tokens.json"
+    tokens = portal_tokens(fake_bitrix)
+    del tokens["member_id"]
+    path.write_text(json.dumps(tokens), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def pool(legacy_path):
+    pool = Bitrix24ClientPool("client", "secret", create_token_store("json", legacy_path), rate_limit=0)
+    yield pool
+    pool.shutdown()
+
+
+def stored(path: str) -> dict:
+    """
+    Токены в файле, как их увидит другой процесс
+    """
+
+    store = create_token_store("json", path)
+    return {key: store.get(key) for key in store.keys()}
+
+
+def test_installing_another_portal_keeps_legacy_tokens(pool, legacy_path):
+    auth = {"member_id": "portal-b", "domain": "b.bitrix24.ru", "access_token": "access-b",
+            "refresh_token": "refresh-b", "client_endpoint": "https://b.bitrix24.ru/rest/", "expires": 0}
+
+    # Как в /install: перенос, затем сохранение токенов устанавливаемого портала
+    assert pool.adopt_default_tokens("portal-b", auth) is False
+    pool.get("portal-b").set_tokens(auth)
+
+    tokens = stored(legacy_path)
+    assert sorted(tokens) == [DEFAULT_KEY, "portal-b"]
+    assert tokens[DEFAULT_KEY]["access_token"] == "access-initial"
+    assert tokens["portal-b"]["access_token"] == "access-b"
+
+
+@pytest.mark.parametrize("auth", [
+    {},
+    {"domain": "evil.example.com"},
+    {"client_endpoint": "https://evil.example.com/rest/"},
+])
+def test_request_of_other_portal_does_not_take_legacy_tokens(pool, legacy_path, auth):
+    assert pool.adopt_default_tokens("portal-x", auth) is False
+    assert pool.get("portal-x").token_store.get("portal-x") is None
+    assert sorted(stored(legacy_path)) == [DEFAULT_KEY]
+
+
+def test_request_of_legacy_portal_adopts_tokens(pool, legacy_path, fake_bitrix):
+    # Клиент портала создан до переноса — например, вызовом из другого места
+    client = pool.get(LEGACY_MEMBER_ID)
+
+    assert pool.adopt_default_tokens(LEGACY_MEMBER_ID, {"domain": "127.0.0.1"}) is True
+
+    tokens = stored(legacy_path)
+    assert sorted(tokens) == [LEGACY_MEMBER_ID]
+    assert tokens[LEGACY_MEMBER_ID]["access_token"] == "access-initial"
+    assert client.call("crm.deal.get", {"id": 1}) is True
+    assert [params["auth"] for method, params in fake_bitrix.requests] == ["access-initial"]
+
+    # Повторный запрос ничего не переносит
+    assert pool.adopt_default_tokens(LEGACY_MEMBER_ID, {"domain": "127.0.0.1"}) is False
+
+
+def test_webhook_adopts_legacy_tokens_by_client_endpoint(pool, legacy_path, fake_bitrix):
+    assert pool.adopt_default_tokens(LEGACY_MEMBER_ID, {"client_endpoint": fake_bitrix.endpoint}) is True
+    assert sorted(stored(legacy_path)) == [LEGACY_MEMBER_ID]
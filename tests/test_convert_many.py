@@ -0,0 +1,139 @@
+"""
+convert_many совпадает с convert для тех же сумм: векторный путь NumPy, поэлементный путь
+для строк и граничных значений, пачки и пул процессов
+"""
+
+import random
+from decimal import Decimal
+
+import pytest
+
+from amount2words import amount2words as amount2words_module
+from amount2words.amount2words import Amount2Words, load_numpy
+from amount2words.locales import LOCALES
+
+CURRENCIES = ('RUB', 'USD', 'EUR', 'KZT', 'BYN', 'UAH')
+
+
+def random_numbers(rng: random.Random, count: int) -> list:
+    """
+    Случайные float: копейки, границы половины копейки, большие суммы и отрицательные значения
+    """
+
+    numbers = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            number = rng.randrange(10 ** rng.randint(1, 10)) + rng.randrange(100) / 100
+        elif kind < 0.6:
+            number = rng.randrange(10 ** rng.randint(1, 9)) + rng.randrange(100) / 100 + 0.005
+        elif kind < 0.7:
+            number = rng.uniform(1e9, 1e15)
+        elif kind < 0.8:
+            number = -rng.uniform(0, 1e6)
+        else:
+            number = rng.uniform(0, 1e7)
+        numbers.append(number)
+    return numbers
+
+
+def random_amounts(rng: random.Random, count: int) -> list:
+    """
+    Суммы всех поддерживаемых типов вперемешку: int, float, Decimal и строки, в том числе 'сумма|ВАЛЮТА'
+    """
+
+    amounts = []
+    for number in random_numbers(rng, count):
+        kind = rng.random()
+        if kind < 0.4:
+            amounts.append(number)
+        elif kind < 0.55:
+            amounts.append(int(number))
+        elif kind < 0.7:
+            amounts.append(Decimal(repr(number)))
+        elif kind < 0.85:
+            amounts.append(f'{number:.3f}'.replace('.', ','))
+        else:
+            amounts.append(f'{number:.2f}|{rng.choice(CURRENCIES)}')
+    return amounts
+
+
+@pytest.mark.parametrize('language', sorted(LOCALES))
+@pytest.mark.parametrize('seed', range(3))
+def test_convert_many_matches_convert_for_numbers(language, seed):
+    converter = Amount2Words(language)
+    numbers = random_numbers(random.Random(seed), 20000)
+
+    # Небольшие пачки: проверяется и склейка результатов пачек
+    assert list(converter.convert_many(numbers, chunk_size=3000)) == [converter.convert(number) for number in numbers]
+
+
+@pytest.mark.parametrize('language', sorted(LOCALES))
+@pytest.mark.parametrize('seed', range(3))
+def test_convert_many_matches_convert_for_mixed_amounts(language, seed):
+    converter = Amount2Words(language)
+    amounts = random_amounts(random.Random(seed), 10000)
+
+    assert list(converter.convert_many(amounts, chunk_size=1000)) == [converter.convert(amount) for amount in amounts]
+
+
+def test_convert_many_matches_convert_for_numpy_array_and_currency():
+    np = load_numpy()
+    if np is None:
+        pytest.skip('NumPy не установлен')
+
+    converter = Amount2Words('ru')
+    numbers = random_numbers(random.Random(42), 20000)
+
+    result = list(converter.convert_many(np.array(numbers), chunk_size=4096, currency='USD'))
+    assert result == [converter.convert(number, currency='USD') for number in numbers]
+
+
+def test_convert_many_in_process_pool_matches_convert():
+    converter = Amount2Words('en')
+    amounts = random_amounts(random.Random(7), 5000)
+
+    assert list(converter.convert_many(amounts, chunk_size=500, workers=2)) == [converter.convert(amount) for amount in amounts]
+
+
+def test_convert_many_accepts_generator_and_empty_input():
+    converter = Amount2Words('ru')
+
+    assert list(converter.convert_many(iter([]))) == []
+    assert list(converter.convert_many(amount for amount in (1, '2,50', 3.005))) == [
+        converter.convert(1), converter.convert('2,50'), converter.convert(3.005)
+    ]
+
+
+@pytest.fixture
+def without_numpy(monkeypatch):
+    """
+    Окружение без NumPy: load_numpy возвращает None, convert_many работает поэлементно
+    """
+
+    monkeypatch.setattr(amount2words_module, '_numpy', False)
+    assert load_numpy() is None
+
+
+@pytest.mark.parametrize('language', sorted(LOCALES))
+def test_convert_many_without_numpy_matches_convert(language, without_numpy):
+    converter = Amount2Words(language)
+    numbers = random_numbers(random.Random(11), 5000)
+    amounts = random_amounts(random.Random(12), 5000)
+
+    assert list(converter.convert_many(numbers, chunk_size=700)) == [converter.convert(number) for number in numbers]
+    assert list(converter.convert_many(amounts, chunk_size=700, currency='EUR')) == [
+        converter.convert(amount, currency='EUR') for amount in amounts
+    ]
+
+
+def test_convert_many_without_numpy_in_process_pool(without_numpy):
+    converter = Amount2Words('ru')
+    amounts = random_amounts(random.Random(13), 2000)
+
+    assert list(converter.convert_many(amounts, chunk_size=300, workers=2)) == [converter.convert(amount) for amount in amounts]
+
+
+def test_numpy_is_installed_for_vectorised_path():
+    # NumPy в requirements.txt: без него в образе convert_many всегда шёл бы поэлементно
+    assert load_numpy() is not None
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from amount2words.amount2words import Amount2Words
+from lib.bitrix24_client import Bitrix24Client
+from lib.deal_recalculator import DealRecalculator
+from tests.conftest import MEMBER_ID
+
+
+def batch_response(size: int, errors: dict = None) -> tuple:
+    """
+    Ответ batch на size команд: errors — номер команды → код ошибки
+    """
+
+    errors = errors or {}
+    return 200, {"result": {
+        "result": {f"cmd{index}": True for index in range(size) if index not in errors},
+        "result_error": {f"cmd{index}": {"error": code, "error_description": code} for index, code in errors.items()},
+    }}
+
+
+def batch_deal_ids(server) -> list:
+    """
+    ID сделок в каждом вызове batch по порядку
+    """
+
+    return [
+        [int(command.split("id=")[1].split("&")[0]) for command in params["cmd"].values()]
+        for method, params in server.requests if method == "batch"
+    ]
+
+
+@pytest.fixture
+def client(token_store):
+    client = Bitrix24Client("client", "secret", token_store=token_store, member_id=MEMBER_ID,
+                            rate_limit=0, backoff_factor=0, circuit_threshold=0)
+    yield client
+    client.close()
+
+
+def make_recalculator(client, checkpoint=None, retry_attempts=3) -> DealRecalculator:
+    return DealRecalculator(client, Amount2Words("ru"), "OPPORTUNITY", "UF_CRM_WORDS",
+                            checkpoint_path=checkpoint, retry_attempts=retry_attempts, retry_delay=0)
+
+
+def test_transient_command_errors_are_retried(fake_bitrix, client):
+    fake_bitrix.deals = 60
+    fake_bitrix.script("batch", batch_response(50, {3: "QUERY_LIMIT_EXCEEDED", 7: "OPERATION_TIME_LIMIT"}))
+
+    state = make_recalculator(client).run()
+
+    assert (state["processed"], state["updated"], state["failed"], state["retry_ids"]) == (60, 60, 0, [])
+    assert state["done"] is True
+    # Повтор — отдельный batch только с двумя сделками, до следующей страницы
+    assert [len(ids) for ids in batch_deal_ids(fake_bitrix)] == [50, 2, 10]
+    assert batch_deal_ids(fake_bitrix)[1] == [4, 8]
+
+
+def test_permanent_command_errors_are_not_retried(fake_bitrix, client):
+    fake_bitrix.deals = 10
+    fake_bitrix.script("batch", batch_response(10, {0: "ACCESS_DENIED"}))
+
+    state = make_recalculator(client).run()
+
+    assert (state["updated"], state["failed"], state["retry_ids"]) == (9, 1, [])
+    assert fake_bitrix.calls["batch"] == 1
+
+
+def test_unwritten_deals_are_kept_in_checkpoint_and_written_on_resume(fake_bitrix, client, tmp_path):
+    checkpoint = tmp_path / "recalc.json"
+    fake_bitrix.deals = 60
+    fake_bitrix.script(
+        "batch",
+        batch_response(50, {5: "QUERY_LIMIT_EXCEEDED"}),
+        batch_response(10),
+        # Повторная запись в конце запуска тоже не удалась
+        batch_response(1, {0: "QUERY_LIMIT_EXCEEDED"}),
+    )
+
+    state = make_recalculator(client, checkpoint, retry_attempts=0).run()
+
+    assert (state["last_id"], state["updated"], state["retry_ids"], state["done"]) == (60, 59, [6], False)
+    assert json.loads(checkpoint.read_text(encoding="utf-8"))["retry_ids"] == [6]
+
+    # Следующий запуск продолжает с контрольной точки: страницы не перечитываются, сделка 6 записывается
+    fake_bitrix.requests.clear()
+    state = make_recalculator(client, checkpoint).run()
+
+    assert (state["processed"], state["updated"], state["retry_ids"], state["done"]) == (60, 60, [], True)
+    assert batch_deal_ids(fake_bitrix) == [[6]]
+    assert [params["filter"] for method, params in fake_bitrix.requests if method == "crm.deal.list"] == [
+        {">ID": 60}, {"ID": [6]},
+    ]
@@ -0,0 +1,84 @@
+"""
+Хранилища кеша подавления повторов: атомарное занятие ключа, срок жизни, общий для процессов SQLite
+"""
+
+import threading
+import time
+
+import pytest
+
+from lib.idempotency import CacheBackend, TTLCache, create_cache_backend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    backend = create_cache_backend(request.param, str(tmp_path / "cache.sqlite3"))
+    yield backend
+    if hasattr(backend, "close"):
+        backend.close()
+
+
+def test_claim_is_granted_once_until_released(backend):
+    events = TTLCache(backend, "event", 60)
+
+    assert events.claim("token-1") is True
+    assert events.claim("token-1") is False
+    assert events.claim("token-2") is True
+
+    events.release("token-1")
+    assert events.claim("token-1") is True
+    assert events.stats()["hits"] == 1
+
+
+def test_concurrent_claims_grant_key_to_one_caller(backend):
+    events = TTLCache(backend, "event", 60)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def claim():
+        barrier.wait()
+        results.append(events.claim("token-1"))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+
+
+def test_values_expire_after_ttl(backend):
+    values = TTLCache(backend, "field", 0.05)
+    values.set("deal:1", "Один рубль")
+
+    assert values.get("deal:1") == "Один рубль"
+    time.sleep(0.06)
+    assert values.get("deal:1") is None
+    assert values.claim("deal:1") is True
+
+
+def test_namespaces_do_not_collide(backend):
+    events = TTLCache(backend, "event", 60)
+    fields = TTLCache(backend, "field", 60)
+
+    assert events.claim("1") is True
+    assert fields.get("1") is None
+
+
+def test_sqlite_keys_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker = TTLCache(create_cache_backend("sqlite", path), "event", 60)
+    other_worker = TTLCache(create_cache_backend("sqlite", path), "event", 60)
+
+    assert worker.claim("token-1") is True
+    assert other_worker.claim("token-1") is False
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class GetOnlyBackend(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        GetOnlyBackend()
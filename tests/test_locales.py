@@ -0,0 +1,128 @@
+"""
+Скомпилированные таблицы языков (CompiledLocale) дают тот же текст, что и прямое построение
+по описанию языка из LOCALES: все языки, все валюты, все разряды и формы множественного числа
+"""
+
+import random
+
+import pytest
+
+from amount2words.amount2words import Amount2Words
+from amount2words.locales import LOCALES, get_locale
+
+CASES = [(language, currency) for language in sorted(LOCALES) for currency in sorted(LOCALES[language]['currencies'])]
+
+
+def reference_group(spec: dict, n: int, gender: str) -> str:
+    """
+    Число 0–999 прописью напрямую по описанию языка
+    """
+
+    words = []
+    if n >= 100:
+        words.append(spec['hundreds'][n // 100])
+        n %= 100
+    units = spec['units_f'] if gender == 'f' else spec['units']
+    if n >= 20:
+        words.append(spec['tens'][n // 10] + (spec['tens_separator'] + units[n % 10] if n % 10 else ''))
+    elif n >= 10:
+        words.append(spec['teens'][n - 10])
+    elif n:
+        words.append(units[n])
+    return ' '.join(words)
+
+
+def reference(language: str, whole: int, kopeks: int, negative: bool, currency: str) -> str:
+    """
+    Сумма прописью без предвычисленных таблиц: разряд за разрядом по описанию языка
+    """
+
+    spec = LOCALES[language]
+    plural = spec['plural']
+    major_forms, gender, minor_forms = spec['currencies'][currency]
+    scales = spec['scales']
+
+    words = []
+    for index in reversed(range(len(scales))):
+        group = whole // 1000 ** index % 1000
+        if not group:
+            continue
+        if index == 0:
+            words.append(reference_group(spec, group, gender))
+        else:
+            words.append(f'{reference_group(spec, group, scales[index][3])} {plural(group, scales[index][:3])}')
+
+    text = ' '.join(words) or spec['zero']
+    if negative:
+        text = f"{spec['minus']} {text}"
+    text = f'{text} {plural(whole, major_forms)} {kopeks:02d} {plural(kopeks, minor_forms)}'
+    return text[0].upper() + text[1:]
+
+
+def random_whole(rng: random.Random, max_whole: int) -> int:
+    """
+    Целая часть: чаще небольшие числа и числа с нулевыми группами разрядов
+    """
+
+    kind = rng.random()
+    if kind < 0.3:
+        return rng.randrange(1000)
+    if kind < 0.5:
+        # Нулевые группы в середине: 1 000 005, 2 000 000 021
+        return rng.randrange(1, 1000) * 1000 ** rng.randrange(1, 9) + rng.randrange(100)
+    return rng.randrange(max_whole)
+
+
+@pytest.mark.parametrize('language, currency', CASES)
+def test_compiled_tables_match_reference(language, currency):
+    converter = Amount2Words(language, cache_size=0)
+    max_whole = get_locale(language).max_whole
+    rng = random.Random(f'{language}-{currency}')
+
+    for _ in range(3000):
+        whole, kopeks = random_whole(rng, max_whole), rng.randrange(100)
+        negative = rng.random() < 0.2 and (whole or kopeks) > 0
+        amount = f"{'-' if negative else ''}{whole}.{kopeks:02d}|{currency}"
+
+        assert converter.convert(amount) == reference(language, whole, kopeks, negative, currency), amount
+
+
+@pytest.mark.parametrize('language, currency', CASES)
+def test_plural_forms_of_every_currency(language, currency):
+    converter = Amount2Words(language)
+    spec = LOCALES[language]
+    major_forms, _, minor_forms = spec['currencies'][currency]
+
+    for number in list(range(0, 130)) + [1001, 1011, 1021, 1_000_002, 1_000_005]:
+        text = converter.convert(number, currency=currency)
+        assert text.endswith(f" {spec['plural'](number, major_forms)} 00 {minor_forms[2]}"), text
+
+    for kopeks in range(100):
+        text = converter.convert(f'1.{kopeks:02d}', currency=currency)
+        assert text.endswith(f" {kopeks:02d} {spec['plural'](kopeks, minor_forms)}"), text
+
+
+@pytest.mark.parametrize('language, amount, expected', [
+    ('ru', '21.01', 'Двадцать один рубль 01 копейка'),
+    ('ru', '1234.05|UAH', 'Одна тысяча двести тридцать четыре гривны 05 копеек'),
+    ('ru', '2002002|UAH', 'Два миллиона две тысячи две гривны 00 копеек'),
+    ('ru', '111.11|USD', 'Сто одиннадцать долларов 11 центов'),
+    ('ru', '-0.05', 'Минус ноль рублей 05 копеек'),
+    ('en', '1.01', 'One ruble 01 kopeck'),
+    ('en', '21.21|USD', 'Twenty-one dollars 21 cents'),
+    ('en', '1001001|EUR', 'One million one thousand one euros 00 cents'),
+    ('en', '1|KZT', 'One tenge 00 tiyn'),
+    ('en', '-1234.5|BYN', 'Minus one thousand two hundred thirty-four Belarusian rubles 50 kopecks'),
+])
+def test_known_amounts(language, amount, expected):
+    assert Amount2Words(language).convert(amount) == expected
+
+
+@pytest.mark.parametrize('language', sorted(LOCALES))
+def test_largest_supported_amount(language):
+    converter = Amount2Words(language)
+    max_whole = get_locale(language).max_whole
+
+    assert converter.convert(max_whole - 1)
+    with pytest.raises(ValueError, match='Слишком большая сумма'):
+        converter.convert(max_whole)
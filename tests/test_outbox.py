@@ -0,0 +1,200 @@
+"""
+Доставка исходящей очереди на имитатор портала: откладывание при сбоях и доставка по порядку,
+цепочка on_error, прекращение доставки после max_attempts, записи разомкнутого портала
+"""
+
+from urllib.parse import parse_qsl
+
+import pytest
+
+from lib.client_pool import Bitrix24ClientPool
+from lib.outbox import Outbox, OutboxDispatcher
+from lib.token_store import create_token_store
+from tests.conftest import MEMBER_ID, portal_tokens
+
+
+def batch_commands(server) -> list:
+    """
+    Команды каждого вызова batch по порядку: (метод, параметры)
+    """
+
+    batches = []
+    for method, params in server.requests:
+        if method == "batch":
+            batches.append([
+                (command.partition("?")[0], dict(parse_qsl(command.partition("?")[2])))
+                for command in params["cmd"].values()
+            ])
+    return batches
+
+
+def activity_commands(deal_id: int) -> list:
+    """
+    Цепочка команд активити: запись поля сделки, затем завершение активити
+    """
+
+    return [
+        ("crm.deal.update", {"id": deal_id, "fields": {"UF_CRM_WORDS": f"сумма {deal_id}"}}),
+        ("bizproc.event.send", {"event_token": f"event-{deal_id}", "return_values": {"result": "ok"}}),
+    ]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    yield outbox
+    outbox.close()
+
+
+def make_dispatcher(outbox, token_store, max_attempts=20, circuit_threshold=0, circuit_reset_timeout=30.0):
+    """
+    Диспетчер без задержек между попытками: повтор доступен на следующем проходе
+    """
+
+    clients = Bitrix24ClientPool("client", "secret", token_store, rate_limit=0, max_retries=0, backoff_factor=0,
+                                 circuit_threshold=circuit_threshold, circuit_reset_timeout=circuit_reset_timeout)
+    return OutboxDispatcher(outbox, clients, base_delay=0, max_delay=0, max_attempts=max_attempts)
+
+
+def test_entries_are_deferred_while_portal_fails_and_delivered_in_order(fake_bitrix, token_store, outbox):
+    dispatcher = make_dispatcher(outbox, token_store)
+    for deal_id in (1, 2, 3):
+        outbox.add(MEMBER_ID, activity_commands(deal_id))
+
+    fake_bitrix.failure_rate = 1.0
+    for _ in range(3):
+        assert dispatcher.dispatch_once() == 3
+
+    assert outbox.stats()["pending"] == 3
+    assert fake_bitrix.events == {}
+
+    fake_bitrix.failure_rate = 0.0
+    fake_bitrix.requests.clear()
+    while dispatcher.dispatch_once():
+        pass
+
+    assert outbox.stats() == {"pending": 0, "dead": 0, "oldest_age": 0.0}
+    assert fake_bitrix.events == {"event-1": 1, "event-2": 1, "event-3": 1}
+    # Записи в порядке добавления, в каждой записи поле пишется до завершения активити
+    assert [[(method, params.get("id") or params.get("event_token")) for method, params in batch]
+            for batch in batch_commands(fake_bitrix)] == [
+        [("crm.deal.update", "1"), ("crm.deal.update", "2"), ("crm.deal.update", "3")],
+        [("bizproc.event.send", "event-1"), ("bizproc.event.send", "event-2"), ("bizproc.event.send", "event-3")],
+    ]
+
+
+def test_permanent_error_runs_on_error_chain(fake_bitrix, token_store, outbox):
+    dispatcher = make_dispatcher(outbox, token_store)
+    outbox.add(MEMBER_ID, activity_commands(1), on_error=[
+        ("bizproc.event.send", {"event_token": "event-1", "return_values": {"result": "error"}}),
+    ])
+    outbox.add(MEMBER_ID, activity_commands(2))
+
+    fake_bitrix.script("batch", (200, {"result": {
+        "result": {"cmd1": True},
+        "result_error": {"cmd0": {"error": "ACCESS_DENIED", "error_description": "Access denied"}},
+    }}))
+    while dispatcher.dispatch_once():
+        pass
+
+    assert outbox.stats()["pending"] == 0
+    assert fake_bitrix.events == {"event-1": 1, "event-2": 1}
+    # Вместо оставшихся команд первой записи выполнена цепочка on_error — без повторов записи поля
+    sent = [(method, params.get("event_token"), params.get("return_values[result]"))
+            for batch in batch_commands(fake_bitrix) for method, params in batch if method == "bizproc.event.send"]
+    assert sorted(sent) == [("bizproc.event.send", "event-1", "error"), ("bizproc.event.send", "event-2", "ok")]
+    assert fake_bitrix.calls["batch"] == 2
+
+
+def test_entry_is_dead_after_max_attempts(fake_bitrix, token_store, outbox):
+    dispatcher = make_dispatcher(outbox, token_store, max_attempts=3)
+    outbox.add(MEMBER_ID, activity_commands(1))
+
+    fake_bitrix.failure_rate = 1.0
+    while dispatcher.dispatch_once():
+        pass
+
+    assert fake_bitrix.calls["batch"] == 3
+    assert outbox.stats()["pending"] == 0
+    assert outbox.stats()["dead"] == 1
+
+    # Недоставленная запись остаётся в таблице, но больше не забирается
+    fake_bitrix.failure_rate = 0.0
+    assert dispatcher.dispatch_once() == 0
+    assert fake_bitrix.events == {}
+
+
+def test_entries_of_open_circuit_are_postponed_without_requests(fake_bitrix, token_store, outbox):
+    dispatcher = make_dispatcher(outbox, token_store, max_attempts=3, circuit_threshold=1)
+    entry_id = outbox.add(MEMBER_ID, activity_commands(1))
+
+    fake_bitrix.failure_rate = 1.0
+    assert dispatcher.dispatch_once() == 1
+    assert dispatcher.clients.get(MEMBER_ID).circuit_breaker.state == "open"
+
+    # Запись отложена до пробного вызова: запрос не отправлен, попытка не засчитана
+    assert dispatcher.dispatch_once() == 1
+    assert dispatcher.dispatch_once() == 0
+    assert fake_bitrix.calls["batch"] == 1
+    assert outbox.stats()["pending"] == 1
+    assert outbox._db.connection.execute("SELECT attempts FROM outbox WHERE id = ?", (entry_id,)).fetchone() == (1,)
+
+
+def test_deferred_call_is_stored_without_token_and_sent_with_refreshed_one(fake_bitrix, token_store, outbox):
+    dispatcher = make_dispatcher(outbox, token_store)
+    client = dispatcher.clients.get(MEMBER_ID)
+    client.OAUTH_URL = fake_bitrix.oauth_url
+    method, params = activity_commands(1)[1]
+
+    # Вызов не выполнен — те же параметры откладываются в очередь, как в defer_calls
+    fake_bitrix.failure_rate = 1.0
+    with pytest.raises(Exception, match="INTERNAL_SERVER_ERROR"):
+        client.call(method, params)
+    assert "auth" not in params
+    outbox.add(MEMBER_ID, [(method, params)], on_error=[(method, {**params, "auth": "access-initial"})])
+
+    stored = outbox._db.connection.execute("SELECT commands, on_error FROM outbox").fetchall()
+    assert "access-initial" not in repr(stored)
+
+    # К моменту доставки access_token истёк и обновлён
+    client.set_tokens(portal_tokens(fake_bitrix, expires_in=-1))
+    fake_bitrix.failure_rate = 0.0
+    fake_bitrix.requests.clear()
+    while dispatcher.dispatch_once():
+        pass
+
+    assert fake_bitrix.calls["oauth"] == 1
+    assert fake_bitrix.events == {"event-1": 1}
+    (batch_method, batch_params), = fake_bitrix.requests
+    assert batch_params["auth"] not in ("access-initial", None)
+    assert [params for batch in batch_commands(fake_bitrix) for _, params in batch if "auth" in params] == []
+
+
+@pytest.mark.parametrize("response", [
+    (401, {"error": "invalid_token", "error_description": "The access token provided is invalid"}),
+    (401, {"error": "expired_token", "error_description": "The access token provided has expired"}),
+])
+def test_permanent_batch_error_runs_on_error_chain_without_retries(fake_bitrix, token_store, outbox, response):
+    dispatcher = make_dispatcher(outbox, token_store)
+    outbox.add(MEMBER_ID, activity_commands(1), on_error=[
+        ("bizproc.event.send", {"event_token": "event-1", "return_values": {"result": "error"}}),
+    ])
+    outbox.add(MEMBER_ID, activity_commands(2))
+
+    fake_bitrix.script("batch", response)
+    while dispatcher.dispatch_once():
+        pass
+
+    # Первая запись перешла к on_error, вторая без цепочки прекращена — без повторов до max_attempts
+    assert fake_bitrix.calls["batch"] == 2
+    assert fake_bitrix.events == {"event-1": 1}
+    assert outbox.stats()["dead"] == 1
+
+
+def test_uninitialized_portal_entries_are_not_retried(fake_bitrix, tmp_path, outbox):
+    dispatcher = make_dispatcher(outbox, create_token_store("json", str(tmp_path / "empty.json")))
+    outbox.add("unknown", activity_commands(1))
+
+    assert dispatcher.dispatch_once() == 1
+    assert dispatcher.dispatch_once() == 0
+    assert outbox.stats()["dead"] == 1
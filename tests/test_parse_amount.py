@@ -0,0 +1,148 @@
+"""
+Свойства parse_amount на случайных суммах: результат совпадает с Decimal и ROUND_HALF_UP
+при любой записи суммы. Генератор случайных чисел с фиксированным зерном — падение воспроизводимо
+"""
+
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+from amount2words.parsing import parse_amount
+
+SEEDS = range(5)
+CASES_PER_SEED = 2000
+
+# Разделители тысяч, которые не путаются с десятичным разделителем
+SPACE_SEPARATORS = (' ', ' ', ' ', ' ', "'", '’', '_')
+
+
+def expected(digits: str, negative: bool = False, currency=None):
+    """
+    Эталон: округление до копеек через Decimal по правилу «половина вверх»
+    """
+
+    cents = int(Decimal(digits).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP).scaleb(2))
+    whole, kopeks = divmod(cents, 100)
+    return whole, kopeks, negative and cents > 0, currency
+
+
+def random_amount(rng: random.Random):
+    """
+    Случайная сумма: строка цифр целой части и строка дробной части (возможно пустая).
+    Чаще выбираются дроби на границе половины копейки
+    """
+
+    whole = str(rng.randrange(10 ** rng.randint(1, 15)))
+    kind = rng.random()
+    if kind < 0.3:
+        # Граница половины копейки: xx5, xx5000, xx4999..., 995
+        kopeks = rng.choice([f'{rng.randrange(100):02d}', '99', '00'])
+        fraction = kopeks + rng.choice(['5', '50', '500', '49', '4999', '5001', '51'])
+    elif kind < 0.4:
+        fraction = ''
+    else:
+        fraction = ''.join(rng.choice('0123456789') for _ in range(rng.randint(1, 6)))
+    return whole, fraction
+
+
+def group(whole: str, separator: str) -> str:
+    """
+    Целая часть с разделителем тысяч
+    """
+
+    head = len(whole) % 3 or 3
+    groups = [whole[:head]] + [whole[index:index + 3] for index in range(head, len(whole), 3)]
+    return separator.join(groups)
+
+
+def decimal_text(whole: str, fraction: str) -> str:
+    return f'{whole}.{fraction}' if fraction else whole
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_plain_strings_match_decimal(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES_PER_SEED):
+        whole, fraction = random_amount(rng)
+        negative = rng.random() < 0.3
+        text = ('-' if negative else '') + decimal_text(whole, fraction)
+
+        assert parse_amount(text) == expected(decimal_text(whole, fraction), negative), text
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_thousands_separators_and_decimal_comma_match_decimal(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES_PER_SEED):
+        whole, fraction = random_amount(rng)
+        negative = rng.random() < 0.3
+
+        style = rng.choice(['space_dot', 'space_comma', 'comma_dot', 'dot_comma', 'comma'])
+        if style == 'space_dot':
+            text = group(whole, rng.choice(SPACE_SEPARATORS)) + (f'.{fraction}' if fraction else '')
+        elif style == 'space_comma':
+            text = group(whole, rng.choice(SPACE_SEPARATORS)) + (f',{fraction}' if fraction else '')
+        elif style == 'comma':
+            # Десятичная запятая без разделителей тысяч
+            text = whole + (f',{fraction}' if fraction else '')
+        else:
+            # '1,234.50' и '1.234,50': разделитель тысяч однозначен, только если есть дробная часть
+            fraction = fraction or '0'
+            thousands, point = (',', '.') if style == 'comma_dot' else ('.', ',')
+            text = f'{group(whole, thousands)}{point}{fraction}'
+
+        text = ('-' if negative else '') + text
+        assert parse_amount(text) == expected(decimal_text(whole, fraction), negative), text
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_money_field_form_matches_decimal(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES_PER_SEED):
+        whole, fraction = random_amount(rng)
+        negative = rng.random() < 0.3
+        currency = rng.choice(['RUB', 'USD', 'eur', ' KZT ', ''])
+        text = f"{'-' if negative else ''}{decimal_text(whole, fraction)}|{currency}"
+
+        assert parse_amount(text) == expected(decimal_text(whole, fraction), negative, currency.strip().upper() or None), text
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_numbers_match_decimal_of_their_shortest_repr(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES_PER_SEED):
+        whole, fraction = random_amount(rng)
+        sign = -1 if rng.random() < 0.3 else 1
+
+        integer = sign * int(whole)
+        assert parse_amount(integer) == (int(whole), 0, integer < 0, None)
+
+        value = Decimal(decimal_text(whole, fraction)) * sign
+        assert parse_amount(value) == expected(decimal_text(whole, fraction), sign < 0), value
+
+        # float: эталон — кратчайшая десятичная запись числа, как его ввёл пользователь
+        number = float(f"{'-' if sign < 0 else ''}{whole[:10]}.{fraction[:4]}")
+        assert parse_amount(number) == expected(repr(abs(number)), number < 0), number
+
+
+@pytest.mark.parametrize('text, result', [
+    ('0.005', (0, 1, False, None)),
+    ('0.004999', (0, 0, False, None)),
+    ('-0.004', (0, 0, False, None)),
+    ('-0.005', (0, 1, True, None)),
+    ('99.995', (100, 0, False, None)),
+    ('1 234 567,895', (1234567, 90, False, None)),
+    ('1,234,567.125|usd', (1234567, 13, False, 'USD')),
+    ('1.234.567', (1234567, 0, False, None)),
+    ('-1.234,5|RUB', (1234, 50, True, 'RUB')),
+    ('1e3', (1000, 0, False, None)),
+])
+def test_boundaries(text, result):
+    assert parse_amount(text) == result
+
+
+@pytest.mark.parametrize('value', ['', 'abc', '1.2.3,4,5', 'nan', 'inf', '-', '12a', True])
+def test_invalid_amounts_raise_value_error(value):
+    with pytest.raises(ValueError):
+        parse_amount(value)
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from lib.sqlite_util import PerProcessConnection
+
+
+def test_connection_is_shared_within_process(tmp_path):
+    db = PerProcessConnection(str(tmp_path / "test.sqlite3"))
+
+    assert db.connection is db.connection
+    assert db.connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    db.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork недоступен")
+def test_child_process_opens_own_connection(tmp_path):
+    db = PerProcessConnection(str(tmp_path / "test.sqlite3"))
+    parent = db.connection
+    parent.execute("CREATE TABLE items (value INTEGER)")
+
+    pid = os.fork()
+    if pid == 0:
+        # Воркер после fork: своё соединение; закрытие не затрагивает соединение мастера
+        ok = db.connection is not parent
+        db.connection.execute("INSERT INTO items VALUES (1)")
+        db.close()
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert db.connection is parent
+    assert parent.execute("SELECT value FROM items").fetchall() == [(1,)]
+    db.close()
@@ -0,0 +1,67 @@
+import sys
+import threading
+
+import pytest
+
+from lib.task_queue import QueueFullError, TaskQueue
+
+
+@pytest.fixture
+def frequent_switches():
+    """
+    Частое переключение потоков: потерянные обновления счётчиков проявляются чаще
+    """
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def fail(index: int):
+    if index % 3 == 0:
+        raise RuntimeError(f"задача {index}")
+
+
+def test_counters_are_exact_under_concurrent_workers(frequent_switches):
+    tasks = TaskQueue(workers=8, max_size=0, name="test")
+    tasks.start()
+    for index in range(6000):
+        tasks.submit(fail, index)
+    tasks.shutdown()
+
+    stats = tasks.stats()
+    assert (stats["processed"], stats["failed"], stats["rejected"]) == (4000, 2000, 0)
+
+
+def test_rejected_tasks_are_counted_from_concurrent_submitters(frequent_switches):
+    tasks = TaskQueue(workers=1, max_size=1, name="test")
+    tasks.start()
+    release = threading.Event()
+    tasks.submit(release.wait)
+    # Рабочий поток занят первой задачей, в очереди одно место
+    while tasks.stats()["size"]:
+        pass
+    tasks.submit(release.wait)
+
+    rejected = []
+
+    def submit_many():
+        for _ in range(500):
+            try:
+                tasks.submit(release.wait)
+            except QueueFullError:
+                rejected.append(1)
+
+    submitters = [threading.Thread(target=submit_many) for _ in range(8)]
+    for thread in submitters:
+        thread.start()
+    for thread in submitters:
+        thread.join()
+
+    release.set()
+    tasks.shutdown()
+
+    assert len(rejected) == 4000
+    assert tasks.stats()["rejected"] == 4000
+    assert tasks.stats()["processed"] == 2
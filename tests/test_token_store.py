@@ -0,0 +1,118 @@
+"""
+Хранилище токенов, общее для воркеров gunicorn: токены, сохранённые одним процессом
+(установка портала), видны остальным. Процессы моделируются отдельными экземплярами хранилища одного файла
+"""
+
+import pytest
+
+from lib.bitrix24_client import Bitrix24Client
+from lib.client_pool import Bitrix24ClientPool
+from lib.token_store import CachedTokenStore, JsonFileTokenStore, SQLiteTokenStore, TokenStore, create_token_store
+from tests.conftest import MEMBER_ID, portal_tokens
+
+BACKENDS = {"json": JsonFileTokenStore, "sqlite": SQLiteTokenStore}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def store_path(request, tmp_path):
+    """
+    Тип хранилища и путь к его файлу
+    """
+
+    return request.param, str(tmp_path / f"tokens.{request.param}")
+
+
+def test_portal_installed_by_another_process_is_visible(store_path, fake_bitrix):
+    backend, path = store_path
+    worker = create_token_store(backend, path)
+    installer = create_token_store(backend, path)
+
+    # Воркер обратился к порталу до установки: отсутствие токенов не должно закешироваться
+    assert worker.get(MEMBER_ID) is None
+
+    installer.set(MEMBER_ID, portal_tokens(fake_bitrix))
+
+    assert worker.get(MEMBER_ID)["access_token"] == "access-initial"
+    assert MEMBER_ID in worker.keys()
+
+
+def test_json_store_rereads_file_replaced_by_another_process(tmp_path, fake_bitrix):
+    path = str(tmp_path / "tokens.json")
+    worker = JsonFileTokenStore(path)
+    installer = JsonFileTokenStore(path)
+
+    installer.set(MEMBER_ID, portal_tokens(fake_bitrix))
+    assert worker.get(MEMBER_ID)["access_token"] == "access-initial"
+
+    tokens = portal_tokens(fake_bitrix)
+    tokens["access_token"] = "access-reinstalled"
+    installer.set(MEMBER_ID, tokens)
+    assert worker.get(MEMBER_ID)["access_token"] == "access-reinstalled"
+
+    installer.delete(MEMBER_ID)
+    assert worker.get(MEMBER_ID) is None
+
+
+def test_cached_store_does_not_cache_missing_portal(tmp_path, fake_bitrix):
+    backend = JsonFileTokenStore(str(tmp_path / "tokens.json"))
+    store = CachedTokenStore(backend)
+
+    assert store.get(MEMBER_ID) is None
+    assert store.reload(MEMBER_ID) is None
+
+    backend.set(MEMBER_ID, portal_tokens(fake_bitrix))
+    assert store.get(MEMBER_ID)["access_token"] == "access-initial"
+
+
+def test_pool_client_created_before_install_picks_up_tokens(store_path, fake_bitrix):
+    backend, path = store_path
+    pool = Bitrix24ClientPool("client", "secret", create_token_store(backend, path), rate_limit=0)
+
+    # Вебхук пришёл в этот воркер до того, как другой воркер обработал /install
+    client = pool.get(MEMBER_ID)
+    with pytest.raises(ValueError, match="не инициализирован"):
+        client.call("crm.deal.get", {"id": 1})
+
+    create_token_store(backend, path).set(MEMBER_ID, portal_tokens(fake_bitrix))
+
+    assert client.call("crm.deal.get", {"id": 1}) is True
+    assert pool.get(MEMBER_ID) is client
+    pool.shutdown()
+
+
+def test_client_retries_with_tokens_saved_by_another_process(store_path, fake_bitrix):
+    backend, path = store_path
+    create_token_store(backend, path).set(MEMBER_ID, portal_tokens(fake_bitrix))
+    client = Bitrix24Client("client", "secret", token_store=create_token_store(backend, path), member_id=MEMBER_ID,
+                            rate_limit=0, backoff_factor=0)
+
+    # Портал переустановлен: токены этого процесса отозваны, новые сохранил другой процесс
+    tokens = portal_tokens(fake_bitrix)
+    tokens["access_token"] = "access-reinstalled"
+    create_token_store(backend, path).set(MEMBER_ID, tokens)
+    fake_bitrix.script("crm.deal.get", (401, {"error": "expired_token", "error_description": "The access token provided has expired"}))
+
+    assert client.call("crm.deal.get", {"id": 1}) is True
+    assert [params["auth"] for method, params in fake_bitrix.requests] == ["access-initial", "access-reinstalled"]
+    client.close()
+
+
+def test_client_does_not_retry_when_stored_tokens_are_the_same(token_store, fake_bitrix):
+    client = Bitrix24Client("client", "secret", token_store=token_store, member_id=MEMBER_ID,
+                            rate_limit=0, backoff_factor=0)
+    fake_bitrix.script("crm.deal.get", (401, {"error": "expired_token", "error_description": "expired"}))
+
+    with pytest.raises(Exception, match="expired_token"):
+        client.call("crm.deal.get", {"id": 1})
+
+    assert fake_bitrix.calls["crm.deal.get"] == 1
+    client.close()
+
+
+def test_incomplete_store_fails_on_instantiation():
+    class GetOnlyStore(TokenStore):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        GetOnlyStore()
@@ -0,0 +1,44 @@
+import pytest
+
+from lib.utils import extract_fields, parse_form
+
+PATHS = ("event_token", "properties[SOURCE_AMOUNT]", "properties[SOURCE_AMOUNT][]", "properties[RESULT][]")
+
+
+@pytest.mark.parametrize("body, expected", [
+    # Множественное свойство с индексами
+    ("event_token=t&properties[SOURCE_AMOUNT][0]=15&properties[SOURCE_AMOUNT][1]=20%2C5",
+     {"event_token": "t", "properties[SOURCE_AMOUNT][]": ["15", "20,5"]}),
+    # Множественное свойство без индексов, в том числе одно значение
+    ("properties[SOURCE_AMOUNT][]=15&properties[RESULT][]=UF_B",
+     {"properties[SOURCE_AMOUNT][]": ["15"], "properties[RESULT][]": ["UF_B"]}),
+    ("properties[SOURCE_AMOUNT][]=15&properties[SOURCE_AMOUNT][]=16",
+     {"properties[SOURCE_AMOUNT][]": ["15", "16"]}),
+    # Вперемешку [] и [N]
+    ("properties[SOURCE_AMOUNT][0]=1&properties[SOURCE_AMOUNT][]=2",
+     {"properties[SOURCE_AMOUNT][]": ["1", "2"]}),
+    # Скалярное свойство шаблона, настроенного до множественных свойств
+    ("properties[SOURCE_AMOUNT]=15&event_token=t",
+     {"properties[SOURCE_AMOUNT]": "15", "event_token": "t"}),
+    # Вложенные ключи, не являющиеся элементами списка, пропускаются
+    ("properties[SOURCE_AMOUNT][name]=x&properties[RESULT][0]=UF_A",
+     {"properties[RESULT][]": ["UF_A"]}),
+])
+def test_extract_fields_collects_lists_for_indexed_and_empty_brackets(body, expected):
+    assert extract_fields(body, PATHS) == expected
+
+
+def test_extract_fields_stops_after_scalars_without_lists():
+    # Разбор прекращается на найденных полях: дальнейшее тело не декодируется
+    assert extract_fields("event_token=t&broken=%ZZ", ("event_token",)) == {"event_token": "t"}
+
+
+def test_extract_fields_matches_parse_form():
+    body = "event_token=t%7C1&auth[member_id]=m&properties[SOURCE_AMOUNT][0]=1+234,50&properties[SOURCE_AMOUNT][1]=7"
+    parsed = parse_form(body)
+
+    assert extract_fields(body, ("event_token", "auth[member_id]", "properties[SOURCE_AMOUNT][]")) == {
+        "event_token": parsed["event_token"],
+        "auth[member_id]": parsed["auth"]["member_id"],
+        "properties[SOURCE_AMOUNT][]": list(parsed["properties"]["SOURCE_AMOUNT"].values()),
+    }
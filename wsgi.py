@@ -0,0 +1,19 @@
+"""
+Точка входа WSGI для продакшена:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Приложение создаётся без фоновых потоков: при preload модуль загружается в мастер-процессе,
+а потоки запускаются в каждом воркере хуком post_worker_init из gunicorn.conf.py.
+Прогрев выполняется здесь же, в мастере: таблицы конвертеров и NumPy загружаются один раз
+и разделяются воркерами, каждый воркер готов (/readyz) сразу после запуска потоков
+"""
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Настройки main читаются из окружения при импорте — после загрузки .env
+from main import create_app
+
+app = create_app(start_services=False)
+app.extensions["amount2words"].warm_up()